@@ -0,0 +1,1572 @@
+# analise_frotas.py - Núcleo de análise da frota: carga, tipagem, horas, custos e utilização, sem Streamlit
+import argparse
+import copy
+import heapq
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+# Formatos de data de largura fixa conhecidos dos exports: nome exibido e formato de conversão
+FORMATOS_DATA = [
+    ('DD/MM/AAAA HH:MM:SS', '%d/%m/%Y %H:%M:%S'),
+    ('AAAA-MM-DD', '%Y-%m-%d'),
+    ('AAAA-MM-DD HH:MM:SS', '%Y-%m-%d %H:%M:%S'),
+    ('DD/MM/AAAA', '%d/%m/%Y')
+]
+
+# Colunas de data de cada tabela; as que trazem formatos misturados usam a conversão por formato
+COLUNAS_DATA = {
+    'vehicles': {'created_at': None},
+    'vehicle_uses': {'created_at': None, 'data_inicio': FORMATOS_DATA, 'data_fim': FORMATOS_DATA},
+    'maintenances': {'created_at': None, 'data_manutencao': None},
+    'users': {},
+    'point_records': {'created_at': None, 'data': None}
+}
+
+_LARGURA_DIRETIVAS = {'d': 2, 'm': 2, 'Y': 4, 'H': 2, 'M': 2, 'S': 2}
+
+def _layout_formato(formato):
+    """Assinatura de caracteres de um formato de largura fixa e o mapeamento de seus campos para ISO
+
+    Na assinatura cada dígito vira '9', de modo que '01/09/2025' e '31/12/2024' têm a mesma forma.
+    """
+    def percorrer(modelo):
+        caracteres, campos = [], {}
+        i = 0
+        while i < len(modelo):
+            if modelo[i] == '%':
+                campos[modelo[i + 1]] = len(caracteres)
+                caracteres.extend([ord('9')] * _LARGURA_DIRETIVAS[modelo[i + 1]])
+                i += 2
+            else:
+                caracteres.append(ord(modelo[i]))
+                i += 1
+        return caracteres, campos
+
+    assinatura, campos = percorrer(formato)
+    formato_iso = '%Y-%m-%d %H:%M:%S' if 'H' in campos else '%Y-%m-%d'
+    modelo_iso, campos_iso = percorrer(formato_iso)
+
+    origem, destino = [], []
+    for diretiva, inicio_iso in campos_iso.items():
+        for deslocamento in range(_LARGURA_DIRETIVAS[diretiva]):
+            origem.append(campos[diretiva] + deslocamento)
+            destino.append(inicio_iso + deslocamento)
+    literais = [i for i in range(len(modelo_iso)) if i not in set(destino)]
+
+    return {
+        'assinatura': np.array(assinatura + [0], dtype=np.uint32),
+        'origem': np.array(origem),
+        'destino': np.array(destino),
+        'literais': np.array(literais),
+        'valores_literais': np.array([modelo_iso[i] for i in literais], dtype=np.uint32),
+        'largura_iso': len(modelo_iso),
+        'formato_iso': formato_iso
+    }
+
+def converter_datas_formatos(serie, formatos=FORMATOS_DATA, tamanho_bloco=1_000_000):
+    """Converte uma coluna com formatos de data misturados, um formato explícito por vez
+
+    O formato de cada linha é detectado pela forma do texto (dígitos e separadores) e cada
+    grupo é reescrito em ISO e convertido de forma vetorizada; o que não casar com nenhum
+    formato cai no modo 'mixed'. Valores inválidos viram NaT, como em errors='coerce'.
+    Retorna a série convertida e a contagem de linhas por formato.
+    """
+    valores = serie.to_numpy(dtype=object)
+    presentes = serie.notna().to_numpy()
+    resultado = np.full(len(valores), np.datetime64('NaT'), dtype='datetime64[ns]')
+    reconhecidos = np.zeros(len(valores), dtype=bool)
+    layouts = [(nome, _layout_formato(formato)) for nome, formato in formatos]
+    largura = max(len(layout['assinatura']) for _, layout in layouts)
+    contagem = dict.fromkeys([nome for nome, _ in formatos], 0)
+
+    # Processar em blocos para limitar a memória dos textos de largura fixa
+    for inicio in range(0, len(valores), tamanho_bloco):
+        posicoes = np.flatnonzero(presentes[inicio:inicio + tamanho_bloco]) + inicio
+        if len(posicoes) == 0:
+            continue
+        texto = valores[posicoes].astype(f'U{largura}')
+        codigos = texto.view(np.uint32).reshape(len(texto), largura)
+        forma = np.where((codigos >= ord('0')) & (codigos <= ord('9')), ord('9'), codigos)
+
+        for nome, layout in layouts:
+            assinatura = layout['assinatura']
+            casados = (forma[:, :len(assinatura)] == assinatura).all(axis=1)
+            if not casados.any():
+                continue
+
+            iso = np.empty((int(casados.sum()), layout['largura_iso']), dtype=np.uint32)
+            iso[:, layout['destino']] = codigos[casados][:, layout['origem']]
+            iso[:, layout['literais']] = layout['valores_literais']
+            datas = pd.to_datetime(iso.view(f'U{layout["largura_iso"]}').ravel(), format=layout['formato_iso'], errors='coerce')
+
+            ok = datas.notna()
+            linhas = posicoes[casados]
+            resultado[linhas[ok]] = datas[ok].as_unit('ns').to_numpy()
+            reconhecidos[linhas] = True
+            contagem[nome] += int(ok.sum())
+
+    # Formatos desconhecidos: conversão elemento a elemento só para o restante
+    restantes = np.flatnonzero(presentes & ~reconhecidos)
+    if len(restantes):
+        # utc=True aceita textos com e sem fuso na mesma coluna; o resultado volta a ser ingênuo
+        datas = pd.to_datetime(pd.Series(valores[restantes]), format='mixed', errors='coerce', utc=True).dt.tz_convert(None)
+        ok = datas.notna().to_numpy()
+        resultado[restantes[ok]] = datas[ok].dt.as_unit('ns').to_numpy()
+        contagem['outros'] = int(ok.sum())
+
+    contagem = {nome: total for nome, total in contagem.items() if total}
+    contagem['inválidos'] = int(presentes.sum()) - sum(contagem.values())
+    return pd.Series(resultado, index=serie.index, name=serie.name), contagem
+
+def converter_datas_tabela(tabela, df):
+    """Converte as colunas de data conhecidas de uma tabela
+
+    A contagem de linhas por formato das colunas convertidas por formato fica em
+    df.attrs['formatos_data'].
+    """
+    for coluna, formatos in COLUNAS_DATA[tabela].items():
+        if coluna not in df.columns:
+            continue
+        if formatos is None or pd.api.types.is_datetime64_any_dtype(df[coluna]):
+            df[coluna] = pd.to_datetime(df[coluna], errors='coerce')
+        else:
+            df[coluna], contagem = converter_datas_formatos(df[coluna], formatos)
+            df.attrs.setdefault('formatos_data', {})[coluna] = contagem
+    return df
+
+class CacheArquivos:
+    """Cache LRU de tabelas já tipadas, indexado pelo hash do conteúdo do arquivo e limitado em bytes"""
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self.tamanho_bytes = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            if chave not in self._entradas:
+                return None
+            self._entradas.move_to_end(chave)
+            return self._entradas[chave][0]
+
+    def guardar(self, chave, df):
+        tamanho = int(df.memory_usage(deep=True).sum())
+        if tamanho > self.limite_bytes:
+            return
+        with self._lock:
+            if chave in self._entradas:
+                self.tamanho_bytes -= self._entradas.pop(chave)[1]
+            self._entradas[chave] = (df, tamanho)
+            self.tamanho_bytes += tamanho
+            # Descartar os arquivos usados há mais tempo até caber no limite
+            while self.tamanho_bytes > self.limite_bytes:
+                _, (_, tamanho_antigo) = self._entradas.popitem(last=False)
+                self.tamanho_bytes -= tamanho_antigo
+
+# Validade de uma concessão não renovada (sessão fechada sem liberar) e tempo que um conjunto
+# sem concessões fica na memória antes de ser descartado
+VALIDADE_CONCESSAO_S = 30 * 60
+OCIOSIDADE_MAXIMA_S = 10 * 60
+
+class RepositorioDados:
+    """Conjuntos de tabelas somente leitura compartilhados pelo processo, um por versão dos dados
+
+    Cada sessão guarda só a versão e mantém uma concessão sobre ela, renovada a cada acesso; a
+    contagem de concessões válidas é a contagem de referências do conjunto. As tabelas entregues são
+    cópias rasas: com copy-on-write (padrão no pandas 3, ligado pelo dashboard nas versões
+    anteriores), colunas novas ou alteradas numa sessão não afetam as demais.
+    Conjuntos sem concessões há mais de ociosidade_maxima_s segundos são descartados.
+    """
+
+    def __init__(self, validade_concessao_s=VALIDADE_CONCESSAO_S, ociosidade_maxima_s=OCIOSIDADE_MAXIMA_S):
+        self.validade_concessao_s = validade_concessao_s
+        self.ociosidade_maxima_s = ociosidade_maxima_s
+        self._conjuntos = {}
+        self._lock = threading.Lock()
+
+    def publicar(self, versao, tabelas, compartilhados=None):
+        """Guarda as tabelas da versão; se a versão já existe, o conjunto guardado é mantido
+
+        compartilhados são resultados já calculados para a versão (como as tabelas fato).
+        Retorna True quando a versão já estava no repositório.
+        """
+        novo = {
+            'tabelas': {tabela: df.copy(deep=False) for tabela, df in tabelas.items()},
+            'compartilhados': {},
+            'calculos': {},
+            'concessoes': {},
+            'ocioso_desde': time.monotonic(),
+            'bytes': sum(int(df.memory_usage(deep=True).sum()) for df in tabelas.values())
+        }
+        with self._lock:
+            self._despejar_ociosos()
+            existente = versao in self._conjuntos
+            if not existente:
+                self._conjuntos[versao] = novo
+            for nome, valor in (compartilhados or {}).items():
+                self._conjuntos[versao]['compartilhados'].setdefault(nome, valor)
+            return existente
+
+    def adquirir(self, versao, sessao):
+        """Concede (ou renova) à sessão o uso da versão; False se a versão não está no repositório"""
+        with self._lock:
+            self._despejar_ociosos()
+            conjunto = self._conjuntos.get(versao)
+            if conjunto is None:
+                return False
+            conjunto['concessoes'][sessao] = time.monotonic()
+            conjunto['ocioso_desde'] = None
+            return True
+
+    def liberar(self, versao, sessao):
+        """Encerra a concessão da sessão; a versão fica ociosa quando não resta nenhuma"""
+        with self._lock:
+            conjunto = self._conjuntos.get(versao)
+            if conjunto is not None and conjunto['concessoes'].pop(sessao, None) is not None and not conjunto['concessoes']:
+                conjunto['ocioso_desde'] = time.monotonic()
+
+    def tabelas(self, versao, sessao):
+        """Cópias rasas das tabelas da versão, renovando a concessão da sessão; None se descartada"""
+        if not self.adquirir(versao, sessao):
+            return None
+        with self._lock:
+            return {tabela: df.copy(deep=False) for tabela, df in self._conjuntos[versao]['tabelas'].items()}
+
+    def compartilhado(self, versao, nome, calcular):
+        """Resultado calculado uma única vez por versão e reaproveitado por todas as sessões
+
+        Não deve ser alterado por quem o recebe. Fora do repositório, apenas calcula.
+        """
+        with self._lock:
+            conjunto = self._conjuntos.get(versao)
+            if conjunto is None:
+                return calcular()
+            if nome in conjunto['compartilhados']:
+                return conjunto['compartilhados'][nome]
+            trava = conjunto['calculos'].setdefault(nome, threading.Lock())
+
+        # Sessões que pedem o mesmo resultado ao mesmo tempo esperam o primeiro cálculo
+        with trava:
+            if nome not in conjunto['compartilhados']:
+                conjunto['compartilhados'][nome] = calcular()
+            return conjunto['compartilhados'][nome]
+
+    def estatisticas(self):
+        """Versão, sessões com concessão, memória e tempo ocioso de cada conjunto guardado"""
+        agora = time.monotonic()
+        with self._lock:
+            self._despejar_ociosos()
+            linhas = [{
+                'versao': versao[:12],
+                'sessoes': len(conjunto['concessoes']),
+                'MB': round(conjunto['bytes'] / 1e6, 2),
+                'compartilhados': ', '.join(conjunto['compartilhados']),
+                'ocioso_s': round(agora - conjunto['ocioso_desde']) if conjunto['ocioso_desde'] is not None else 0
+            } for versao, conjunto in self._conjuntos.items()]
+        return pd.DataFrame(linhas, columns=['versao', 'sessoes', 'MB', 'compartilhados', 'ocioso_s'])
+
+    def _despejar_ociosos(self):
+        """Expira concessões não renovadas e descarta conjuntos ociosos há tempo demais (com o lock)"""
+        agora = time.monotonic()
+        for versao in list(self._conjuntos):
+            conjunto = self._conjuntos[versao]
+            for sessao, renovada in list(conjunto['concessoes'].items()):
+                if agora - renovada > self.validade_concessao_s:
+                    del conjunto['concessoes'][sessao]
+                    if not conjunto['concessoes']:
+                        conjunto['ocioso_desde'] = renovada + self.validade_concessao_s
+            if conjunto['ocioso_desde'] is not None and agora - conjunto['ocioso_desde'] > self.ociosidade_maxima_s:
+                del self._conjuntos[versao]
+
+# Esquema compacto de cada tabela:
+#   'uuid'       -> identificador único empacotado em 16 bytes (binário de largura fixa)
+#   'chave'      -> identificador repetido (chave estrangeira ou usada em junções), como categoria
+#   'categoria'  -> texto com poucos valores distintos, como categoria
+#   'coordenada' -> latitude/longitude em float32 quando a precisão permitir
+ESQUEMA_TABELAS = {
+    'vehicles': {
+        'id': 'chave', 'marca': 'categoria', 'modelo': 'categoria', 'status': 'categoria', 'tipo': 'categoria'
+    },
+    'vehicle_uses': {
+        'id': 'uuid', 'utilizador': 'categoria', 'status': 'categoria', 'vehicle_id': 'chave'
+    },
+    'maintenances': {
+        'id': 'uuid', 'vehicle_id': 'chave', 'status': 'categoria'
+    },
+    'users': {
+        'id': 'chave', 'funcao': 'categoria', 'acesso': 'categoria'
+    },
+    'point_records': {
+        'id': 'uuid', 'tipo': 'categoria', 'utilizador': 'categoria',
+        'latitude': 'coordenada', 'longitude': 'coordenada'
+    }
+}
+
+# Erro máximo aceito, em graus, ao guardar coordenadas em float32 (cerca de 1 metro)
+TOLERANCIA_COORDENADA = 1e-5
+
+# UUID em texto (8-4-4-4-12, maiúsculas ou minúsculas) e valor de cada dígito hexadecimal em ASCII
+PADRAO_UUID = r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'
+VALOR_HEXADECIMAL = np.zeros(256, dtype=np.uint8)
+for _inicio, _fim, _base in [('0', '9', ord('0')), ('a', 'f', ord('a') - 10), ('A', 'F', ord('A') - 10)]:
+    VALOR_HEXADECIMAL[ord(_inicio):ord(_fim) + 1] = np.arange(ord(_inicio), ord(_fim) + 1) - _base
+
+def empacotar_uuids(serie):
+    """Converte UUIDs em texto para binários de 16 bytes, de forma vetorizada
+
+    Retorna None se a série tiver nulos ou algum valor que não seja um UUID válido. Os dígitos são
+    lidos direto do buffer Arrow do texto, sem cópias intermediárias em objetos Python.
+    """
+    if len(serie) == 0 or serie.isna().any():
+        return None
+
+    texto = pa.array(serie, from_pandas=True)
+    if isinstance(texto, pa.ChunkedArray):
+        texto = texto.combine_chunks()
+    if pa.types.is_dictionary(texto.type):
+        texto = texto.dictionary_decode()
+    if not (pa.types.is_string(texto.type) or pa.types.is_large_string(texto.type)):
+        return None
+    if not pc.all(pc.match_substring_regex(texto, PADRAO_UUID)).as_py():
+        return None
+
+    # Sem os hífens, cada valor ocupa 32 dígitos seguidos no buffer de dados
+    digitos = pc.replace_substring(texto, '-', '')
+    tipo_offset = np.int64 if pa.types.is_large_string(digitos.type) else np.int32
+    inicio = int(np.frombuffer(digitos.buffers()[1], dtype=tipo_offset)[digitos.offset])
+    ascii_digitos = np.frombuffer(digitos.buffers()[2], dtype=np.uint8)[inicio:inicio + 32 * len(digitos)]
+    nibbles = VALOR_HEXADECIMAL[ascii_digitos.reshape(len(digitos), 32)]
+    octetos = np.ascontiguousarray((nibbles[:, 0::2] << 4) | nibbles[:, 1::2])
+
+    binarios = pa.FixedSizeBinaryArray.from_buffers(pa.binary(16), len(octetos), [None, pa.py_buffer(octetos)])
+    return pd.Series(pd.arrays.ArrowExtensionArray(binarios), index=serie.index, name=serie.name)
+
+def uuid_empacotado(dtype):
+    """Se o tipo é o de uma coluna de UUIDs empacotados por empacotar_uuids"""
+    return isinstance(dtype, pd.ArrowDtype) and pa.types.is_fixed_size_binary(dtype.pyarrow_dtype)
+
+def desempacotar_uuids(serie):
+    """Volta UUIDs empacotados em 16 bytes para o texto 8-4-4-4-12, mantendo os nulos"""
+    return serie.map(lambda valor: str(uuid.UUID(bytes=valor)), na_action='ignore').astype(object)
+
+def uuids_em_texto(df):
+    """O DataFrame com as colunas de UUIDs empacotados de volta em texto, para exibição"""
+    colunas = [coluna for coluna in df.columns if uuid_empacotado(df[coluna].dtype)]
+    if not colunas:
+        return df
+    df = df.copy()
+    for coluna in colunas:
+        df[coluna] = desempacotar_uuids(df[coluna])
+    return df
+
+def _erro_maximo(original, reduzida):
+    """Maior diferença absoluta entre as duas versões da coluna, em fatias para não copiar a coluna inteira"""
+    erro = 0.0
+    for inicio in range(0, len(original), TAMANHO_BLOCO_CSV):
+        fatia = slice(inicio, inicio + TAMANHO_BLOCO_CSV)
+        erro = max(erro, np.nanmax(np.abs(reduzida[fatia].astype(np.float64) - original[fatia]), initial=0.0))
+    return erro
+
+def aplicar_esquema(tabela, df):
+    """Aplica o esquema compacto da tabela e registra a memória antes e depois em df.attrs['memoria']"""
+    antes = int(df.memory_usage(deep=True).sum())
+
+    for coluna, tipo in ESQUEMA_TABELAS[tabela].items():
+        if coluna not in df.columns:
+            continue
+        serie = df[coluna]
+
+        if tipo == 'uuid':
+            # Já empacotada na leitura em blocos
+            if uuid_empacotado(serie.dtype):
+                continue
+            empacotada = empacotar_uuids(serie)
+            # Identificadores fora do padrão UUID ficam como categoria
+            df[coluna] = empacotada if empacotada is not None else serie.astype('category')
+        elif tipo in ('chave', 'categoria'):
+            df[coluna] = serie.astype('category')
+        elif tipo == 'coordenada' and pd.api.types.is_float_dtype(serie):
+            reduzida = serie.astype('float32')
+            if _erro_maximo(serie.to_numpy(), reduzida.to_numpy()) <= TOLERANCIA_COORDENADA or serie.isna().all():
+                df[coluna] = reduzida
+
+    df.attrs['memoria'] = {'antes': antes, 'depois': int(df.memory_usage(deep=True).sum())}
+    return df
+
+# Linhas por bloco na leitura em blocos
+TAMANHO_BLOCO_CSV = 50_000
+
+# Tipos do esquema lidos sempre como texto, para o tipo não depender do conteúdo de cada bloco
+TIPOS_TEXTO = {'uuid', 'chave', 'categoria'}
+
+def tipos_leitura(tabela):
+    """dtype do read_csv para as colunas que o esquema da tabela declara como texto"""
+    return {coluna: 'str' for coluna, tipo in ESQUEMA_TABELAS.get(tabela, {}).items() if tipo in TIPOS_TEXTO}
+
+def _estreitar_bloco(tabela, bloco):
+    """Reduz os tipos de um bloco logo após a leitura, para nenhuma coluna de texto chegar inteira à junção
+
+    Datas convertidas, UUIDs empacotados em 16 bytes, chaves e categorias do esquema como
+    categoria e inteiros no menor tipo possível. Um bloco com UUIDs fora do padrão fica em texto.
+    """
+    bloco = converter_datas_tabela(tabela, bloco)
+    esquema = ESQUEMA_TABELAS.get(tabela, {})
+    for coluna in bloco.columns:
+        tipo = esquema.get(coluna)
+        if tipo == 'uuid':
+            empacotada = empacotar_uuids(bloco[coluna])
+            if empacotada is not None:
+                bloco[coluna] = empacotada
+        elif tipo in ('chave', 'categoria'):
+            bloco[coluna] = bloco[coluna].astype('category')
+        elif pd.api.types.is_integer_dtype(bloco[coluna]):
+            bloco[coluna] = pd.to_numeric(bloco[coluna], downcast='integer')
+    return bloco
+
+def _como_texto(serie):
+    """Valores de uma coluna numérica como o texto do CSV (inteiros sem '.0'), mantendo os nulos"""
+    if pd.api.types.is_float_dtype(serie) and (serie.dropna() % 1 == 0).all():
+        serie = serie.astype('Int64')
+    return serie.map(str, na_action='ignore').astype(object)
+
+def _harmonizar_partes(partes):
+    """Partes de uma coluna com tipos diferentes entre os blocos viram texto
+
+    Colunas fora do esquema podem ser inferidas como número num bloco e texto em outro; assim o
+    resultado é o da leitura inteira, que vê a coluna toda como texto, e não uma mistura de números
+    e textos que não casa nas junções. UUIDs empacotados ao lado de um bloco que não pôde ser
+    empacotado voltam ao texto 8-4-4-4-12, e o esquema guarda a coluna como categoria.
+    """
+    if any(uuid_empacotado(parte.dtype) for parte in partes) and not all(uuid_empacotado(parte.dtype) for parte in partes):
+        partes = [desempacotar_uuids(parte) if uuid_empacotado(parte.dtype) else parte for parte in partes]
+    textos = [parte.dtype for parte in partes if not pd.api.types.is_numeric_dtype(parte) and not pd.api.types.is_bool_dtype(parte)]
+    if not textos or len(textos) == len(partes):
+        return partes
+    return [parte if not pd.api.types.is_numeric_dtype(parte) else _como_texto(parte).astype(textos[0]) for parte in partes]
+
+def _concatenar_blocos(blocos):
+    """Junta os blocos coluna a coluna, liberando cada parte assim que a coluna final é montada"""
+    colunas = {}
+    for coluna in list(blocos[0].columns):
+        partes = [bloco.pop(coluna) for bloco in blocos]
+        if isinstance(partes[0].dtype, pd.CategoricalDtype):
+            colunas[coluna] = pd.Series(pd.api.types.union_categoricals(partes), name=coluna)
+        else:
+            colunas[coluna] = pd.concat(_harmonizar_partes(partes), ignore_index=True)
+        del partes
+    # Sem copy=False, o DataFrame copiaria (e consolidaria) as colunas recém-montadas
+    return pd.DataFrame(colunas, copy=False)
+
+def ler_csv_em_blocos(tabela, conteudo, progresso=None):
+    """Lê um CSV em blocos, convertendo datas, empacotando UUIDs e estreitando os tipos de cada bloco antes de juntá-los
+
+    Assim o pico de memória fica próximo do tamanho da tabela final, em vez de várias vezes
+    o tamanho do arquivo. progresso, se informado, recebe a fração do arquivo já lida.
+    """
+    buffer = io.BytesIO(conteudo)
+    blocos, formatos_data = [], {}
+
+    for bloco in pd.read_csv(buffer, chunksize=TAMANHO_BLOCO_CSV, dtype=tipos_leitura(tabela)):
+        bloco = _estreitar_bloco(tabela, bloco)
+        blocos.append(bloco)
+
+        # Somar a contagem de formatos de data de todos os blocos
+        for coluna, contagem in bloco.attrs.get('formatos_data', {}).items():
+            total = formatos_data.setdefault(coluna, {})
+            for formato, linhas in contagem.items():
+                total[formato] = total.get(formato, 0) + linhas
+
+        if progresso is not None:
+            progresso(min(buffer.tell() / max(len(conteudo), 1), 1.0))
+
+    df = _concatenar_blocos(blocos)
+    if formatos_data:
+        df.attrs['formatos_data'] = formatos_data
+    return df
+
+def ler_tabela(tabela, conteudo, em_blocos=False, progresso=None):
+    """Lê um CSV (bytes) de uma das tabelas, converte as datas e aplica o esquema compacto
+
+    Com em_blocos=True o arquivo é lido por ler_csv_em_blocos.
+    """
+    if em_blocos:
+        df = ler_csv_em_blocos(tabela, conteudo, progresso)
+    else:
+        df = converter_datas_tabela(tabela, pd.read_csv(io.BytesIO(conteudo), dtype=tipos_leitura(tabela)))
+    return aplicar_esquema(tabela, df)
+
+def ler_pasta(pasta, em_blocos=False):
+    """Lê as cinco tabelas de <pasta>/<tabela>.csv, como gravadas pelos exports ou pelo gerador de dados"""
+    return {tabela: ler_tabela(tabela, (Path(pasta) / f'{tabela}.csv').read_bytes(), em_blocos) for tabela in COLUNAS_DATA}
+
+def empilhar_tabelas(partes):
+    """Empilha tabelas com as mesmas colunas, unindo as categorias das colunas categóricas"""
+    colunas = {}
+    for coluna in partes[0].columns:
+        series = [parte[coluna] for parte in partes]
+        categorias = next((serie.cat.categories for serie in series if isinstance(serie.dtype, pd.CategoricalDtype)), None)
+        if categorias is not None:
+            # Todas as partes viram categoria com o mesmo tipo de categorias, mesmo se forem só nulos
+            categoricas = [
+                serie.cat.rename_categories(serie.cat.categories.astype(categorias.dtype))
+                if isinstance(serie.dtype, pd.CategoricalDtype)
+                else pd.Categorical(serie, categories=pd.Index(serie.dropna().unique()).astype(categorias.dtype))
+                for serie in series
+            ]
+            colunas[coluna] = pd.Series(pd.api.types.union_categoricals(categoricas, ignore_order=True), name=coluna)
+        else:
+            colunas[coluna] = pd.concat(series, ignore_index=True)
+    return pd.DataFrame(colunas)
+
+def mesclar_registros(atual, novos):
+    """Acrescenta registros novos a uma tabela; um id já existente substitui o registro antigo
+
+    Retorna a tabela combinada e as linhas antigas substituídas. Tabelas sem coluna id
+    recebem os registros sem deduplicação.
+    """
+    novos = novos.reindex(columns=atual.columns)
+    if 'id' not in atual.columns:
+        return empilhar_tabelas([atual, novos]), atual.iloc[:0]
+
+    novos = novos.drop_duplicates('id', keep='last')
+    substituidos = atual['id'].isin(novos['id']).to_numpy()
+    return empilhar_tabelas([atual[~substituidos], novos]), atual[substituidos]
+
+# Pasta do último snapshot colunar dos dados carregados
+PASTA_SNAPSHOT = Path('.snapshots') / 'ultimo'
+
+def salvar_snapshot(tabelas, versao, pasta=PASTA_SNAPSHOT):
+    """Grava as tabelas tipadas em Feather (Arrow IPC) sem compressão, para leitura mapeada em memória
+
+    A gravação é feita numa pasta temporária e trocada de uma vez, para nunca deixar um
+    snapshot pela metade.
+    """
+    pasta = Path(pasta)
+    temporaria = pasta.with_name(pasta.name + '.tmp')
+    shutil.rmtree(temporaria, ignore_errors=True)
+    temporaria.mkdir(parents=True)
+
+    for tabela, df in tabelas.items():
+        feather.write_feather(df, temporaria / f'{tabela}.feather', compression='uncompressed')
+
+    metadados = {
+        'versao': versao,
+        'criado_em': datetime.now().isoformat(timespec='seconds'),
+        'linhas': {tabela: len(df) for tabela, df in tabelas.items()},
+        'attrs': {tabela: df.attrs for tabela, df in tabelas.items()}
+    }
+    (temporaria / 'metadados.json').write_text(json.dumps(metadados, ensure_ascii=False, default=str))
+
+    shutil.rmtree(pasta, ignore_errors=True)
+    temporaria.rename(pasta)
+
+def info_snapshot(pasta=PASTA_SNAPSHOT):
+    """Metadados do snapshot salvo, ou None se não houver"""
+    arquivo = Path(pasta) / 'metadados.json'
+    if not arquivo.exists():
+        return None
+    return json.loads(arquivo.read_text())
+
+def ler_snapshot(pasta=PASTA_SNAPSHOT):
+    """Lê as tabelas do snapshot mapeando os arquivos em memória
+
+    Os tipos (datas, categorias, decimais) voltam como foram gravados. Retorna as
+    tabelas e os metadados.
+    """
+    pasta = Path(pasta)
+    metadados = info_snapshot(pasta)
+    tabelas = {}
+    for tabela in COLUNAS_DATA:
+        df = feather.read_table(pasta / f'{tabela}.feather', memory_map=True).to_pandas(
+            types_mapper=lambda tipo: pd.ArrowDtype(tipo) if pa.types.is_fixed_size_binary(tipo) else None
+        )
+        df.attrs.update(metadados['attrs'].get(tabela, {}))
+        tabelas[tabela] = df
+    return tabelas, metadados
+
+def construir_dim_veiculos(vehicles):
+    """Dimensão de veículos indexada pelo id (em texto), com a placa e o rótulo 'placa - marca modelo'"""
+    veiculos = vehicles.drop_duplicates('id')
+    ids = pd.Index(veiculos['id'].astype(str), name='id')
+
+    placa = veiculos['placa'].astype(str).to_numpy() if 'placa' in veiculos.columns else ids.str[:8]
+    rotulo = pd.Series(placa, index=ids)
+    if 'marca' in veiculos.columns and 'modelo' in veiculos.columns:
+        rotulo = rotulo + ' - ' + veiculos['marca'].astype(str).to_numpy() + ' ' + veiculos['modelo'].astype(str).to_numpy()
+
+    return pd.DataFrame({'placa': placa, 'rotulo': rotulo.to_numpy()}, index=ids)
+
+# Distância máxima plausível numa única utilização e formato aceito para 'inicio / fim'
+LIMITE_DISTANCIA_KM = 2_000
+PADRAO_QUILOMETRAGEM = r'^\s*(?P<inicio>\d{1,15})\s*/\s*(?P<fim>\d{1,15})\s*$'
+ALERTAS_QUILOMETRAGEM = ['invertida', 'implausível', 'ilegível']
+
+def _ler_pares_quilometragem(valores):
+    """Lê textos 'inicio / fim' em dois vetores int64 e uma máscara de leituras válidas
+
+    A expressão regular roda vetorizada no Arrow, numa única passada e sem laço por linha.
+    """
+    texto = pa.array(valores, from_pandas=True)
+    if not pa.types.is_string(texto.type) and not pa.types.is_large_string(texto.type):
+        texto = pc.cast(texto, pa.string())
+
+    partes = pc.extract_regex(texto, PADRAO_QUILOMETRAGEM)
+    inicio = pc.cast(pc.struct_field(partes, 'inicio'), pa.int64()).fill_null(0)
+    fim = pc.cast(pc.struct_field(partes, 'fim'), pa.int64()).fill_null(0)
+    validos = partes.is_valid()
+
+    return inicio.to_numpy(), fim.to_numpy(), validos.to_numpy(zero_copy_only=False)
+
+def separar_quilometragem(serie):
+    """Separa a quilometragem 'inicio / fim' em colunas inteiras e sinaliza leituras suspeitas
+
+    Retorna um DataFrame com km_inicio, km_fim, distancia_km (só para leituras confiáveis) e
+    km_alerta: 'invertida' (fim menor que o início), 'implausível' (mais de LIMITE_DISTANCIA_KM)
+    ou 'ilegível' (texto fora do padrão). Séries categóricas são lidas uma vez por categoria.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        inicio, fim, validos = _ler_pares_quilometragem(serie.cat.categories.to_numpy(dtype=object))
+        # Código -1 (nulo) aponta para a leitura inválida acrescentada no fim
+        codigos = serie.cat.codes.to_numpy()
+        inicio, fim, validos = np.append(inicio, 0)[codigos], np.append(fim, 0)[codigos], np.append(validos, False)[codigos]
+    else:
+        inicio, fim, validos = _ler_pares_quilometragem(serie.to_numpy(dtype=object))
+
+    distancia = fim - inicio
+    invertida = validos & (distancia < 0)
+    implausivel = validos & (distancia > LIMITE_DISTANCIA_KM)
+    confiavel = validos & ~invertida & ~implausivel
+
+    alerta = np.select(
+        [invertida, implausivel, ~validos & serie.notna().to_numpy()],
+        [0, 1, 2],
+        default=-1
+    )
+
+    return pd.DataFrame({
+        'km_inicio': pd.arrays.IntegerArray(inicio, ~validos),
+        'km_fim': pd.arrays.IntegerArray(fim, ~validos),
+        'distancia_km': pd.arrays.IntegerArray(distancia, ~confiavel),
+        'km_alerta': pd.Categorical.from_codes(alerta, ALERTAS_QUILOMETRAGEM)
+    }, index=serie.index)
+
+# Grade geográfica dos registros de ponto: células de TAMANHO_CELULA_GRAUS de lado (~110 m de
+# latitude), calculadas na carga; o nível n da grade junta 2**n x 2**n células
+TAMANHO_CELULA_GRAUS = 0.001
+COLUNAS_GRADE = 1 << 20
+CELULAS_MAXIMAS_MAPA = 2_000
+NIVEL_LOCAIS = 2
+MINIMO_REGISTROS_LOCAL = 5
+RAIO_PADRAO_LOCAL_M = 200
+RAIO_TERRA_M = 6_371_000
+
+def celulas_grade(latitude, longitude):
+    """Linha e coluna da célula da grade de cada coordenada (-1 para coordenada ausente ou inválida)"""
+    lat = pd.to_numeric(latitude, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    lon = pd.to_numeric(longitude, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    validas = (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+
+    linha = np.full(len(lat), -1, dtype=np.int32)
+    coluna = np.full(len(lon), -1, dtype=np.int32)
+    linha[validas] = np.floor((lat[validas] + 90) / TAMANHO_CELULA_GRAUS)
+    coluna[validas] = np.floor((lon[validas] + 180) / TAMANHO_CELULA_GRAUS)
+    return linha, coluna
+
+def _chaves_celulas(ponto, nivel):
+    """Chave inteira da célula, no nível dado, de cada registro com coordenada válida"""
+    validos = ponto['celula_linha'].to_numpy() >= 0
+    fator = 2 ** nivel
+    linha = ponto['celula_linha'].to_numpy()[validos].astype(np.int64) // fator
+    coluna = ponto['celula_coluna'].to_numpy()[validos].astype(np.int64) // fator
+    return validos, linha * COLUNAS_GRADE + coluna
+
+def densidade_grade(ponto, maximo=CELULAS_MAXIMAS_MAPA):
+    """Registros por célula no nível mais fino da grade que caiba em até maximo células
+
+    Retorna (nivel, densidade), com o centro (latitude, longitude) e a contagem de cada célula.
+    """
+    colunas = ['latitude', 'longitude', 'registros']
+    if 'celula_linha' not in ponto.columns:
+        return 0, pd.DataFrame(columns=colunas)
+
+    # Contagem por célula fina uma vez; os níveis mais grossos agregam essa contagem
+    _, chaves = _chaves_celulas(ponto, 0)
+    celulas, registros = np.unique(chaves, return_counts=True)
+    linha, coluna = celulas // COLUNAS_GRADE, celulas % COLUNAS_GRADE
+
+    nivel = 0
+    while True:
+        fator = 2 ** nivel
+        grossas, posicoes = np.unique((linha // fator) * COLUNAS_GRADE + coluna // fator, return_inverse=True)
+        if len(grossas) <= maximo or nivel >= 16:
+            break
+        nivel += 1
+
+    lado = TAMANHO_CELULA_GRAUS * fator
+    return nivel, pd.DataFrame({
+        'latitude': (grossas // COLUNAS_GRADE + 0.5) * lado - 90,
+        'longitude': (grossas % COLUNAS_GRADE + 0.5) * lado - 180,
+        'registros': np.bincount(posicoes, weights=registros).astype(np.int64)
+    }, columns=colunas)
+
+def distancia_metros(latitude, longitude, latitude_centro, longitude_centro):
+    """Distância em metros (haversine) de cada coordenada até o centro"""
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    lat0, lon0 = np.radians(latitude_centro), np.radians(longitude_centro)
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * np.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * RAIO_TERRA_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def fora_do_raio(latitude, longitude, latitude_centro, longitude_centro, raio_m):
+    """Máscara dos registros a mais de raio_m metros do centro; coordenadas ausentes ficam de fora
+
+    Quem está fora da caixa em graus que envolve o círculo já está fora do raio; a distância
+    só é calculada para quem está dentro da caixa.
+    """
+    lat = np.asarray(latitude, dtype='float64')
+    lon = np.asarray(longitude, dtype='float64')
+    meia_altura = np.degrees(raio_m / RAIO_TERRA_M)
+    # A largura em graus cresce com a latitude: usar a borda da caixa mais perto do polo
+    meia_largura = meia_altura / max(np.cos(np.radians(min(abs(latitude_centro) + meia_altura, 89.9))), 1e-6)
+
+    conhecidas = np.isfinite(lat) & np.isfinite(lon)
+    fora = conhecidas & ((np.abs(lat - latitude_centro) > meia_altura) | (np.abs(lon - longitude_centro) > meia_largura))
+    na_caixa = np.flatnonzero(conhecidas & ~fora)
+    fora[na_caixa] = distancia_metros(lat[na_caixa], lon[na_caixa], latitude_centro, longitude_centro) > raio_m
+    return fora
+
+def agrupar_locais(ponto, nivel=NIVEL_LOCAIS, minimo=MINIMO_REGISTROS_LOCAL):
+    """Locais de registro: grupos de células vizinhas (inclusive na diagonal) do nível dado, com pelo menos minimo registros cada
+
+    Retorna o resumo dos locais, do mais movimentado para o menos (centro, registros, usuários e o
+    raio que cobre 95% dos registros), e o local de cada registro (-1 fora de qualquer local).
+    """
+    colunas = ['local', 'latitude', 'longitude', 'registros', 'usuarios', 'raio_p95_m']
+    local = np.full(len(ponto), -1, dtype=np.int64)
+    if 'celula_linha' not in ponto.columns:
+        return pd.DataFrame(columns=colunas), local
+
+    validos, chaves = _chaves_celulas(ponto, nivel)
+    celulas, inversa, contagens = np.unique(chaves, return_inverse=True, return_counts=True)
+    densas = contagens >= minimo
+
+    # Cada célula densa começa com o próprio rótulo e fica com o menor rótulo da vizinhança,
+    # até estabilizar (componentes conexos sobre a grade)
+    rotulo = np.where(densas, np.arange(len(celulas)), -1)
+    linha, coluna = celulas // COLUNAS_GRADE, celulas % COLUNAS_GRADE
+    ligacoes = []
+    for delta_linha in (-1, 0, 1):
+        for delta_coluna in (-1, 0, 1):
+            if delta_linha == delta_coluna == 0:
+                continue
+            vizinha = (linha + delta_linha) * COLUNAS_GRADE + coluna + delta_coluna
+            posicao = np.minimum(np.searchsorted(celulas, vizinha), len(celulas) - 1)
+            ligada = densas & (celulas[posicao] == vizinha) & densas[posicao]
+            ligacoes.append((np.flatnonzero(ligada), posicao[ligada]))
+    while True:
+        anterior = rotulo.copy()
+        for origem, destino in ligacoes:
+            rotulo[origem] = np.minimum(rotulo[origem], rotulo[destino])
+        rotulo[densas] = rotulo[rotulo[densas]]
+        if np.array_equal(rotulo, anterior):
+            break
+
+    # Locais numerados do mais movimentado para o menos
+    registros_rotulo = np.bincount(rotulo[densas], weights=contagens[densas], minlength=len(celulas))
+    ordem = np.argsort(-registros_rotulo, kind='stable')
+    numero = np.full(len(celulas), -1, dtype=np.int64)
+    numero[ordem[registros_rotulo[ordem] > 0]] = np.arange(int((registros_rotulo > 0).sum()))
+    local_celula = np.where(densas, numero[np.maximum(rotulo, 0)], -1)
+    local[validos] = local_celula[inversa]
+
+    if not (local >= 0).any():
+        return pd.DataFrame(columns=colunas), local
+
+    no_local = local >= 0
+    lat = pd.to_numeric(ponto['latitude'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)[no_local]
+    lon = pd.to_numeric(ponto['longitude'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)[no_local]
+    # Usuários contados pelo código (sem materializar os e-mails); sem usuário fica nulo
+    codigos = pd.factorize(ponto['utilizador'])[0] if 'utilizador' in ponto.columns else np.full(len(ponto), -1)
+    usuarios = np.where(codigos >= 0, codigos, np.nan)
+    grupos = pd.DataFrame({'local': local[no_local], 'latitude': lat, 'longitude': lon, 'utilizador': usuarios[no_local]})
+    resumo = grupos.groupby('local').agg(latitude=('latitude', 'mean'), longitude=('longitude', 'mean'),
+                                         registros=('latitude', 'size'), usuarios=('utilizador', 'nunique'))
+    grupos['distancia'] = distancia_metros(lat, lon, resumo['latitude'].to_numpy()[local[no_local]],
+                                           resumo['longitude'].to_numpy()[local[no_local]])
+    resumo['raio_p95_m'] = grupos.groupby('local')['distancia'].quantile(0.95).round(0)
+    return resumo.reset_index()[colunas], local
+
+def locais_principais(ponto, local):
+    """Local onde cada usuário mais registra ponto"""
+    registros = pd.DataFrame({'utilizador': ponto['utilizador'].to_numpy(), 'local': local})
+    contagem = registros[registros['local'] >= 0].value_counts(sort=True)
+    return contagem.reset_index().drop_duplicates('utilizador').set_index('utilizador')['local']
+
+def zoom_mapa(latitude, longitude):
+    """Zoom do mapa que enquadra as coordenadas"""
+    extensao = max(latitude.max() - latitude.min(), longitude.max() - longitude.min(), TAMANHO_CELULA_GRAUS)
+    return float(np.clip(np.log2(360 / extensao) - 1, 1, 16))
+
+def _posicoes_na_dimensao(chaves, indice_dimensao):
+    """Posição de cada chave no índice (em texto) de uma dimensão, ou -1 se a chave não existir
+
+    Chaves categóricas são procuradas uma vez por categoria, não por linha.
+    """
+    if isinstance(chaves.dtype, pd.CategoricalDtype):
+        por_categoria = indice_dimensao.get_indexer(chaves.cat.categories.astype(str))
+        # Código -1 (nulo) aponta para o -1 acrescentado no fim
+        return np.append(por_categoria, -1)[chaves.cat.codes.to_numpy()]
+    return indice_dimensao.get_indexer(chaves.astype(str).where(chaves.notna(), None))
+
+def _juntar_dimensao(fato, chave, dimensao, colunas):
+    """Acrescenta ao fato as colunas da dimensão (indexada por texto) e retorna a máscara de linhas órfãs"""
+    posicoes = _posicoes_na_dimensao(fato[chave], dimensao.index)
+    encontrados = posicoes >= 0
+
+    for destino, origem in colunas.items():
+        valores = np.full(len(fato), None, dtype=object)
+        valores[encontrados] = dimensao[origem].to_numpy(dtype=object)[posicoes[encontrados]]
+        fato[destino] = pd.Series(valores, index=fato.index).astype('category')
+
+    return ~encontrados & fato[chave].notna().to_numpy()
+
+def _dimensao_usuarios(users, chave):
+    """Usuários indexados por nome ou e-mail (em texto), sem chaves repetidas"""
+    usuarios = users.dropna(subset=[chave]).drop_duplicates(chave)
+    return usuarios.set_index(pd.Index(usuarios[chave].astype(str), name=chave))
+
+# Tabela de origem de cada tabela fato e relações verificadas: (relação, fato, chave, coluna que marca o órfão)
+TABELAS_FATO = {'vehicle_uses': 'utilizacoes', 'maintenances': 'manutencoes', 'point_records': 'ponto'}
+RELACOES_FATOS = [
+    ('Utilizações → Veículos', 'utilizacoes', 'vehicle_id', 'orfao_veiculo'),
+    ('Utilizações → Usuários (nome)', 'utilizacoes', 'utilizador', 'orfao_usuario'),
+    ('Manutenções → Veículos', 'manutencoes', 'vehicle_id', 'orfao_veiculo'),
+    ('Ponto → Usuários (e-mail)', 'ponto', 'utilizador', 'orfao_usuario')
+]
+
+def _juntar_veiculos(fato, dim_veiculos):
+    """Junta placa e rótulo do veículo; veículos desconhecidos aparecem pelos 8 primeiros caracteres do id"""
+    mascara = _juntar_dimensao(fato, 'vehicle_id', dim_veiculos, {'veiculo': 'placa', 'rotulo_veiculo': 'rotulo'})
+    if mascara.any():
+        rotulos = pd.Index(fato['vehicle_id'].to_numpy()[mascara]).astype(str).str[:8]
+        novas = rotulos.unique().difference(fato['veiculo'].cat.categories)
+        fato['veiculo'] = fato['veiculo'].cat.add_categories(novas)
+        fato.loc[mascara, 'veiculo'] = rotulos
+    fato['orfao_veiculo'] = mascara
+
+def construir_fato(tabela, df, dim_veiculos, users):
+    """Tabela fato de utilizações, manutenções ou ponto, já juntada às dimensões de veículos e usuários"""
+    fato = df.copy(deep=False)
+
+    if tabela == 'vehicle_uses':
+        # Utilizações × veículos × usuários (pelo nome do motorista)
+        if 'vehicle_id' in fato.columns:
+            _juntar_veiculos(fato, dim_veiculos)
+        if 'utilizador' in fato.columns and 'nome' in users.columns:
+            colunas = {f'{coluna}_usuario': coluna for coluna in ['email', 'funcao'] if coluna in users.columns}
+            fato['orfao_usuario'] = _juntar_dimensao(fato, 'utilizador', _dimensao_usuarios(users, 'nome'), colunas)
+        if 'quilometragem' in fato.columns:
+            quilometragem = separar_quilometragem(fato['quilometragem'])
+            for coluna in quilometragem.columns:
+                fato[coluna] = quilometragem[coluna]
+        if 'data_inicio' in fato.columns and 'data_fim' in fato.columns:
+            fato['duracao_horas'] = (fato['data_fim'] - fato['data_inicio']).dt.total_seconds() / 3600
+
+    elif tabela == 'maintenances':
+        # Manutenções × veículos
+        if 'vehicle_id' in fato.columns:
+            _juntar_veiculos(fato, dim_veiculos)
+        if 'data_manutencao' in fato.columns:
+            fato['mes'] = fato['data_manutencao'].dt.to_period('M')
+
+    elif tabela == 'point_records':
+        # Registros de ponto × usuários (pelo e-mail)
+        if 'utilizador' in fato.columns and 'email' in users.columns:
+            colunas = {f'{coluna}_usuario': coluna for coluna in ['nome', 'funcao'] if coluna in users.columns}
+            fato['orfao_usuario'] = _juntar_dimensao(fato, 'utilizador', _dimensao_usuarios(users, 'email'), colunas)
+        if 'utilizador' in fato.columns:
+            # Nome do usuário quando conhecido, senão o e-mail registrado no ponto
+            nomes = fato['nome_usuario'].astype(object) if 'nome_usuario' in fato.columns else pd.Series(None, index=fato.index, dtype=object)
+            fato['usuario'] = nomes.where(nomes.notna(), fato['utilizador'].astype(object)).astype('category')
+        if 'data' in fato.columns and pd.api.types.is_datetime64_any_dtype(fato['data']):
+            fato['hora'] = fato['data'].dt.hour
+        if 'latitude' in fato.columns and 'longitude' in fato.columns:
+            # Célula da grade geográfica de cada registro, para mapas e locais sem reler as coordenadas
+            fato['celula_linha'], fato['celula_coluna'] = celulas_grade(fato['latitude'], fato['longitude'])
+
+    return fato
+
+def relatorio_orfaos(fatos):
+    """Quantidade e exemplos de chaves das tabelas fato que não existem na dimensão correspondente"""
+    linhas = []
+    for relacao, nome, chave, marcador in RELACOES_FATOS:
+        fato = fatos[nome]
+        if marcador not in fato.columns:
+            continue
+        mascara = fato[marcador].to_numpy(dtype=bool)
+        chaves = pd.Series(fato[chave].to_numpy()[mascara]).astype(str)
+        linhas.append({
+            'relação': relacao,
+            'registros órfãos': int(mascara.sum()),
+            'chaves órfãs': chaves.nunique(),
+            'exemplos': ', '.join(chaves.drop_duplicates().head(5))
+        })
+    return pd.DataFrame(linhas, columns=['relação', 'registros órfãos', 'chaves órfãs', 'exemplos'])
+
+def construir_fatos(vehicles, vehicle_uses, maintenances, users, point_records):
+    """Tabelas fato desnormalizadas, montadas uma vez na carga dos dados
+
+    - 'utilizacoes': utilizações × veículos × usuários (pelo nome do motorista)
+    - 'manutencoes': manutenções × veículos
+    - 'ponto': registros de ponto × usuários (pelo e-mail)
+    - 'orfaos': chaves que não existem na dimensão correspondente
+    """
+    dim_veiculos = construir_dim_veiculos(vehicles)
+    tabelas = {'vehicle_uses': vehicle_uses, 'maintenances': maintenances, 'point_records': point_records}
+
+    fatos = {nome: construir_fato(tabela, tabelas[tabela], dim_veiculos, users) for tabela, nome in TABELAS_FATO.items()}
+    fatos['orfaos'] = relatorio_orfaos(fatos)
+    return fatos
+
+# Tipo da coluna 'dia' das horas diárias: o mesmo nos dois modos de pareamento, qualquer que seja
+# a unidade da coluna data
+TIPO_DIA = 'datetime64[ns]'
+
+def registros_ponto_validos(point_records):
+    """ENTRADAS e SAÍDAS com usuário e data, com o dia de cada registro (e o id, se houver)"""
+    colunas = [coluna for coluna in ['id', 'utilizador', 'tipo', 'data'] if coluna in point_records.columns]
+    validos = point_records[
+        point_records['utilizador'].notna() &
+        point_records['data'].notna() &
+        point_records['tipo'].isin(['ENTRADA', 'SAÍDA'])
+    ][colunas]
+    return validos.assign(dia=validos['data'].dt.normalize().astype(TIPO_DIA))
+
+def parear_turnos(validos, turno_maximo):
+    """Pareia registros consecutivos ENTRADA → SAÍDA na linha do tempo de cada usuário, sem olhar o dia
+
+    Um par só vale se a SAÍDA vier depois da ENTRADA e em até turno_maximo. Retorna as jornadas
+    (utilizador, entrada, saida) e os registros órfãos, com o motivo de cada um.
+    """
+    if validos.empty:
+        return (pd.DataFrame(columns=['utilizador', 'entrada', 'saida']),
+                validos.drop(columns='dia').assign(motivo=pd.Series(dtype=object)))
+
+    ordenados = validos.sort_values(['utilizador', 'data'], kind='stable')
+    usuarios = pd.factorize(ordenados['utilizador'])[0]
+    datas = ordenados['data'].to_numpy()
+    entrada = (ordenados['tipo'] == 'ENTRADA').to_numpy()
+
+    # Cada registro comparado com o seguinte do mesmo usuário
+    mesmo_usuario = np.append(usuarios[1:] == usuarios[:-1], False)
+    seguinte_saida = np.append(~entrada[1:], False) & mesmo_usuario
+    intervalo = np.append(datas[1:] - datas[:-1], np.timedelta64('NaT'))
+    dentro_turno = (intervalo > np.timedelta64(0)) & (intervalo <= np.timedelta64(turno_maximo))
+
+    inicia_par = entrada & seguinte_saida & dentro_turno
+    fecha_par = np.append(False, inicia_par[:-1])
+    longo = entrada & seguinte_saida & (intervalo > np.timedelta64(turno_maximo))
+
+    jornadas = pd.DataFrame({
+        'utilizador': ordenados['utilizador'].to_numpy()[inicia_par],
+        'entrada': datas[inicia_par],
+        'saida': datas[fecha_par]
+    })
+
+    orfao = (entrada & ~inicia_par) | (~entrada & ~fecha_par)
+    motivo = np.where(
+        longo | np.append(False, longo[:-1]), 'turno acima do máximo',
+        np.where(entrada, 'entrada sem saída', 'saída sem entrada')
+    )
+    orfaos = ordenados[orfao].drop(columns='dia').assign(motivo=motivo[orfao])
+    return jornadas, orfaos
+
+def diario_vazio():
+    """Horas diárias sem nenhuma linha, já com os tipos das colunas"""
+    return pd.DataFrame({
+        'utilizador': pd.Series(dtype=object),
+        'dia': pd.Series(dtype=TIPO_DIA),
+        'horas_trabalhadas': pd.Series(dtype=float)
+    })
+
+def dividir_por_dia(jornadas):
+    """Soma as horas de cada jornada nos dias que ela ocupa, dividindo na meia-noite"""
+    colunas = ['utilizador', 'dia', 'horas_trabalhadas']
+    if jornadas.empty:
+        return diario_vazio()
+
+    entrada = jornadas['entrada'].to_numpy()
+    saida = jornadas['saida'].to_numpy()
+    um_dia = np.timedelta64(1, 'D')
+
+    # Uma linha por dia ocupado (a saída exatamente à meia-noite não ocupa o dia seguinte)
+    primeiro_dia = entrada.astype('datetime64[D]')
+    dias_ocupados = ((saida - np.timedelta64(1, 'ns')).astype('datetime64[D]') - primeiro_dia).astype(np.int64) + 1
+    linha = np.repeat(np.arange(len(jornadas)), dias_ocupados)
+    deslocamento = np.arange(len(linha)) - np.repeat(np.cumsum(dias_ocupados) - dias_ocupados, dias_ocupados)
+    dia = (primeiro_dia[linha] + deslocamento * um_dia).astype(TIPO_DIA)
+
+    inicio_trecho = np.maximum(entrada[linha], dia)
+    fim_trecho = np.minimum(saida[linha], dia + um_dia)
+    trechos = pd.DataFrame({
+        'utilizador': jornadas['utilizador'].to_numpy()[linha],
+        'dia': dia,
+        'horas': (fim_trecho - inicio_trecho) / np.timedelta64(1, 'h')
+    })
+
+    diario = trechos.groupby(['utilizador', 'dia'], sort=True, observed=True)['horas'].sum().reset_index()
+    diario = diario[diario['horas'] > 0]
+    return pd.DataFrame({
+        'utilizador': diario['utilizador'].values,
+        'dia': diario['dia'].values,
+        'horas_trabalhadas': diario['horas'].round(2).values
+    }, columns=colunas)
+
+def pontos_orfaos(point_records, turno_maximo):
+    """Registros de ponto sem par na linha do tempo do usuário, com o motivo"""
+    return parear_turnos(registros_ponto_validos(point_records), turno_maximo)[1]
+
+def parear_entradas_saidas(point_records, turno_maximo=None):
+    """Pareia cada ENTRADA com a próxima SAÍDA do mesmo usuário e dia e soma as horas por dia
+
+    Com turno_maximo (Timedelta), o pareamento segue a linha do tempo inteira do usuário e
+    aceita turnos que passam da meia-noite, com as horas divididas entre os dias.
+    """
+    colunas = ['utilizador', 'dia', 'horas_trabalhadas']
+
+    # Descartar registros sem usuário, sem data ou com tipo desconhecido
+    validos = registros_ponto_validos(point_records)[['utilizador', 'tipo', 'data', 'dia']]
+
+    if validos.empty:
+        return diario_vazio()
+
+    if turno_maximo is not None:
+        return dividir_por_dia(parear_turnos(validos, turno_maximo)[0])
+
+    validos = validos.sort_values('data', kind='stable')
+    entradas = validos[validos['tipo'] == 'ENTRADA']
+    saidas = validos[validos['tipo'] == 'SAÍDA'].assign(data_saida=lambda df: df['data'])
+
+    # Próxima saída estritamente posterior à entrada, dentro do mesmo usuário e dia
+    pares = pd.merge_asof(
+        entradas, saidas[['utilizador', 'dia', 'data', 'data_saida']],
+        on='data', by=['utilizador', 'dia'],
+        direction='forward', allow_exact_matches=False
+    )
+    pares = pares[pares['data_saida'].notna()]
+    pares['horas'] = (pares['data_saida'] - pares['data']).dt.total_seconds() / 3600
+
+    diario = pares.groupby(['utilizador', 'dia'], sort=True, observed=True)['horas'].sum().reset_index()
+    diario = diario[diario['horas'] > 0]
+
+    return pd.DataFrame({
+        'utilizador': diario['utilizador'].values,
+        'dia': diario['dia'].values,
+        'horas_trabalhadas': diario['horas'].round(2).values
+    }, columns=colunas)
+
+# Abaixo deste número de registros válidos, abrir processos custa mais do que parear num só
+LIMITE_PARALELO_REGISTROS = 400_000
+
+def processos_disponiveis():
+    """Núcleos que este processo pode usar"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def fatiar_por_usuario(validos, partes):
+    """Divide os registros em partes com usuários inteiros, equilibrando a quantidade de registros
+
+    Cada usuário, do maior para o menor, vai para a parte mais leve até então.
+    """
+    codigos = pd.factorize(validos['utilizador'])[0]
+    contagens = np.bincount(codigos)
+
+    parte_do_usuario = np.empty(len(contagens), dtype=np.int64)
+    cargas = [(0, parte) for parte in range(partes)]
+    for usuario in np.argsort(-contagens, kind='stable'):
+        carga, parte = heapq.heappop(cargas)
+        parte_do_usuario[usuario] = parte
+        heapq.heappush(cargas, (carga + contagens[usuario], parte))
+
+    parte_da_linha = parte_do_usuario[codigos]
+    return [validos[parte_da_linha == parte] for parte in range(partes)]
+
+def _serializar_fatia(fatia):
+    """Fatia de registros em formato Arrow IPC, lida no outro processo sem conversão linha a linha"""
+    saida = pa.BufferOutputStream()
+    tabela = pa.Table.from_pandas(fatia, preserve_index=False)
+    with pa.ipc.new_stream(saida, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return saida.getvalue()
+
+def _parear_fatia(fatia_ipc, turno_maximo):
+    """Horas diárias de uma fatia de usuários recebida em Arrow IPC"""
+    fatia = pa.ipc.open_stream(fatia_ipc).read_all().to_pandas()
+    return parear_entradas_saidas(fatia, turno_maximo)
+
+def _contexto_processos():
+    """Contexto dos processos de trabalho, sem fork
+
+    O servidor do dashboard tem várias threads, e um processo criado por fork pode herdar um lock
+    tomado por outra thread e travar.
+    """
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+def parear_em_paralelo(point_records, turno_maximo=None, processos=None):
+    """parear_entradas_saidas com os usuários divididos entre processos (todos os núcleos, por padrão)
+
+    O pareamento nunca cruza usuários, então o resultado é o mesmo de um único processo. Com poucos
+    registros ou um só processo, o pareamento roda no próprio processo. As fatias vão aos processos
+    em Arrow IPC e só as horas diárias voltam serializadas.
+    """
+    validos = registros_ponto_validos(point_records)[['utilizador', 'tipo', 'data', 'dia']]
+    processos = processos or processos_disponiveis()
+    if processos <= 1 or len(validos) < LIMITE_PARALELO_REGISTROS:
+        return parear_entradas_saidas(validos, turno_maximo)
+
+    fatias = [_serializar_fatia(fatia) for fatia in fatiar_por_usuario(validos, processos) if not fatia.empty]
+    with ProcessPoolExecutor(max_workers=len(fatias), mp_context=_contexto_processos()) as executor:
+        partes = list(executor.map(_parear_fatia, fatias, [turno_maximo] * len(fatias)))
+
+    diario = pd.concat(partes, ignore_index=True)
+    diario['utilizador'] = diario['utilizador'].astype(partes[0]['utilizador'].dtype)
+    return diario.sort_values(['utilizador', 'dia'], kind='stable', ignore_index=True)
+
+TIPOS_PERIODO = ['Dia', 'Semana', 'Mês']
+
+def inicios_periodos(dias):
+    """Data de início do dia, da semana ISO (segunda-feira) e do mês de cada dia"""
+    return {
+        'Dia': dias,
+        'Semana': dias - pd.to_timedelta(dias.dt.weekday, unit='D'),
+        'Mês': dias.dt.to_period('M').dt.start_time
+    }
+
+def agregar_horas_periodos(diario):
+    """Consolida as horas diárias em totais por dia, semana ISO e mês numa única agregação"""
+    indice = ['tipo_periodo', 'utilizador', 'periodo']
+
+    if diario.empty:
+        vazio = pd.MultiIndex.from_arrays([[], [], pd.DatetimeIndex([])], names=indice)
+        return pd.DataFrame({'horas_trabalhadas': pd.Series(dtype=float)}, index=vazio)
+
+    inicios = inicios_periodos(diario['dia'])
+
+    empilhado = pd.concat([
+        pd.DataFrame({
+            'tipo_periodo': tipo,
+            'utilizador': diario['utilizador'].values,
+            'periodo': inicios[tipo].values,
+            'horas_trabalhadas': diario['horas_trabalhadas'].values
+        })
+        for tipo in TIPOS_PERIODO
+    ], ignore_index=True)
+
+    horas = empilhado.groupby(indice, sort=True, observed=True)[['horas_trabalhadas']].sum()
+    horas['horas_trabalhadas'] = horas['horas_trabalhadas'].round(2)
+    return horas
+
+def impressoes_particoes(eventos):
+    """Impressão digital de cada partição (utilizador, dia): soma, módulo 2**64, do hash de tipo e data de cada registro
+
+    A soma não depende da ordem dos registros, e incluir ou retirar um registro soma ou
+    subtrai o seu hash, sem reler o resto da partição.
+    """
+    hashes = pd.util.hash_pandas_object(eventos[['tipo', 'data']], index=False)
+    return hashes.groupby([eventos['utilizador'], eventos['dia']], observed=True).sum()
+
+class HorasParticionadas:
+    """Horas trabalhadas guardadas por partição (utilizador, dia), com uma impressão digital por partição
+
+    Os registros válidos ficam separados por dia. Ao aplicar registros novos ou corrigidos, só as
+    partições cuja impressão digital mudou são repareadas, e os totais de dia, semana e mês são
+    corrigidos pela diferença, sem percorrer o histórico. Com turno_maximo, uma partição suja
+    também reparea os dias vizinhos que um turno pode alcançar. Com processos > 1, o pareamento
+    inicial do histórico é dividido por usuário entre processos.
+    """
+    def __init__(self, point_records, turno_maximo=None, processos=1):
+        self.turno_maximo = turno_maximo
+        eventos = registros_ponto_validos(point_records)
+        self.eventos = {dia: grupo for dia, grupo in eventos.groupby('dia', sort=False)}
+        self.impressoes = {chave: int(valor) for chave, valor in impressoes_particoes(eventos).items()}
+
+        diario = parear_em_paralelo(eventos, turno_maximo, processos)
+        self.diario = dict(zip(zip(diario['utilizador'].tolist(), diario['dia'].tolist()), diario['horas_trabalhadas']))
+
+        # Total de horas e de dias trabalhados por (tipo_periodo, utilizador, periodo)
+        self.totais = {}
+        inicios = inicios_periodos(diario['dia'])
+        for tipo in TIPOS_PERIODO:
+            grupos = diario['horas_trabalhadas'].groupby(
+                [diario['utilizador'], inicios[tipo].rename('periodo')], observed=True
+            ).agg(['sum', 'size'])
+            self.totais.update(
+                ((tipo, usuario, periodo), [soma, dias])
+                for (usuario, periodo), soma, dias in zip(grupos.index, grupos['sum'], grupos['size'])
+            )
+
+    def aplicar(self, removidos, novos):
+        """Retira os registros removidos, inclui os novos e repareia só as partições que mudaram
+
+        Retorna a quantidade de partições (utilizador, dia) repareadas.
+        """
+        retirar = registros_ponto_validos(removidos)
+        incluir = registros_ponto_validos(novos)
+
+        anteriores = {}
+        for eventos, sinal in ((retirar, -1), (incluir, 1)):
+            for chave, valor in impressoes_particoes(eventos).items():
+                atual = self.impressoes.get(chave, 0)
+                anteriores.setdefault(chave, atual)
+                self.impressoes[chave] = (atual + sinal * int(valor)) % 2 ** 64
+        sujas = [chave for chave, anterior in anteriores.items() if self.impressoes[chave] != anterior]
+        for chave in anteriores:
+            if self.impressoes[chave] == 0:
+                del self.impressoes[chave]
+
+        # Atualizar os registros guardados dos dias tocados (um id removido sai do seu dia antigo)
+        if 'id' in retirar.columns:
+            for dia, grupo in retirar.groupby('dia'):
+                if dia in self.eventos:
+                    self.eventos[dia] = self.eventos[dia][~self.eventos[dia]['id'].isin(grupo['id'])]
+        for dia, grupo in incluir.groupby('dia'):
+            self.eventos[dia] = empilhar_tabelas([self.eventos[dia], grupo]) if dia in self.eventos else grupo
+
+        if not sujas:
+            return 0
+
+        # Reparear só as partições sujas, lendo apenas os dias delas
+        if self.turno_maximo is None:
+            dias = {dia for _, dia in sujas}
+            eventos = pd.concat([self.eventos[dia] for dia in dias if dia in self.eventos])
+            chaves = pd.MultiIndex.from_arrays([eventos['utilizador'].astype(object), eventos['dia']])
+            eventos = eventos[chaves.isin(sujas)]
+        else:
+            # Um turno de até k dias liga a partição aos k dias de cada lado; para refazer esses
+            # dias, a linha do tempo do usuário é lida com mais k dias de margem. Vizinhos que
+            # voltam com 0.0 hora (turnos que só tocam a meia-noite) continuam como partição
+            alcance = [pd.Timedelta(days=deslocamento) for deslocamento in range(-self._dias_turno(), self._dias_turno() + 1)]
+            sujas = list({(usuario, dia + deslocamento) for usuario, dia in sujas for deslocamento in alcance})
+            dias = {dia + deslocamento for _, dia in sujas for deslocamento in alcance}
+            eventos = pd.concat([self.eventos[dia] for dia in dias if dia in self.eventos])
+            eventos = eventos[eventos['utilizador'].isin({usuario for usuario, _ in sujas})]
+        diario = parear_entradas_saidas(eventos, self.turno_maximo)
+        horas = dict(zip(zip(diario['utilizador'].tolist(), diario['dia'].tolist()), diario['horas_trabalhadas']))
+
+        for chave in sujas:
+            self._ajustar(chave, horas.get(chave))
+        return len(sujas)
+
+    def copia(self):
+        """Cópia que pode receber aplicar() sem alterar esta, que pode estar compartilhada entre sessões
+
+        Os registros de cada dia não são copiados: aplicar() troca os dias tocados em vez de alterá-los.
+        """
+        copia = copy.copy(self)
+        copia.eventos = dict(self.eventos)
+        copia.impressoes = dict(self.impressoes)
+        copia.diario = dict(self.diario)
+        copia.totais = {chave: list(total) for chave, total in self.totais.items()}
+        return copia
+
+    def _dias_turno(self):
+        """Quantos dias de distância um turno de até turno_maximo pode alcançar"""
+        return int(np.ceil(self.turno_maximo / pd.Timedelta(days=1)))
+
+    def _ajustar(self, chave, horas):
+        """Troca as horas de uma partição e corrige os totais do dia, da semana e do mês pela diferença
+
+        horas None indica que o pareamento não gerou a partição; uma partição com 0.0 horas (como
+        as de turnos que só cruzam a meia-noite) existe e conta como dia, assim como em __init__.
+        """
+        anterior = self.diario.pop(chave, None)
+        if horas is not None:
+            self.diario[chave] = horas
+
+        # Mesmos inícios de período de inicios_periodos
+        usuario, dia = chave
+        inicios = {'Dia': dia, 'Semana': dia - pd.Timedelta(days=dia.weekday()), 'Mês': dia.replace(day=1)}
+        for tipo, periodo in inicios.items():
+            total = self.totais.setdefault((tipo, usuario, periodo), [0.0, 0])
+            total[0] += (horas or 0.0) - (anterior or 0.0)
+            total[1] += (horas is not None) - (anterior is not None)
+            if total[1] == 0:
+                del self.totais[(tipo, usuario, periodo)]
+
+    def tabela(self):
+        """Horas por (tipo_periodo, utilizador, periodo), no mesmo formato de agregar_horas_periodos"""
+        if not self.totais:
+            return agregar_horas_periodos(diario_vazio())
+
+        indice = pd.MultiIndex.from_tuples(list(self.totais), names=['tipo_periodo', 'utilizador', 'periodo'])
+        horas = np.round([soma for soma, _ in self.totais.values()], 2)
+        return pd.DataFrame({'horas_trabalhadas': horas}, index=indice).sort_index()
+
+def horas_do_resumo(horas, tipo_periodo):
+    """Linhas de um só tipo de período, sobre as quais se calculam totais e médias
+
+    Com 'Todos', as mesmas horas aparecem como Dia, Semana e Mês; somar tudo contaria cada hora
+    três vezes, então os totais usam só as linhas de Dia.
+    """
+    tipo = TIPOS_PERIODO[0] if tipo_periodo == 'Todos' else tipo_periodo
+    return horas[horas['tipo_periodo'] == tipo]
+
+def rotulo_periodo(tipo_periodo, periodos):
+    """Formata o início de cada período para exibição (dia, semana ISO ou mês)"""
+    formatos = {'Dia': '%Y-%m-%d', 'Semana': '%G-S%V', 'Mês': '%Y-%m'}
+    return pd.DatetimeIndex(periodos).strftime(formatos[tipo_periodo])
+
+# Resolução entregue ao navegador: pontos por linha e barras por gráfico temporal
+PONTOS_MAXIMOS_LINHA = 500
+BARRAS_MAXIMAS_TEMPO = 90
+
+def resolucao_temporal(dias, maximo=BARRAS_MAXIMAS_TEMPO):
+    """Menor tipo de período (dia, semana ou mês) em que o intervalo das datas cabe em até maximo barras"""
+    if len(dias) == 0:
+        return 'Dia'
+    extensao = (dias.max() - dias.min()).days + 1
+    if extensao <= maximo:
+        return 'Dia'
+    if extensao <= maximo * 7:
+        return 'Semana'
+    return 'Mês'
+
+def agrupar_no_tempo(serie, tipo_periodo):
+    """Soma uma série indexada por dia nos inícios de período do tipo escolhido"""
+    inicios = inicios_periodos(pd.Series(serie.index))[tipo_periodo]
+    return serie.groupby(inicios.values).sum()
+
+def reduzir_lttb(serie, pontos=PONTOS_MAXIMOS_LINHA):
+    """Reduz uma série ordenada a até `pontos` pontos (Largest-Triangle-Three-Buckets)
+
+    Os pontos internos são divididos em baldes; de cada balde fica o ponto que forma o maior
+    triângulo com o escolhido no balde anterior e a média do balde seguinte, o que preserva a forma visual da série.
+    """
+    n = len(serie)
+    if n <= pontos or pontos < 3:
+        return serie
+
+    if isinstance(serie.index, pd.DatetimeIndex):
+        x = serie.index.asi8.astype(float)
+    else:
+        x = np.arange(n, dtype=float)
+    y = serie.to_numpy(dtype=float)
+
+    limites = np.linspace(1, n - 1, pontos - 1).astype(np.int64)
+    escolhidos = np.empty(pontos, dtype=np.int64)
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    anterior = 0
+    for balde in range(pontos - 2):
+        inicio, fim = limites[balde], limites[balde + 1]
+        fim_seguinte = limites[balde + 2] if balde + 2 < len(limites) else n
+        media_x, media_y = x[fim:fim_seguinte].mean(), y[fim:fim_seguinte].mean()
+        areas = np.abs((x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+                       - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior]))
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[balde + 1] = anterior
+    return serie.iloc[escolhidos]
+
+# Frequências candidatas da curva de ocupação, da mais fina para a mais grossa
+FREQUENCIAS_OCUPACAO = {'15min': '15 min', 'h': 'hora', 'D': 'dia', 'W-MON': 'semana', 'MS': 'mês'}
+
+def intervalos_utilizacao(utilizacoes):
+    """Utilizações com veículo, início e fim, e fim depois do início, ordenadas por veículo e início"""
+    colunas = [coluna for coluna in ['id', 'vehicle_id', 'veiculo', 'data_inicio', 'data_fim'] if coluna in utilizacoes.columns]
+    if not {'vehicle_id', 'data_inicio', 'data_fim'} <= set(colunas):
+        return pd.DataFrame(columns=colunas)
+    validas = (
+        utilizacoes['vehicle_id'].notna() & utilizacoes['data_inicio'].notna() &
+        utilizacoes['data_fim'].notna() & (utilizacoes['data_fim'] > utilizacoes['data_inicio'])
+    )
+    return utilizacoes.loc[validas, colunas].sort_values(['vehicle_id', 'data_inicio'], kind='stable')
+
+def unir_intervalos(codigos, inicio, fim):
+    """Une os intervalos sobrepostos de cada veículo (entradas já ordenadas por veículo e início)
+
+    Retorna (codigos, inicio, fim) dos blocos de uso contínuo e, para cada intervalo de entrada, o maior
+    fim entre os anteriores do mesmo veículo (NaT no primeiro), que acusa as sobreposições.
+    """
+    fins = pd.Series(fim)
+    maior_fim = fins.groupby(codigos).cummax().to_numpy()
+    fim_anterior = pd.Series(maior_fim).groupby(codigos).shift().to_numpy()
+
+    # Um bloco novo começa no primeiro uso do veículo ou quando o início passa de todos os fins anteriores
+    novo_bloco = np.isnat(fim_anterior) | (inicio > fim_anterior)
+    ultimo_do_bloco = np.append(novo_bloco[1:], True)[:len(novo_bloco)]
+    return codigos[novo_bloco], inicio[novo_bloco], maior_fim[ultimo_do_bloco], fim_anterior
+
+def curva_ocupacao(inicio, fim):
+    """Veículos em uso após cada instante de mudança (varredura dos inícios e fins dos blocos)
+
+    Num mesmo instante, os fins são aplicados antes dos inícios, então usos encostados não se somam.
+    """
+    tempos = np.concatenate([fim, inicio])
+    variacao = np.concatenate([np.full(len(fim), -1, dtype=np.int64), np.ones(len(inicio), dtype=np.int64)])
+    ordem = np.lexsort((variacao, tempos))
+    tempos, ocupacao = tempos[ordem], np.cumsum(variacao[ordem])
+
+    # Um ponto por instante: a ocupação depois de todos os eventos dele
+    ultimo = np.append(tempos[1:] != tempos[:-1], True)[:len(tempos)]
+    return pd.Series(ocupacao[ultimo], index=pd.DatetimeIndex(tempos[ultimo]), name='veiculos_em_uso')
+
+def ocupacao_por_periodo(curva, pontos=PONTOS_MAXIMOS_LINHA):
+    """Pico de veículos em uso por período, na frequência mais fina que caiba em até pontos períodos"""
+    if curva.empty:
+        return '', curva
+    for frequencia, descricao in FREQUENCIAS_OCUPACAO.items():
+        periodos = pd.date_range(curva.index[0].floor('D'), curva.index[-1], freq=frequencia)
+        if len(periodos) <= pontos:
+            break
+
+    # O nível que vem do período anterior também vale no período, mesmo sem eventos nele
+    agrupada = curva.resample(frequencia)
+    herdado = agrupada.last().ffill().shift().fillna(0)
+    return descricao, np.maximum(agrupada.max().fillna(herdado), herdado).astype(np.int64)
+
+def linha_do_tempo_frota(utilizacoes):
+    """Ocupação da frota ao longo do tempo, com varredura dos usos em O(n log n)
+
+    Retorna um dicionário com:
+    - 'curva': veículos em uso a cada instante de mudança
+    - 'pico': maior número de veículos em uso ao mesmo tempo e quando começou
+    - 'por_veiculo': horas em uso, horas ociosas e utilização (%) de cada veículo na janela dos dados
+    - 'sobreposicoes': usos que começam antes de terminar um uso anterior do mesmo veículo
+    """
+    intervalos = intervalos_utilizacao(utilizacoes)
+    codigos, veiculos = pd.factorize(intervalos['vehicle_id'])
+    inicio = intervalos['data_inicio'].to_numpy(dtype='datetime64[ns]')
+    fim = intervalos['data_fim'].to_numpy(dtype='datetime64[ns]')
+
+    codigos_blocos, inicio_blocos, fim_blocos, fim_anterior = unir_intervalos(codigos, inicio, fim)
+    curva = curva_ocupacao(inicio_blocos, fim_blocos)
+
+    if curva.empty:
+        pico = {'veiculos': 0, 'inicio': None}
+        janela_horas = 0.0
+    else:
+        pico = {'veiculos': int(curva.max()), 'inicio': curva.idxmax()}
+        janela_horas = (curva.index[-1] - curva.index[0]) / pd.Timedelta(hours=1)
+
+    # Tempo em uso de cada veículo: soma dos seus blocos contínuos
+    horas_blocos = (fim_blocos - inicio_blocos) / np.timedelta64(1, 'h')
+    horas_em_uso = np.bincount(codigos_blocos, weights=horas_blocos, minlength=len(veiculos))
+    rotulos = intervalos.drop_duplicates('vehicle_id')['veiculo'].to_numpy() if 'veiculo' in intervalos.columns else veiculos
+    por_veiculo = pd.DataFrame({
+        'veiculo': rotulos,
+        'utilizacoes': np.bincount(codigos, minlength=len(veiculos)),
+        'horas_em_uso': horas_em_uso.round(1),
+        'horas_ociosas': (janela_horas - horas_em_uso).round(1),
+        'utilizacao_pct': (100 * horas_em_uso / janela_horas).round(1) if janela_horas else np.zeros(len(veiculos))
+    }, index=pd.Index(veiculos, name='vehicle_id')).sort_values('utilizacao_pct', ascending=False)
+
+    sobreposta = ~np.isnat(fim_anterior) & (inicio < fim_anterior)
+    sobreposicoes = intervalos[sobreposta].assign(
+        sobreposicao_horas=((fim_anterior[sobreposta] - inicio[sobreposta]) / np.timedelta64(1, 'h')).round(2)
+    )
+    if 'id' in intervalos.columns:
+        # A utilização sobreposta é a anterior que termina mais tarde: a dona do maior fim até ali
+        maior_fim = pd.Series(fim).groupby(codigos).cummax().to_numpy()
+        dona = pd.Series(intervalos['id'].to_numpy(), dtype=object).where(fim == maior_fim)
+        dona = dona.groupby(codigos).ffill().groupby(codigos).shift()
+        sobreposicoes['sobreposta_a'] = dona.to_numpy()[sobreposta]
+        if uuid_empacotado(intervalos['id'].dtype):
+            sobreposicoes['sobreposta_a'] = sobreposicoes['sobreposta_a'].astype(intervalos['id'].dtype)
+
+    return {'curva': curva, 'pico': pico, 'por_veiculo': por_veiculo, 'sobreposicoes': sobreposicoes}
+
+def calcular_kpis(vehicles, vehicle_uses, maintenances, point_records):
+    """Métricas principais: quantidade de cada tabela e custo total de manutenção"""
+    custo_total = None
+    if not maintenances.empty and 'custo' in maintenances.columns:
+        custo_total = maintenances['custo'].sum()
+    
+    return {
+        'veiculos': len(vehicles),
+        'utilizacoes': len(vehicle_uses),
+        'manutencoes': len(maintenances),
+        'registros_ponto': len(point_records),
+        'custo_total': custo_total
+    }
+
+def custos_por_veiculo(manutencoes):
+    """Custo total de manutenção por veículo (placa), do maior para o menor"""
+    return manutencoes.groupby('veiculo', observed=True)['custo'].sum().sort_values(ascending=False)
+
+def custos_mensais_por_veiculo(manutencoes):
+    """Custo de manutenção por veículo e mês"""
+    return manutencoes.groupby(['vehicle_id', 'mes'], observed=True)['custo'].sum()
+
+def resumo_utilizacoes(utilizacoes):
+    """Total e média da duração (horas) e da distância (km) das utilizações; None onde não há valores válidos"""
+    resumo = {}
+    for coluna, prefixo in [('duracao_horas', 'horas'), ('distancia_km', 'km')]:
+        valores = utilizacoes[coluna] if coluna in utilizacoes.columns else pd.Series(dtype=float)
+        validos = valores.notna().any()
+        resumo[f'{prefixo}_total'] = float(valores.sum()) if validos else None
+        resumo[f'{prefixo}_medio'] = float(valores.mean()) if validos else None
+    return resumo
+
+def duracao_media_por(utilizacoes, coluna):
+    """Duração média em horas das utilizações por motorista ou veículo, da maior para a menor"""
+    return utilizacoes.groupby(coluna, observed=True)['duracao_horas'].mean().sort_values(ascending=False)
+
+def distancias_por(utilizacoes, coluna):
+    """Quilometragem confiável por veículo ou motorista, da maior para a menor"""
+    return utilizacoes.groupby(coluna, observed=True)['distancia_km'].agg(['sum', 'count', 'mean']).rename(
+        columns={'sum': 'km_total', 'count': 'utilizacoes', 'mean': 'km_medio'}
+    ).sort_values('km_total', ascending=False)
+
+def registros_por_hora(ponto):
+    """Quantidade de registros de ponto por hora do dia, ou None se as datas não forem válidas"""
+    if 'hora' not in ponto.columns or not ponto['hora'].notna().any():
+        return None
+    return ponto['hora'].value_counts().sort_index()
+
+def horas_trabalhadas(point_records, turno_maximo=None, processos=1):
+    """Horas trabalhadas por (tipo_periodo, utilizador, periodo), ou None sem jornadas pareadas"""
+    particoes = HorasParticionadas(point_records, turno_maximo, processos)
+    return particoes.tabela() if particoes.totais else None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumo da frota a partir dos CSVs exportados, sem o dashboard")
+    parser.add_argument('pasta', help="pasta com vehicles.csv, vehicle_uses.csv, maintenances.csv, users.csv e point_records.csv")
+    parser.add_argument('--turno-maximo', type=float, help="parear pela linha do tempo, com turnos de até N horas")
+    argumentos = parser.parse_args()
+
+    tabelas = ler_pasta(argumentos.pasta)
+    fatos = construir_fatos(*(tabelas[tabela] for tabela in COLUNAS_DATA))
+    print(json.dumps(calcular_kpis(tabelas['vehicles'], tabelas['vehicle_uses'], tabelas['maintenances'], tabelas['point_records']),
+                     default=float, ensure_ascii=False))
+
+    if {'veiculo', 'custo'} <= set(fatos['manutencoes'].columns):
+        print("\nCusto de manutenção por veículo (10 maiores):")
+        print(custos_por_veiculo(fatos['manutencoes']).head(10).to_string())
+
+    if {'vehicle_id', 'data_inicio', 'data_fim'} <= set(fatos['utilizacoes'].columns):
+        ocupacao = linha_do_tempo_frota(fatos['utilizacoes'])
+        print(f"\nPico de {ocupacao['pico']['veiculos']} veículos em uso; {len(ocupacao['sobreposicoes'])} utilizações sobrepostas")
+        print(ocupacao['por_veiculo'].head(10).to_string())
+
+    turno_maximo = pd.Timedelta(hours=argumentos.turno_maximo) if argumentos.turno_maximo else None
+    horas = horas_trabalhadas(tabelas['point_records'], turno_maximo, processos_disponiveis())
+    if horas is not None:
+        print("\nHoras trabalhadas por usuário (total):")
+        print(horas.loc['Mês'].groupby(level='utilizador', observed=True)['horas_trabalhadas'].sum().sort_values(ascending=False).head(10).to_string())
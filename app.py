@@ -1,10 +1,40 @@
 # app.py - VERSÃO COMPLETA COM TODAS AS FUNÇÕES
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
+import plotly.io as pio
+from datetime import datetime
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
+import time
+import json
 import io
+import uuid
+
+# Carga, tipagem e cálculos ficam no núcleo de análise, que não depende do Streamlit
+from analise_frotas import (
+    BARRAS_MAXIMAS_TEMPO, COLUNAS_DATA, ESQUEMA_TABELAS, LIMITE_PARALELO_REGISTROS, MINIMO_REGISTROS_LOCAL,
+    RAIO_PADRAO_LOCAL_M, RAIO_TERRA_M, TABELAS_FATO, TAMANHO_CELULA_GRAUS, TIPOS_PERIODO, CacheArquivos,
+    HorasParticionadas, RepositorioDados, agrupar_locais, agrupar_no_tempo, aplicar_esquema, construir_dim_veiculos,
+    construir_fato, construir_fatos, converter_datas_tabela, custos_mensais_por_veiculo, custos_por_veiculo,
+    densidade_grade, distancia_metros, empilhar_tabelas, fora_do_raio, horas_do_resumo, info_snapshot, ler_snapshot,
+    ler_tabela, linha_do_tempo_frota, locais_principais, mesclar_registros, ocupacao_por_periodo, processos_disponiveis,
+    reduzir_lttb, relatorio_orfaos, resolucao_temporal, rotulo_periodo, salvar_snapshot, uuids_em_texto, zoom_mapa
+)
+
+# Agregações das abas (o motor SQL embarcado fica para a linha de comando e o benchmark)
+from motores_consulta import ConsultasPandas
+
+# Com copy-on-write, cópias rasas das tabelas compartilhadas entre as sessões só copiam uma coluna
+# ao alterá-la (sempre ligado a partir do pandas 3); ligado aqui para não mudar o pandas de quem
+# só importa o núcleo de análise
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
 # Configuração da página
 st.set_page_config(
@@ -126,6 +156,246 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Limite de memória do cache de arquivos compartilhado entre sessões
+LIMITE_CACHE_ARQUIVOS_BYTES = 2 * 1024 ** 3
+
+@st.cache_resource
+def cache_arquivos():
+    """Instância única do cache de arquivos, compartilhada por todas as sessões do servidor"""
+    return CacheArquivos(LIMITE_CACHE_ARQUIVOS_BYTES)
+
+@st.cache_resource
+def repositorio_dados():
+    """Instância única do repositório de tabelas carregadas, compartilhada por todas as sessões do servidor"""
+    return RepositorioDados()
+
+# Tema escuro único dos gráficos: o plotly_dark com fundo transparente, sobre o fundo da página
+TEMA_GRAFICOS = 'frotas_escuro'
+pio.templates[TEMA_GRAFICOS] = go.layout.Template(pio.templates['plotly_dark']).update(
+    layout={'plot_bgcolor': 'rgba(0,0,0,0)', 'paper_bgcolor': 'rgba(0,0,0,0)'}
+)
+
+LIMITE_CACHE_FIGURAS = 256
+
+def impressao_dados(dados):
+    """Impressão digital do conteúdo (valores, índice, nomes e ordem) de uma série ou tabela"""
+    if isinstance(dados, pd.Series):
+        dados = dados.to_frame()
+    hashes = pd.util.hash_pandas_object(dados, index=True).to_numpy()
+    nomes = repr((list(dados.columns), list(dados.index.names))).encode()
+    return hashlib.sha1(hashes.tobytes() + nomes).hexdigest()
+
+class CacheFiguras:
+    """Cache LRU de figuras Plotly já montadas, por (gráfico, impressão dos dados, filtros), com os tempos de montagem"""
+
+    def __init__(self, limite):
+        self.limite = limite
+        self._figuras = OrderedDict()
+        self._tempos = {}
+        self._lock = threading.Lock()
+
+    def obter(self, id_grafico, dados, construir, filtros=()):
+        chave = (id_grafico, impressao_dados(dados), filtros)
+        with self._lock:
+            tempos = self._tempos.setdefault(id_grafico, {'acertos': 0, 'montagens': 0, 'tempo_total_s': 0.0, 'ultima_montagem_s': 0.0})
+            if chave in self._figuras:
+                self._figuras.move_to_end(chave)
+                tempos['acertos'] += 1
+                return self._figuras[chave]
+        
+        inicio = time.perf_counter()
+        fig = construir().update_layout(template=TEMA_GRAFICOS)
+        tempo = time.perf_counter() - inicio
+        
+        with self._lock:
+            tempos['montagens'] += 1
+            tempos['tempo_total_s'] += tempo
+            tempos['ultima_montagem_s'] = tempo
+            self._figuras[chave] = fig
+            while len(self._figuras) > self.limite:
+                self._figuras.popitem(last=False)
+        return fig
+
+    def estatisticas(self):
+        """Acertos, montagens e tempos de montagem por gráfico, do mais caro para o mais barato"""
+        with self._lock:
+            tempos = pd.DataFrame.from_dict(self._tempos, orient='index')
+        if tempos.empty:
+            return tempos
+        return tempos.sort_values('tempo_total_s', ascending=False).round(4)
+
+@st.cache_resource
+def cache_figuras():
+    """Instância única do cache de figuras, compartilhada por todas as sessões do servidor"""
+    return CacheFiguras(LIMITE_CACHE_FIGURAS)
+
+# Cálculos pesados em segundo plano: threads do executor e intervalo de atualização do progresso
+THREADS_SEGUNDO_PLANO = 2
+INTERVALO_ANDAMENTO_SEGUNDOS = 1
+
+@st.cache_resource
+def executor_derivados():
+    """Executor único dos cálculos em segundo plano, compartilhado por todas as sessões do servidor
+
+    Usa threads: os resultados (tabelas e partições de horas) voltam sem serialização, e o
+    pandas libera o GIL em boa parte das agregações.
+    """
+    return ThreadPoolExecutor(max_workers=THREADS_SEGUNDO_PLANO, thread_name_prefix='derivados')
+
+# Perfil de desempenho: reruns guardados e cálculos em segundo plano guardados
+RERUNS_PERFIL = 20
+CALCULOS_PERFIL = 200
+
+# Contexto vazio usado no lugar das etapas quando o perfil está desligado
+SEM_MEDICAO = nullcontext()
+
+class PerfilDesempenho:
+    """Tempos de cada etapa dos últimos reruns (etapas aninhadas) e dos cálculos em segundo plano"""
+
+    def __init__(self):
+        self.reruns = deque(maxlen=RERUNS_PERFIL)
+        self.segundo_plano = deque(maxlen=CALCULOS_PERFIL)
+        self._lock = threading.Lock()
+        self._pilha = []
+        self._inicio = None
+
+    def iniciar_rerun(self):
+        self.reruns.append({'inicio': datetime.now().isoformat(timespec='seconds'), 'duracao_ms': None, 'etapas': []})
+        self._pilha = []
+        self._inicio = time.perf_counter()
+
+    def encerrar_rerun(self):
+        self.reruns[-1]['duracao_ms'] = round((time.perf_counter() - self._inicio) * 1000, 2)
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o bloco como uma etapa do rerun atual, dentro da etapa que estiver aberta"""
+        if not self.reruns:
+            self.iniciar_rerun()
+        inicio = time.perf_counter()
+        registro = {'etapa': nome, 'nivel': len(self._pilha), 'inicio_ms': round((inicio - self._inicio) * 1000, 2), 'duracao_ms': None}
+        self.reruns[-1]['etapas'].append(registro)
+        self._pilha.append(registro)
+        try:
+            yield
+        finally:
+            self._pilha.pop()
+            registro['duracao_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+
+    def medir_calculo(self, nome, calcular):
+        """Envolve um cálculo que roda no executor, registrando sua duração sem tocar no session state"""
+        def medido():
+            inicio = time.perf_counter()
+            try:
+                return calcular()
+            finally:
+                with self._lock:
+                    self.segundo_plano.append({
+                        'calculo': nome, 'fim': datetime.now().isoformat(timespec='seconds'),
+                        'duracao_ms': round((time.perf_counter() - inicio) * 1000, 2)
+                    })
+        return medido
+
+    def etapas(self, rerun=-1):
+        """Etapas de um rerun como tabela, com o nome recuado pelo nível de aninhamento"""
+        etapas = [
+            {**registro, 'etapa': '· ' * registro['nivel'] + registro['etapa']} for registro in self.reruns[rerun]['etapas']
+        ]
+        return pd.DataFrame(etapas, columns=['etapa', 'inicio_ms', 'duracao_ms'])
+
+    def calculos(self):
+        with self._lock:
+            return pd.DataFrame(list(self.segundo_plano), columns=['calculo', 'fim', 'duracao_ms'])
+
+    def exportar(self, memoria=None):
+        """Reruns, cálculos em segundo plano e memória das tabelas, prontos para json.dumps"""
+        with self._lock:
+            segundo_plano = list(self.segundo_plano)
+        return {
+            'reruns': list(self.reruns),
+            'segundo_plano': segundo_plano,
+            'memoria': [] if memoria is None else memoria.to_dict(orient='records')
+        }
+
+def memoria_por_coluna(tabelas):
+    """Memória (bytes, com o conteúdo dos textos) de cada coluna das tabelas, da maior para a menor"""
+    linhas = []
+    for nome, df in tabelas.items():
+        if not isinstance(df, pd.DataFrame):
+            continue
+        uso = df.memory_usage(deep=True, index=False)
+        for coluna in df.columns:
+            linhas.append({'tabela': nome, 'coluna': str(coluna), 'tipo': str(df[coluna].dtype), 'linhas': len(df), 'bytes': int(uso[coluna])})
+    return pd.DataFrame(linhas, columns=['tabela', 'coluna', 'tipo', 'linhas', 'bytes']).sort_values('bytes', ascending=False, ignore_index=True)
+
+def carregar_tabela(tabela, conteudo, em_blocos=False, progresso=None):
+    """Lê e tipa um CSV com ler_tabela, reaproveitando o resultado se o mesmo conteúdo já foi carregado
+
+    Retorna o DataFrame, o hash do conteúdo e se ele veio do cache.
+    """
+    cache = cache_arquivos()
+    digest = hashlib.sha256(conteudo).hexdigest()
+    chave = (tabela, digest, em_blocos)
+    
+    df = cache.obter(chave)
+    if df is not None:
+        # Cópia rasa: as abas adicionam colunas sem alterar a tabela compartilhada
+        return df.copy(deep=False), digest, True
+    
+    df = ler_tabela(tabela, conteudo, em_blocos, progresso)
+    cache.guardar(chave, df)
+    return df.copy(deep=False), digest, False
+
+# Nome de cada tabela para exibição
+NOMES_TABELAS = {
+    'vehicles': 'Veículos',
+    'vehicle_uses': 'Utilizações',
+    'maintenances': 'Manutenções',
+    'users': 'Usuários',
+    'point_records': 'Registros de Ponto'
+}
+
+# Opções de linhas por página das tabelas paginadas
+LINHAS_POR_PAGINA = [50, 100, 250, 1000]
+
+# Modos de pareamento de ENTRADA/SAÍDA e duração máxima padrão de um turno
+MODOS_PAREAMENTO = ['Mesmo dia', 'Turnos (linha do tempo)']
+TURNO_MAXIMO_PADRAO_HORAS = 14
+
+# Tabelas lidas por cada resultado derivado (pelo nome antes de ':'); ao anexar registros a uma
+# tabela, os resultados que dependem dela são descartados (ou atualizados, quando há atualização incremental)
+DEPENDENCIAS_DERIVADOS = {
+    'kpis': {'vehicles', 'vehicle_uses', 'maintenances', 'point_records'},
+    'veiculos_por_status': {'vehicles'},
+    'veiculos_por_tipo': {'vehicles'},
+    'utilizacoes_por_veiculo': {'vehicles', 'vehicle_uses'},
+    'utilizacoes_por_motorista': {'vehicle_uses'},
+    'resumo_utilizacoes': {'vehicle_uses'},
+    'duracao_media_por_motorista': {'vehicle_uses'},
+    'alertas_quilometragem': {'vehicle_uses'},
+    'distancia_por_veiculo': {'vehicles', 'vehicle_uses'},
+    'distancia_por_motorista': {'vehicle_uses'},
+    'ocupacao_frota': {'vehicles', 'vehicle_uses'},
+    'custos_por_veiculo': {'vehicles', 'maintenances'},
+    'custos_mensais_por_veiculo': {'maintenances'},
+    'registros_por_hora': {'point_records'},
+    'registros_por_tipo': {'point_records'},
+    'registros_por_usuario': {'users', 'point_records'},
+    'registros_por_usuario_tipo': {'point_records'},
+    'densidade_ponto': {'point_records'},
+    'locais_ponto': {'point_records'},
+    'locais_principais': {'point_records'},
+    'horas_trabalhadas': {'point_records'},
+    'horas_particionadas': {'point_records'},
+    'pontos_orfaos': {'point_records'}
+}
+
+# Resultados grandes guardados uma única vez por versão dos dados no repositório compartilhado; o
+# cache de cada sessão guarda só a referência
+DERIVADOS_COMPARTILHADOS = {
+    'densidade_ponto', 'locais_ponto', 'ocupacao_frota', 'horas_particionadas', 'horas_trabalhadas', 'pontos_orfaos'
+}
+
 class GestaoFrotasStreamlit:
     def __init__(self):
         self.vehicles = None
@@ -133,13 +403,18 @@ class GestaoFrotasStreamlit:
         self.users = None
         self.point_records = None
         self.maintenances = None
+        # Perfil de desempenho da sessão, ou None quando desligado
+        self.perfil = None
         
         # Inicializar session state
         if 'dados_carregados' not in st.session_state:
             st.session_state.dados_carregados = False
 
-    def processar_upload(self, vehicles_file, uses_file, maintenances_file, users_file, points_file):
-        """Processa os arquivos enviados"""
+    def processar_upload(self, vehicles_file, uses_file, maintenances_file, users_file, points_file, em_blocos=False):
+        """Processa os arquivos enviados
+
+        Com em_blocos=True cada arquivo é lido em blocos, com memória limitada e barra de progresso.
+        """
         arquivos = {
             "Veículos": vehicles_file,
             "Utilizações": uses_file,
@@ -155,31 +430,165 @@ class GestaoFrotasStreamlit:
             st.error(f"❌ Arquivos faltantes: {', '.join(arquivos_faltantes)}")
             return
         
-        # Processar cada arquivo
+        # Processar cada arquivo (leitura e conversão de datas reaproveitadas pelo hash do conteúdo)
         try:
             with st.spinner("📥 Processando arquivos..."):
-                self.vehicles = pd.read_csv(vehicles_file)
-                self.vehicle_uses = pd.read_csv(uses_file)
-                self.maintenances = pd.read_csv(maintenances_file)
-                self.users = pd.read_csv(users_file)
-                self.point_records = pd.read_csv(points_file)
+                tabelas = {
+                    'vehicles': vehicles_file,
+                    'vehicle_uses': uses_file,
+                    'maintenances': maintenances_file,
+                    'users': users_file,
+                    'point_records': points_file
+                }
+                reaproveitados = 0
+                versao = hashlib.sha256()
+                barra = st.progress(0.0, text="Lendo arquivos em blocos...") if em_blocos else None
+                for indice, (tabela, arquivo) in enumerate(tabelas.items()):
+                    progresso = None
+                    if barra is not None:
+                        def progresso(fracao, indice=indice, nome=arquivo.name):
+                            barra.progress((indice + fracao) / len(tabelas), text=f"📦 {nome}: {fracao:.0%}")
+                    
+                    with self._etapa(f'leitura {tabela}'):
+                        df, digest, do_cache = carregar_tabela(tabela, arquivo.getvalue(), em_blocos, progresso)
+                    setattr(self, tabela, df)
+                    versao.update(digest.encode())
+                    reaproveitados += do_cache
             
-            # Converter datas
-            self._converter_datas()
+            if reaproveitados:
+                st.info(f"♻️ {reaproveitados} arquivo(s) sem alteração reaproveitado(s) do cache")
+            self._mostrar_formatos_datas()
+            self._mostrar_memoria_tabelas()
             
             # Marcar como carregado
-            st.session_state.dados_carregados = True
-            st.session_state.dados_veiculos = self.vehicles
-            st.session_state.dados_utilizacoes = self.vehicle_uses
-            st.session_state.dados_manutencoes = self.maintenances
-            st.session_state.dados_usuarios = self.users
-            st.session_state.dados_ponto = self.point_records
+            self._publicar_dados(versao.hexdigest())
+            # Juntar as tabelas às dimensões uma única vez, na carga
+            self._fatos()
             
             st.success("✅ Todos os dados foram carregados com sucesso!")
             st.balloons()
             
         except Exception as e:
             st.error(f"❌ Erro ao processar arquivos: {e}")
+            return
+        
+        # Guardar snapshot colunar para as próximas aberturas
+        try:
+            with self._etapa('salvar snapshot'):
+                salvar_snapshot({tabela: getattr(self, tabela) for tabela in COLUNAS_DATA}, st.session_state.versao_dados)
+        except Exception as e:
+            st.warning(f"Não foi possível salvar o snapshot: {e}")
+
+    def carregar_snapshot(self):
+        """Carrega as tabelas do último snapshot salvo"""
+        try:
+            with st.spinner("📥 Carregando último snapshot..."):
+                with self._etapa('leitura snapshot'):
+                    tabelas, metadados = ler_snapshot()
+                for tabela, df in tabelas.items():
+                    setattr(self, tabela, df)
+            
+            # Publicar no repositório compartilhado
+            self._publicar_dados(metadados['versao'])
+            # Juntar as tabelas às dimensões uma única vez, na carga
+            self._fatos()
+            
+            st.success(f"✅ Snapshot de {metadados['criado_em']} carregado com sucesso!")
+            
+        except Exception as e:
+            st.error(f"❌ Erro ao carregar snapshot: {e}")
+
+    def anexar_registros(self, tabela, arquivo):
+        """Acrescenta a uma tabela já carregada um CSV só com os registros novos
+
+        Registros com id já existente substituem os antigos. Resultados derivados que não
+        dependem da tabela são mantidos; tabelas fato, horas trabalhadas e custos por veículo
+        são atualizados só nas chaves tocadas, e os demais são recalculados sob demanda.
+        """
+        try:
+            with st.spinner(f"📥 Anexando registros em {NOMES_TABELAS[tabela]}..."):
+                with self._etapa(f'leitura {tabela}'):
+                    novos, digest, _ = carregar_tabela(tabela, arquivo.getvalue())
+                atual = getattr(self, tabela)
+                combinada, substituidos = mesclar_registros(atual, novos)
+                with self._etapa('atualização incremental'):
+                    valores = self._atualizar_derivados(tabela, combinada, len(atual) - len(substituidos), substituidos)
+                setattr(self, tabela, combinada)
+                
+                # Nova versão dos dados, herdando os resultados derivados ainda válidos
+                versao = hashlib.sha256(f"{st.session_state.versao_dados}:{tabela}:{digest}".encode()).hexdigest()
+                self._publicar_dados(versao, {
+                    nome: valor for nome, valor in valores.items()
+                    if nome == 'fatos' or nome.split(':')[0] in DERIVADOS_COMPARTILHADOS
+                })
+                cache = self._cache_derivados()
+                cache['valores'].update(valores)
+                self._fatos()
+            
+            st.success(f"✅ {len(novos)} registro(s) anexado(s) em {NOMES_TABELAS[tabela]} ({len(substituidos)} substituído(s))")
+            
+        except Exception as e:
+            st.error(f"❌ Erro ao anexar registros: {e}")
+            return
+        
+        try:
+            with self._etapa('salvar snapshot'):
+                salvar_snapshot({tabela: getattr(self, tabela) for tabela in COLUNAS_DATA}, st.session_state.versao_dados)
+        except Exception as e:
+            st.warning(f"Não foi possível salvar o snapshot: {e}")
+
+    def _atualizar_derivados(self, tabela, combinada, mantidas, substituidos):
+        """Resultados derivados válidos para a tabela combinada, sem recalcular do zero
+
+        mantidas é a quantidade de linhas antigas preservadas, que ficam no início da tabela
+        combinada, seguidas dos registros novos; substituidos são as linhas antigas trocadas.
+        """
+        antigos = self._cache_derivados()['valores']
+        afetados = empilhar_tabelas([substituidos, combinada.iloc[mantidas:]])
+        valores = {
+            nome: valor for nome, valor in antigos.items()
+            if nome.split(':')[0] in DEPENDENCIAS_DERIVADOS and tabela not in DEPENDENCIAS_DERIVADOS[nome.split(':')[0]]
+        }
+        
+        if 'fatos' in antigos and tabela in TABELAS_FATO:
+            # Juntar às dimensões só os registros novos e empilhar com a parte mantida do fato
+            fatos = dict(antigos['fatos'])
+            nome = TABELAS_FATO[tabela]
+            fato_novo = construir_fato(tabela, combinada.iloc[mantidas:], construir_dim_veiculos(self.vehicles), self.users)
+            trocados = fatos[nome]['id'].isin(afetados['id']).to_numpy() if 'id' in combinada.columns else np.zeros(len(fatos[nome]), dtype=bool)
+            fato_removido = fatos[nome][trocados]
+            fatos[nome] = empilhar_tabelas([fatos[nome][~trocados], fato_novo.reindex(columns=fatos[nome].columns)])
+            fatos['orfaos'] = relatorio_orfaos(fatos)
+            valores['fatos'] = fatos
+            
+            if tabela == 'maintenances' and 'vehicle_id' in afetados.columns:
+                manutencoes = fatos['manutencoes']
+                veiculos = pd.unique(afetados['vehicle_id'].dropna())
+                tocadas = manutencoes[manutencoes['vehicle_id'].isin(veiculos)]
+                if 'custos_mensais_por_veiculo' in antigos:
+                    custos = antigos['custos_mensais_por_veiculo']
+                    valores['custos_mensais_por_veiculo'] = pd.concat([
+                        custos[~custos.index.get_level_values('vehicle_id').isin(veiculos)],
+                        self._calcular_custos_mensais_por_veiculo(tocadas)
+                    ]).sort_index()
+                if 'custos_por_veiculo' in antigos:
+                    custos = antigos['custos_por_veiculo']
+                    rotulos = pd.unique(pd.concat([fato_removido['veiculo'], fato_novo['veiculo']]).dropna().astype(object))
+                    valores['custos_por_veiculo'] = pd.concat([
+                        custos[~custos.index.isin(rotulos)],
+                        self._calcular_custos_por_veiculo(manutencoes[manutencoes['veiculo'].isin(rotulos)])
+                    ]).sort_values(ascending=False)
+        
+        if tabela == 'point_records':
+            # As partições (de cada modo de pareamento) são atualizadas numa cópia, pois as da versão anterior
+            # são compartilhadas com outras sessões; a tabela de horas é remontada sob demanda
+            for nome, particoes in antigos.items():
+                if nome.startswith('horas_particionadas:') and particoes is not None:
+                    particoes = particoes.copia()
+                    particoes.aplicar(substituidos, combinada.iloc[mantidas:])
+                    valores[nome] = particoes
+        
+        return valores
 
     def carregar_dados_exemplo(self):
         """Carrega dados de exemplo diretamente no código"""
@@ -231,16 +640,19 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
                 self.users = pd.read_csv(io.StringIO(users_data))
                 self.point_records = pd.read_csv(io.StringIO(points_data))
                 
-                # Converter datas
-                self._converter_datas()
+                # Converter datas e aplicar o esquema compacto
+                with self._etapa('conversão de datas'):
+                    self._converter_datas()
+                with self._etapa('esquema compacto'):
+                    for tabela in ESQUEMA_TABELAS:
+                        aplicar_esquema(tabela, getattr(self, tabela))
+                self._mostrar_formatos_datas()
+                self._mostrar_memoria_tabelas()
                 
-                # Salvar no session state
-                st.session_state.dados_carregados = True
-                st.session_state.dados_veiculos = self.vehicles
-                st.session_state.dados_utilizacoes = self.vehicle_uses
-                st.session_state.dados_manutencoes = self.maintenances
-                st.session_state.dados_usuarios = self.users
-                st.session_state.dados_ponto = self.point_records
+                # Publicar no repositório compartilhado
+                self._publicar_dados('exemplo')
+                # Juntar as tabelas às dimensões uma única vez, na carga
+                self._fatos()
                 
                 st.success("✅ Dados de exemplo carregados com sucesso!")
                 st.balloons()
@@ -251,33 +663,36 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
     def _converter_datas(self):
         """Converte colunas de data"""
         try:
-            # Vehicles
-            if 'created_at' in self.vehicles.columns:
-                self.vehicles['created_at'] = pd.to_datetime(self.vehicles['created_at'], errors='coerce')
-            
-            # Vehicle Uses
-            if 'created_at' in self.vehicle_uses.columns:
-                self.vehicle_uses['created_at'] = pd.to_datetime(self.vehicle_uses['created_at'], errors='coerce')
-            if 'data_inicio' in self.vehicle_uses.columns:
-                self.vehicle_uses['data_inicio'] = pd.to_datetime(self.vehicle_uses['data_inicio'], format='mixed', errors='coerce')
-            if 'data_fim' in self.vehicle_uses.columns:
-                self.vehicle_uses['data_fim'] = pd.to_datetime(self.vehicle_uses['data_fim'], format='mixed', errors='coerce')
-            
-            # Point Records
-            if 'created_at' in self.point_records.columns:
-                self.point_records['created_at'] = pd.to_datetime(self.point_records['created_at'], errors='coerce')
-            if 'data' in self.point_records.columns:
-                self.point_records['data'] = pd.to_datetime(self.point_records['data'], errors='coerce')
-            
-            # Maintenances
-            if 'created_at' in self.maintenances.columns:
-                self.maintenances['created_at'] = pd.to_datetime(self.maintenances['created_at'], errors='coerce')
-            if 'data_manutencao' in self.maintenances.columns:
-                self.maintenances['data_manutencao'] = pd.to_datetime(self.maintenances['data_manutencao'], errors='coerce')
+            for tabela in COLUNAS_DATA:
+                converter_datas_tabela(tabela, getattr(self, tabela))
                 
         except Exception as e:
             st.warning(f"Aviso na conversão de datas: {e}")
 
+    def _mostrar_formatos_datas(self):
+        """Mostra quantas linhas de cada coluna de data caíram em cada formato"""
+        formatos = self.vehicle_uses.attrs.get('formatos_data')
+        if formatos:
+            with st.expander("📅 Formatos de data detectados nas utilizações"):
+                st.dataframe(pd.DataFrame(formatos).fillna(0).astype(int), use_container_width=True)
+
+    def _mostrar_memoria_tabelas(self):
+        """Mostra a memória de cada tabela antes e depois do esquema compacto"""
+        linhas = []
+        for tabela in ESQUEMA_TABELAS:
+            memoria = getattr(self, tabela).attrs.get('memoria')
+            if memoria:
+                linhas.append({
+                    'tabela': tabela,
+                    'antes (MB)': memoria['antes'] / 1024 ** 2,
+                    'depois (MB)': memoria['depois'] / 1024 ** 2,
+                    'redução': f"{1 - memoria['depois'] / max(memoria['antes'], 1):.0%}"
+                })
+        
+        if linhas:
+            with st.expander("💾 Memória por tabela"):
+                st.dataframe(pd.DataFrame(linhas).set_index('tabela').round(3), use_container_width=True)
+
     def interface_upload(self):
         """Interface para upload de arquivos"""
         st.markdown('<h1 class="main-header">📤 Upload de Dados - Gestão de Frotas</h1>', unsafe_allow_html=True)
@@ -307,11 +722,17 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
             uploaded_users = st.file_uploader("users_rows.csv", type="csv", key="users")
             uploaded_point_records = st.file_uploader("point_records_rows.csv", type="csv", key="points")
         
+        # Leitura em blocos para exports muito grandes
+        em_blocos = st.checkbox(
+            "📦 Ler em blocos (arquivos grandes, menor uso de memória)",
+            help="Lê cada arquivo em partes, reduzindo os tipos de cada parte antes de juntá-las"
+        )
+        
         # Botão para processar
         if st.button("🚀 Processar Dados", type="primary", use_container_width=True):
             self.processar_upload(
                 uploaded_vehicles, uploaded_vehicle_uses, uploaded_maintenances,
-                uploaded_users, uploaded_point_records
+                uploaded_users, uploaded_point_records, em_blocos
             )
         
         # Opção para usar dados de exemplo
@@ -320,104 +741,384 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         
         if st.button("📊 Carregar Dados de Exemplo", use_container_width=True):
             self.carregar_dados_exemplo()
+        
+        # Opção para reabrir o último upload sem reprocessar os CSVs
+        snapshot = info_snapshot()
+        if snapshot is not None:
+            total_linhas = sum(snapshot['linhas'].values())
+            if st.button(f"💾 Carregar Último Snapshot ({snapshot['criado_em']}, {total_linhas:,} linhas)", use_container_width=True):
+                self.carregar_snapshot()
+
+    def _id_sessao(self):
+        """Identificador desta sessão nas concessões do repositório de dados"""
+        if 'id_sessao' not in st.session_state:
+            st.session_state.id_sessao = uuid.uuid4().hex
+        return st.session_state.id_sessao
+
+    def _publicar_dados(self, versao, compartilhados=None):
+        """Publica as tabelas carregadas no repositório compartilhado e passa a sessão para a versão
+
+        A sessão guarda só a versão; se outra sessão já publicou a mesma versão, as tabelas dela são
+        reaproveitadas e as recém-lidas descartadas.
+        """
+        repositorio = repositorio_dados()
+        repositorio.publicar(versao, {tabela: getattr(self, tabela) for tabela in NOMES_TABELAS}, compartilhados)
+        self._liberar_dados()
+        repositorio.adquirir(versao, self._id_sessao())
+        st.session_state.versao_dados = versao
+        st.session_state.dados_carregados = True
+        self._carregar_sessao()
+
+    def _liberar_dados(self):
+        """Encerra a concessão da sessão sobre a versão atual, que pode ser descartada quando ociosa"""
+        versao = st.session_state.get('versao_dados')
+        if versao is not None:
+            repositorio_dados().liberar(versao, self._id_sessao())
+
+    def _carregar_sessao(self):
+        """Carrega do repositório compartilhado as tabelas da versão da sessão; False se já descartada"""
+        tabelas = repositorio_dados().tabelas(st.session_state.get('versao_dados'), self._id_sessao())
+        if tabelas is None:
+            return False
+        for tabela, df in tabelas.items():
+            setattr(self, tabela, df)
+        return True
 
     def mostrar_header(self):
         """Cabeçalho do dashboard"""
         st.markdown('<h1 class="main-header">🚗 Dashboard de Gestão de Frotas</h1>', unsafe_allow_html=True)
         
-        # Carregar dados do session state
-        self.vehicles = st.session_state.dados_veiculos
-        self.vehicle_uses = st.session_state.dados_utilizacoes
-        self.maintenances = st.session_state.dados_manutencoes
-        self.users = st.session_state.dados_usuarios
-        self.point_records = st.session_state.dados_ponto
-        
         # Métricas principais
+        kpis = self._derivado('kpis', self._calcular_kpis)
         col1, col2, col3, col4, col5 = st.columns(5)
         
         with col1:
-            st.metric("Total Veículos", len(self.vehicles))
+            st.metric("Total Veículos", kpis['veiculos'])
         with col2:
-            st.metric("Utilizações", len(self.vehicle_uses))
+            st.metric("Utilizações", kpis['utilizacoes'])
         with col3:
-            st.metric("Manutenções", len(self.maintenances))
+            st.metric("Manutenções", kpis['manutencoes'])
         with col4:
-            st.metric("Registros Ponto", len(self.point_records))
+            st.metric("Registros Ponto", kpis['registros_ponto'])
         with col5:
-            if not self.maintenances.empty and 'custo' in self.maintenances.columns:
-                custo_total = self.maintenances['custo'].sum()
-                st.metric("Custo Manutenções", f"R$ {custo_total:,.2f}")
+            if kpis['custo_total'] is not None:
+                st.metric("Custo Manutenções", f"R$ {kpis['custo_total']:,.2f}")
             else:
                 st.metric("Custo Manutenções", "R$ 0,00")
 
-    def calcular_horas_trabalhadas(self):
-        """Calcula horas trabalhadas por dia e mês para cada usuário"""
-        if self.point_records is None or self.point_records.empty:
-            return None
+    def _etapa(self, nome):
+        """Etapa medida pelo perfil de desempenho, ou um contexto vazio com o perfil desligado"""
+        return self.perfil.etapa(nome) if self.perfil is not None else SEM_MEDICAO
+
+    def _preparar_perfil(self):
+        """Liga o perfil de desempenho da sessão neste rerun, se ativado no painel da sidebar"""
+        if not st.session_state.get('perfil_ativo', False):
+            self.perfil = None
+            return
+        if 'perfil_desempenho' not in st.session_state:
+            st.session_state.perfil_desempenho = PerfilDesempenho()
+        self.perfil = st.session_state.perfil_desempenho
+        self.perfil.iniciar_rerun()
+
+    def _mostrar_perfil(self):
+        """Painel de depuração: tempos por etapa do rerun, cálculos em segundo plano e memória das tabelas"""
+        with st.sidebar.expander("🔬 Perfil de Desempenho"):
+            st.checkbox("Ativar perfil", key='perfil_ativo',
+                        help="Mede cada etapa de carga, cálculo, aba, gráfico e tabela a partir do próximo rerun")
+            if self.perfil is None:
+                return
             
-        try:
-            # Garantir que a coluna data é datetime
-            if 'data' in self.point_records.columns:
-                if not pd.api.types.is_datetime64_any_dtype(self.point_records['data']):
-                    self.point_records['data'] = pd.to_datetime(self.point_records['data'], errors='coerce')
+            self.perfil.encerrar_rerun()
+            duracoes = [rerun['duracao_ms'] for rerun in self.perfil.reruns if rerun['duracao_ms'] is not None]
+            st.caption(f"Este rerun: {duracoes[-1]:,.0f} ms · média dos últimos {len(duracoes)}: {np.mean(duracoes):,.0f} ms")
+            st.dataframe(self.perfil.etapas(), use_container_width=True, hide_index=True)
             
-            # Ordenar por usuário e data
-            df_ponto = self.point_records.sort_values(['utilizador', 'data']).copy()
+            calculos = self.perfil.calculos()
+            if not calculos.empty:
+                st.caption("Cálculos em segundo plano")
+                st.dataframe(calculos.iloc[::-1], use_container_width=True, hide_index=True)
             
-            # Criar colunas para dia e mês
-            df_ponto['dia'] = df_ponto['data'].dt.date
-            df_ponto['mes'] = df_ponto['data'].dt.to_period('M')
+            # Memória das tabelas da sessão e das tabelas fato, por coluna
+            fatos = self._cache_derivados()['valores'].get('fatos') or {}
+            memoria = memoria_por_coluna({
+                **{tabela: getattr(self, tabela) for tabela in NOMES_TABELAS},
+                **{f'fato {nome}': fatos.get(nome) for nome in TABELAS_FATO.values()}
+            })
+            por_tabela = memoria.groupby('tabela', sort=False).agg(linhas=('linhas', 'first'), bytes=('bytes', 'sum'))
+            st.caption(f"Memória das tabelas: {por_tabela['bytes'].sum() / 1e6:,.1f} MB")
+            st.dataframe(por_tabela.assign(MB=por_tabela['bytes'] / 1e6).drop(columns='bytes').round(2), use_container_width=True)
+            st.dataframe(memoria.head(15), use_container_width=True, hide_index=True)
             
-            horas_trabalhadas = []
+            st.download_button(
+                "⬇️ Exportar JSON",
+                json.dumps(self.perfil.exportar(memoria), ensure_ascii=False, default=str),
+                file_name="perfil_desempenho.json", mime="application/json", use_container_width=True
+            )
+
+    def _cache_derivados(self):
+        """Cache de resultados derivados da sessão, descartado quando a versão dos dados muda"""
+        versao = st.session_state.get('versao_dados')
+        cache = st.session_state.get('cache_derivados')
+        
+        if cache is None or cache['versao'] != versao:
+            contadores = cache['contadores'] if cache is not None else {}
+            cache = {'versao': versao, 'valores': {}, 'pendentes': {}, 'contadores': contadores}
+            st.session_state.cache_derivados = cache
+        
+        return cache
+
+    def _derivado(self, nome, calcular):
+        """Retorna um resultado derivado do cache ou o calcula uma única vez por versão dos dados"""
+        cache = self._cache_derivados()
+        contador = cache['contadores'].setdefault(nome, {'acertos': 0, 'falhas': 0})
+        
+        if nome in cache['valores']:
+            contador['acertos'] += 1
+            return cache['valores'][nome]
+        
+        # Já submetido em segundo plano: esperar o resultado em vez de calcular de novo
+        if nome in cache['pendentes']:
+            with self._etapa(f'espera {nome}'):
+                return self._recolher(cache, nome)
+        
+        contador['falhas'] += 1
+        with self._etapa(f'cálculo {nome}'):
+            valor = self._compartilhar(nome, calcular)()
+        cache['valores'][nome] = valor
+        return valor
+
+    def _derivado_em_segundo_plano(self, nome, calcular):
+        """Como _derivado, mas sem bloquear: submete o cálculo ao executor e retorna (valor, pronto)
+
+        calcular roda fora da thread do script, então não pode usar st nem o session state.
+        """
+        cache = self._cache_derivados()
+        contador = cache['contadores'].setdefault(nome, {'acertos': 0, 'falhas': 0})
+        
+        if nome in cache['valores']:
+            contador['acertos'] += 1
+            return cache['valores'][nome], True
+        
+        if nome not in cache['pendentes']:
+            contador['falhas'] += 1
+            calcular = self._compartilhar(nome, calcular)
+            if self.perfil is not None:
+                calcular = self.perfil.medir_calculo(nome, calcular)
+            cache['pendentes'][nome] = executor_derivados().submit(calcular)
+        
+        if not cache['pendentes'][nome].done():
+            return None, False
+        return self._recolher(cache, nome), True
+
+    def _compartilhar(self, nome, calcular):
+        """calcular via repositório para os DERIVADOS_COMPARTILHADOS: uma vez por versão, para todas as sessões"""
+        if nome.split(':')[0] not in DERIVADOS_COMPARTILHADOS:
+            return calcular
+        versao = st.session_state.get('versao_dados')
+        return lambda: repositorio_dados().compartilhado(versao, nome, calcular)
+
+    def _recolher(self, cache, nome):
+        """Move para o cache o resultado de um cálculo em segundo plano, esperando-o se ainda roda"""
+        futuro = cache['pendentes'].pop(nome)
+        try:
+            valor = futuro.result()
+        except Exception as e:
+            st.error(f"Erro ao calcular {nome.split(':')[0].replace('_', ' ')}: {e}")
+            valor = None
+        cache['valores'][nome] = valor
+        return valor
+
+    def _agendar_derivados(self):
+        """Submete em segundo plano os resultados pesados desta versão dos dados, logo após a carga
+
+        As abas encontram os resultados prontos, ou em andamento, em vez de calculá-los no rerun.
+        """
+        fatos = self._fatos()
+        manutencoes, utilizacoes = fatos['manutencoes'], fatos['utilizacoes']
+        
+        consultas = self._consultas()
+        
+        self._horas_trabalhadas()
+        self._pontos_orfaos()
+        if {'veiculo', 'custo'} <= set(manutencoes.columns):
+            self._derivado_em_segundo_plano('custos_por_veiculo', consultas.custos_por_veiculo)
+        if {'vehicle_id', 'mes', 'custo'} <= set(manutencoes.columns):
+            self._derivado_em_segundo_plano('custos_mensais_por_veiculo', consultas.custos_mensais_por_veiculo)
+        if 'celula_linha' in fatos['ponto'].columns:
+            ponto = fatos['ponto']
+            self._derivado_em_segundo_plano('densidade_ponto', lambda: densidade_grade(ponto))
+            self._derivado_em_segundo_plano('locais_ponto', lambda: agrupar_locais(ponto))
+        if 'distancia_km' in utilizacoes.columns:
+            self._derivado_em_segundo_plano('distancia_por_veiculo', lambda: consultas.distancias_por('veiculo'))
+            self._derivado_em_segundo_plano('distancia_por_motorista', lambda: consultas.distancias_por('utilizador'))
+        if {'vehicle_id', 'data_inicio', 'data_fim'} <= set(utilizacoes.columns):
+            self._derivado_em_segundo_plano('ocupacao_frota', lambda: linha_do_tempo_frota(utilizacoes))
+
+    def _mostrar_andamento(self, descricao):
+        """Progresso dos cálculos em segundo plano, que recarrega a página quando todos terminam"""
+        def andamento():
+            pendentes = self._cache_derivados()['pendentes']
+            prontos = sum(futuro.done() for futuro in pendentes.values())
+            if prontos == len(pendentes):
+                st.rerun()
+            st.progress(prontos / len(pendentes),
+                        text=f"⏳ Calculando {descricao} em segundo plano ({prontos}/{len(pendentes)} cálculos prontos)...")
+        
+        # Sem fragmentos (Streamlit antigo), a página é atualizada pelo botão
+        if hasattr(st, 'fragment'):
+            st.fragment(andamento, run_every=INTERVALO_ANDAMENTO_SEGUNDOS)()
+        else:
+            andamento()
+            st.button("🔄 Atualizar")
+
+    def estatisticas_cache(self):
+        """Acertos e falhas do cache de resultados derivados, por resultado"""
+        contadores = self._cache_derivados()['contadores']
+        return pd.DataFrame.from_dict(contadores, orient='index', columns=['acertos', 'falhas'])
+
+    def _calcular_kpis(self):
+        """Métricas principais do cabeçalho"""
+        return self._consultas().kpis()
+
+    def calcular_horas_trabalhadas(self):
+        """Calcula horas trabalhadas por dia, semana e mês para cada usuário
+
+        Retorna uma tabela indexada por (tipo_periodo, utilizador, periodo), onde
+        periodo é a data de início do dia, da semana ISO ou do mês.
+        """
+        if self.point_records is None or self.point_records.empty:
+            return None
             
-            # Para cada usuário, calcular horas trabalhadas
-            for usuario in df_ponto['utilizador'].unique():
-                user_data = df_ponto[df_ponto['utilizador'] == usuario].copy()
-                
-                # Calcular por dia
-                for dia in user_data['dia'].unique():
-                    dia_data = user_data[user_data['dia'] == dia].sort_values('data')
-                    
-                    # Encontrar pares de ENTRADA/SAÍDA
-                    entradas = dia_data[dia_data['tipo'] == 'ENTRADA']
-                    saidas = dia_data[dia_data['tipo'] == 'SAÍDA']
-                    
-                    total_horas_dia = 0
-                    
-                    for _, entrada in entradas.iterrows():
-                        # Encontrar saída correspondente (próxima saída após a entrada)
-                        saida_correspondente = saidas[saidas['data'] > entrada['data']].head(1)
-                        
-                        if not saida_correspondente.empty:
-                            horas_trabalhadas_dia = (saida_correspondente.iloc[0]['data'] - entrada['data']).total_seconds() / 3600
-                            total_horas_dia += max(0, horas_trabalhadas_dia)  # Evitar valores negativos
-                    
-                    if total_horas_dia > 0:
-                        horas_trabalhadas.append({
-                            'utilizador': usuario,
-                            'periodo': dia,
-                            'tipo_periodo': 'Dia',
-                            'horas_trabalhadas': round(total_horas_dia, 2)
-                        })
-                
-                # Calcular por mês
-                for mes in user_data['mes'].unique():
-                    mes_data = user_data[user_data['mes'] == mes]
-                    total_horas_mes = mes_data.groupby('utilizador')['horas_trabalhadas'].sum().iloc[0] if 'horas_trabalhadas' in mes_data.columns else 0
-                    
-                    horas_trabalhadas.append({
-                        'utilizador': usuario,
-                        'periodo': mes,
-                        'tipo_periodo': 'Mês',
-                        'horas_trabalhadas': round(total_horas_mes, 2)
-                    })
+        try:
+            # Horas por partição (utilizador, dia), atualizadas em lugar quando chegam registros novos
+            particoes = self._derivado(f'horas_particionadas:{self._chave_pareamento()}', self._tarefa_horas_particionadas())
+            horas_trabalhadas = particoes.tabela()
             
-            return pd.DataFrame(horas_trabalhadas) if horas_trabalhadas else None
+            return horas_trabalhadas if not horas_trabalhadas.empty else None
             
         except Exception as e:
             st.error(f"Erro ao calcular horas trabalhadas: {e}")
             return None
 
+    def _tarefa_horas_particionadas(self):
+        """Cálculo das partições de horas no modo de pareamento atual, sem depender do session state"""
+        # Garantir que a coluna data é datetime (numa cópia: as tabelas são compartilhadas entre sessões)
+        pontos = self.point_records
+        if 'data' in pontos.columns and not pd.api.types.is_datetime64_any_dtype(pontos['data']):
+            pontos = pontos.assign(data=pd.to_datetime(pontos['data'], errors='coerce'))
+        
+        turno_maximo = self._turno_maximo()
+        processos = processos_disponiveis() if st.session_state.get('pareamento_paralelo', False) else 1
+        return lambda: HorasParticionadas(pontos, turno_maximo, processos)
+
+    def _turno_maximo(self):
+        """Duração máxima de turno do pareamento pela linha do tempo, ou None no pareamento por dia"""
+        if st.session_state.get('modo_pareamento', MODOS_PAREAMENTO[0]) == MODOS_PAREAMENTO[0]:
+            return None
+        return pd.Timedelta(hours=st.session_state.get('turno_maximo_horas', TURNO_MAXIMO_PADRAO_HORAS))
+
+    def _chave_pareamento(self):
+        """Identifica o modo de pareamento nos nomes dos resultados derivados"""
+        turno_maximo = self._turno_maximo()
+        return 'dia' if turno_maximo is None else f'turno{turno_maximo / pd.Timedelta(hours=1):g}h'
+
+    def _horas_trabalhadas(self):
+        """Tabela de horas trabalhadas do modo de pareamento escolhido, calculada em segundo plano
+
+        Retorna (horas, pronto): enquanto o cálculo roda, horas é None e pronto é False.
+        """
+        if self.point_records is None or self.point_records.empty:
+            return None, True
+        
+        chave = self._chave_pareamento()
+        particoes, pronto = self._derivado_em_segundo_plano(f'horas_particionadas:{chave}', self._tarefa_horas_particionadas())
+        if not pronto or particoes is None:
+            return None, pronto
+        return self._derivado_em_segundo_plano(
+            f'horas_trabalhadas:{chave}', lambda: particoes.tabela() if particoes.totais else None
+        )
+
+    def _pontos_orfaos(self):
+        """Registros sem par no pareamento pela linha do tempo, ou None no pareamento por dia e enquanto são calculados"""
+        turno_maximo = self._turno_maximo()
+        if turno_maximo is None or self.point_records is None or self.point_records.empty:
+            return None
+        pontos = self.point_records
+        return self._derivado_em_segundo_plano(
+            f'pontos_orfaos:{self._chave_pareamento()}', lambda: pontos_orfaos(pontos, turno_maximo)
+        )[0]
+
+    def _mostrar_grafico(self, id_grafico, dados, construir, filtros=()):
+        """Mostra um gráfico montado por construir() a partir de dados, reaproveitando a figura já montada
+
+        filtros reúne o que, além dos dados, muda a figura (como o usuário ou veículo do título).
+        """
+        with self._etapa(f'gráfico {id_grafico}'):
+            fig = cache_figuras().obter(id_grafico, dados, construir, filtros)
+            st.plotly_chart(fig, use_container_width=True)
+
+    def _tabela_paginada(self, df, chave, colunas=None, **kwargs):
+        """Mostra uma tabela em páginas: só as linhas da página visível são enviadas ao navegador
+
+        UUIDs empacotados são convertidos de volta em texto só nas linhas da página.
+        """
+        with self._etapa(f'tabela {chave}'):
+            colunas = list(df.columns) if colunas is None else colunas
+            if len(df) <= LINHAS_POR_PAGINA[0]:
+                st.dataframe(uuids_em_texto(df[colunas]), use_container_width=True, **kwargs)
+                return
+            
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                linhas = st.selectbox("Linhas por página:", LINHAS_POR_PAGINA, key=f'{chave}_linhas')
+            paginas = -(-len(df) // linhas)
+            
+            # Uma página guardada pode não existir mais depois de um filtro
+            if st.session_state.get(f'{chave}_pagina', 1) > paginas:
+                st.session_state[f'{chave}_pagina'] = paginas
+            with col2:
+                pagina = st.number_input("Página:", min_value=1, max_value=paginas, key=f"{chave}_pagina")
+            inicio = (pagina - 1) * linhas
+            with col3:
+                st.caption(f"Linhas {inicio + 1:,} a {min(inicio + linhas, len(df)):,} de {len(df):,}")
+            
+            st.dataframe(uuids_em_texto(df.iloc[inicio:inicio + linhas][colunas]), use_container_width=True, **kwargs)
+
+    def _fatiar_horas(self, horas_trabalhadas, tipo_periodo, usuario):
+        """Horas de um usuário num tipo de período, indexadas pelo início do período"""
+        if horas_trabalhadas is None:
+            return pd.Series(dtype=float)
+        try:
+            return horas_trabalhadas.loc[(tipo_periodo, usuario), 'horas_trabalhadas']
+        except KeyError:
+            return pd.Series(dtype=float)
+
+    def _fatos(self):
+        """Tabelas fato já juntadas às dimensões, construídas uma vez por versão dos dados"""
+        versao = st.session_state.get('versao_dados')
+        return self._derivado('fatos', lambda: repositorio_dados().compartilhado(versao, 'fatos', lambda: construir_fatos(
+            self.vehicles, self.vehicle_uses, self.maintenances, self.users, self.point_records
+        )))
+
+    def _consultas(self):
+        """Agregações das abas sobre as tabelas fato já carregadas na sessão"""
+        return ConsultasPandas(self.vehicles, self._fatos())
+
+    def _calcular_custos_por_veiculo(self, manutencoes=None):
+        """Custo total de manutenção por veículo (placa), do maior para o menor
+
+        Com manutencoes (um recorte da tabela fato), calcula em pandas; senão, pelo motor de consultas.
+        """
+        if manutencoes is None:
+            return self._consultas().custos_por_veiculo()
+        return custos_por_veiculo(manutencoes)
+
+    def _calcular_custos_mensais_por_veiculo(self, manutencoes=None):
+        """Custo de manutenção por veículo e mês"""
+        if manutencoes is None:
+            return self._consultas().custos_mensais_por_veiculo()
+        return custos_mensais_por_veiculo(manutencoes)
+
     def aba_visao_geral(self):
         """Aba com visão geral"""
         st.header("📊 Visão Geral")
@@ -428,23 +1129,25 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         with col1:
             # Status dos veículos
             if 'status' in self.vehicles.columns:
-                status_count = self.vehicles['status'].value_counts()
-                fig = px.pie(values=status_count.values, names=status_count.index, 
-                            title="Status dos Veículos",
-                            color_discrete_sequence=px.colors.sequential.Viridis)
-                fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                st.plotly_chart(fig, use_container_width=True)
+                status_count = self._derivado('veiculos_por_status', lambda: self._consultas().contagem('veiculos', 'status'))
+                self._mostrar_grafico('veiculos_por_status', status_count, lambda: px.pie(
+                    values=status_count.values,
+                    names=status_count.index,
+                    title="Status dos Veículos",
+                    color_discrete_sequence=px.colors.sequential.Viridis
+                ))
         
         with col2:
             # Tipo de veículo
             if 'tipo' in self.vehicles.columns:
-                tipo_count = self.vehicles['tipo'].value_counts()
-                fig = px.bar(x=tipo_count.index, y=tipo_count.values,
-                            title="Distribuição por Tipo de Veículo",
-                            labels={'x': 'Tipo', 'y': 'Quantidade'},
-                            color_discrete_sequence=['#6366F1'])
-                fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                st.plotly_chart(fig, use_container_width=True)
+                tipo_count = self._derivado('veiculos_por_tipo', lambda: self._consultas().contagem('veiculos', 'tipo'))
+                self._mostrar_grafico('veiculos_por_tipo', tipo_count, lambda: px.bar(
+                    x=tipo_count.index,
+                    y=tipo_count.values,
+                    title="Distribuição por Tipo de Veículo",
+                    labels={'x': 'Tipo', 'y': 'Quantidade'},
+                    color_discrete_sequence=['#6366F1']
+                ))
         
         # Segunda linha de gráficos
         col3, col4 = st.columns(2)
@@ -452,34 +1155,28 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         with col3:
             # Utilizações por veículo (top 5)
             if not self.vehicle_uses.empty and 'vehicle_id' in self.vehicle_uses.columns:
-                vehicle_usage = self.vehicle_uses['vehicle_id'].value_counts().head(5)
+                vehicle_usage = self._derivado('utilizacoes_por_veiculo', lambda: self._consultas().contagem('utilizacoes', 'veiculo')).head(5)
                 if not vehicle_usage.empty:
-                    vehicle_labels = []
-                    for vid in vehicle_usage.index:
-                        veiculo = self.vehicles[self.vehicles['id'] == vid]
-                        if not veiculo.empty and 'placa' in veiculo.columns:
-                            vehicle_labels.append(f"{veiculo.iloc[0]['placa']}")
-                        else:
-                            vehicle_labels.append(str(vid)[:8])
-                    
-                    fig = px.bar(x=vehicle_labels, y=vehicle_usage.values,
-                                title="Top 5 Veículos Mais Utilizados",
-                                labels={'x': 'Veículo', 'y': 'Utilizações'},
-                                color_discrete_sequence=['#10B981'])
-                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                    st.plotly_chart(fig, use_container_width=True)
+                    self._mostrar_grafico('top_veiculos_utilizados', vehicle_usage, lambda: px.bar(
+                        x=vehicle_usage.index,
+                        y=vehicle_usage.values,
+                        title="Top 5 Veículos Mais Utilizados",
+                        labels={'x': 'Veículo', 'y': 'Utilizações'},
+                        color_discrete_sequence=['#10B981']
+                    ))
         
         with col4:
             # Custo de manutenção por veículo
             if not self.maintenances.empty and 'vehicle_id' in self.maintenances.columns:
-                maint_costs = self.maintenances.groupby('vehicle_id')['custo'].sum().nlargest(5)
+                maint_costs = self._derivado('custos_por_veiculo', self._calcular_custos_por_veiculo).head(5)
                 if not maint_costs.empty:
-                    fig = px.bar(x=maint_costs.index.astype(str), y=maint_costs.values,
-                                title="Top 5 Veículos - Custos de Manutenção",
-                                labels={'x': 'Veículo', 'y': 'Custo (R$)'},
-                                color_discrete_sequence=['#F59E0B'])
-                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                    st.plotly_chart(fig, use_container_width=True)
+                    self._mostrar_grafico('top_veiculos_custos', maint_costs, lambda: px.bar(
+                        x=maint_costs.index,
+                        y=maint_costs.values,
+                        title="Top 5 Veículos - Custos de Manutenção",
+                        labels={'x': 'Veículo', 'y': 'Custo (R$)'},
+                        color_discrete_sequence=['#F59E0B']
+                    ))
 
     def aba_veiculos(self):
         """Aba detalhada de veículos"""
@@ -516,7 +1213,7 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
                 colunas_mostrar.append(col)
         
         if colunas_mostrar:
-            st.dataframe(filtered_vehicles[colunas_mostrar], use_container_width=True)
+            self._tabela_paginada(filtered_vehicles, 'tabela_veiculos', colunas_mostrar)
         
         # Estatísticas
         col3, col4, col5 = st.columns(3)
@@ -535,66 +1232,163 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         """Aba de utilização de veículos"""
         st.header("📈 Análise de Utilização")
         
-        # Calcular duração se possível
-        if all(col in self.vehicle_uses.columns for col in ['data_inicio', 'data_fim']):
-            # VERIFICAR SE AS DATAS SÃO VÁLIDAS ANTES DE CALCULAR
-            if self.vehicle_uses['data_inicio'].notna().any() and self.vehicle_uses['data_fim'].notna().any():
-                self.vehicle_uses['duracao_horas'] = (
-                    self.vehicle_uses['data_fim'] - self.vehicle_uses['data_inicio']
-                ).dt.total_seconds() / 3600
+        # Totais e médias de duração e quilometragem (None onde as datas ou leituras não forem válidas)
+        resumo = self._derivado('resumo_utilizacoes', lambda: self._consultas().resumo_utilizacoes())
         
         col1, col2 = st.columns(2)
         
         with col1:
             # Top motoristas
             if 'utilizador' in self.vehicle_uses.columns:
-                top_motoristas = self.vehicle_uses['utilizador'].value_counts().head(10)
+                top_motoristas = self._derivado('utilizacoes_por_motorista', lambda: self._consultas().contagem('utilizacoes', 'utilizador')).head(10)
                 if not top_motoristas.empty:
-                    fig = px.bar(x=top_motoristas.index, y=top_motoristas.values,
-                                title="Top 10 Motoristas",
-                                labels={'x': 'Motorista', 'y': 'Quantidade de Utilizações'},
-                                color_discrete_sequence=['#8B5CF6'])
-                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                    fig.update_layout(xaxis_tickangle=-45)
-                    st.plotly_chart(fig, use_container_width=True)
+                    self._mostrar_grafico('top_motoristas', top_motoristas, lambda: px.bar(
+                        x=top_motoristas.index,
+                        y=top_motoristas.values,
+                        title="Top 10 Motoristas",
+                        labels={'x': 'Motorista', 'y': 'Quantidade de Utilizações'},
+                        color_discrete_sequence=['#8B5CF6']
+                    ).update_layout(xaxis_tickangle=-45))
         
         with col2:
             # Duração média por motorista
-            if 'duracao_horas' in self.vehicle_uses.columns and 'utilizador' in self.vehicle_uses.columns:
-                duracao_media = self.vehicle_uses.groupby('utilizador')['duracao_horas'].mean().nlargest(10)
+            if resumo['horas_total'] is not None and 'utilizador' in self.vehicle_uses.columns:
+                duracao_media = self._derivado(
+                    'duracao_media_por_motorista', lambda: self._consultas().duracao_media_por('utilizador')
+                ).head(10)
                 if not duracao_media.empty:
-                    fig = px.bar(x=duracao_media.index, y=duracao_media.values,
-                                title="Duração Média por Motorista (Horas)",
-                                labels={'x': 'Motorista', 'y': 'Horas'},
-                                color_discrete_sequence=['#EC4899'])
-                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                    fig.update_layout(xaxis_tickangle=-45)
-                    st.plotly_chart(fig, use_container_width=True)
+                    self._mostrar_grafico('duracao_media_motorista', duracao_media, lambda: px.bar(
+                        x=duracao_media.index,
+                        y=duracao_media.values,
+                        title="Duração Média por Motorista (Horas)",
+                        labels={'x': 'Motorista', 'y': 'Horas'},
+                        color_discrete_sequence=['#EC4899']
+                    ).update_layout(xaxis_tickangle=-45))
         
         # Estatísticas de utilização
         st.subheader("📊 Estatísticas de Utilização")
         col3, col4, col5, col6 = st.columns(4)
         
         with col3:
-            if 'duracao_horas' in self.vehicle_uses.columns:
-                total_horas = self.vehicle_uses['duracao_horas'].sum()
-                st.metric("Total Horas Utilizadas", f"{total_horas:.1f}h")
+            if resumo['horas_total'] is not None:
+                st.metric("Total Horas Utilizadas", f"{resumo['horas_total']:.1f}h")
         
         with col4:
-            if 'duracao_horas' in self.vehicle_uses.columns:
-                media_horas = self.vehicle_uses['duracao_horas'].mean()
-                st.metric("Duração Média", f"{media_horas:.1f}h")
+            if resumo['horas_medio'] is not None:
+                st.metric("Duração Média", f"{resumo['horas_medio']:.1f}h")
         
         with col5:
             if 'vehicle_id' in self.vehicle_uses.columns and not self.vehicle_uses.empty:
-                veiculo_mais_usado = self.vehicle_uses['vehicle_id'].value_counts().idxmax()
-                veiculo_info = self.vehicles[self.vehicles['id'] == veiculo_mais_usado]
-                if not veiculo_info.empty and 'placa' in veiculo_info.columns:
-                    st.metric("Veículo Mais Usado", f"{veiculo_info.iloc[0]['placa']}")
+                contagem = self._derivado('utilizacoes_por_veiculo', lambda: self._consultas().contagem('utilizacoes', 'veiculo'))
+                # Vazia (ou só com as categorias zeradas) quando nenhuma utilização tem veículo cadastrado
+                if len(contagem) and contagem.iloc[0] > 0:
+                    st.metric("Veículo Mais Usado", contagem.idxmax())
         
         with col6:
             total_utilizacoes = len(self.vehicle_uses)
             st.metric("Total Utilizações", total_utilizacoes)
+        
+        # Quilometragem lida de 'inicio / fim' na carga dos dados
+        utilizacoes = self._fatos()['utilizacoes']
+        if 'distancia_km' in utilizacoes.columns:
+            st.subheader("🛣️ Quilometragem")
+            alertas = self._derivado('alertas_quilometragem', lambda: self._consultas().contagem('utilizacoes', 'km_alerta'))
+            
+            col7, col8, col9 = st.columns(3)
+            with col7:
+                st.metric("Km Total", f"{resumo['km_total'] or 0:,.0f} km")
+            with col8:
+                km_medio = resumo['km_medio']
+                st.metric("Km Médio por Utilização", f"{km_medio:,.1f} km" if km_medio is not None else "-")
+            with col9:
+                st.metric("Leituras Suspeitas", int(alertas.sum()))
+            
+            col10, col11 = st.columns(2)
+            with col10:
+                km_veiculo = self._derivado('distancia_por_veiculo', lambda: self._consultas().distancias_por('veiculo')).head(10)
+                if not km_veiculo.empty and 'veiculo' in utilizacoes.columns:
+                    self._mostrar_grafico('km_por_veiculo', km_veiculo, lambda: px.bar(
+                        x=km_veiculo.index,
+                        y=km_veiculo['km_total'],
+                        title="Km Rodados por Veículo",
+                        labels={'x': 'Veículo', 'y': 'Km'},
+                        color_discrete_sequence=['#14B8A6']
+                    ))
+            
+            with col11:
+                if 'utilizador' in utilizacoes.columns:
+                    km_motorista = self._derivado('distancia_por_motorista', lambda: self._consultas().distancias_por('utilizador')).head(10)
+                    if not km_motorista.empty:
+                        self._mostrar_grafico('km_por_motorista', km_motorista, lambda: px.bar(
+                            x=km_motorista.index,
+                            y=km_motorista['km_total'],
+                            title="Km Rodados por Motorista",
+                            labels={'x': 'Motorista', 'y': 'Km'},
+                            color_discrete_sequence=['#0EA5E9']
+                        ).update_layout(xaxis_tickangle=-45))
+            
+            # Leituras invertidas, implausíveis ou ilegíveis ficam fora dos totais
+            if alertas.sum() > 0:
+                with st.expander(f"⚠️ Leituras de quilometragem suspeitas ({int(alertas.sum())})"):
+                    st.caption(" · ".join(f"{alerta}: {quantidade}" for alerta, quantidade in alertas.items() if quantidade))
+                    colunas_mostrar = [col for col in ['data_inicio', 'veiculo', 'utilizador', 'quilometragem', 'km_alerta']
+                                       if col in utilizacoes.columns]
+                    self._tabela_paginada(utilizacoes[utilizacoes['km_alerta'].notna()], 'tabela_alertas_km', colunas_mostrar)
+        
+        if {'vehicle_id', 'data_inicio', 'data_fim'} <= set(utilizacoes.columns):
+            self._mostrar_ocupacao_frota(utilizacoes)
+
+    def _mostrar_ocupacao_frota(self, utilizacoes):
+        """Veículos em uso ao longo do tempo, utilização de cada veículo e usos sobrepostos"""
+        st.subheader("🚦 Ocupação da Frota")
+        ocupacao = self._derivado('ocupacao_frota', lambda: linha_do_tempo_frota(utilizacoes))
+        curva, por_veiculo, sobreposicoes = ocupacao['curva'], ocupacao['por_veiculo'], ocupacao['sobreposicoes']
+        if curva.empty:
+            st.info("Nenhuma utilização com início e fim válidos.")
+            return
+        
+        # Média ponderada pelo tempo: horas em uso de toda a frota sobre a janela dos dados
+        janela_horas = (curva.index[-1] - curva.index[0]) / pd.Timedelta(hours=1)
+        media_em_uso = por_veiculo['horas_em_uso'].sum() / janela_horas if janela_horas else 0.0
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Pico de Veículos em Uso", ocupacao['pico']['veiculos'],
+                      help=f"Em {ocupacao['pico']['inicio']:%d/%m/%Y %H:%M}")
+        with col2:
+            st.metric("Média em Uso", f"{media_em_uso:.1f}")
+        with col3:
+            st.metric("Utilização da Frota", f"{100 * media_em_uso / len(por_veiculo):.1f}%")
+        with col4:
+            st.metric("Usos Sobrepostos", len(sobreposicoes))
+        
+        descricao, por_periodo = ocupacao_por_periodo(curva)
+        self._mostrar_grafico('ocupacao_frota', por_periodo, lambda: px.line(
+            x=por_periodo.index,
+            y=por_periodo.values,
+            title=f"Pico de Veículos em Uso por {descricao.capitalize()}",
+            labels={'x': 'Data', 'y': 'Veículos em uso'},
+            line_shape='hv',
+            color_discrete_sequence=['#F59E0B']
+        ))
+        
+        mais_usados = por_veiculo.head(BARRAS_MAXIMAS_TEMPO)
+        self._mostrar_grafico('utilizacao_por_veiculo', mais_usados, lambda: px.bar(
+            x=mais_usados['veiculo'],
+            y=mais_usados['utilizacao_pct'],
+            title="Utilização por Veículo (% do período)",
+            labels={'x': 'Veículo', 'y': 'Utilização (%)'},
+            color_discrete_sequence=['#F59E0B']
+        ).update_layout(xaxis_tickangle=-45))
+        
+        self._tabela_paginada(por_veiculo, 'tabela_ocupacao_veiculos', hide_index=True)
+        
+        # O mesmo veículo em duas utilizações ao mesmo tempo indica erro de lançamento
+        if not sobreposicoes.empty:
+            with st.expander(f"⚠️ Utilizações sobrepostas do mesmo veículo ({len(sobreposicoes)})"):
+                colunas_mostrar = [col for col in ['id', 'veiculo', 'data_inicio', 'data_fim', 'sobreposta_a', 'sobreposicao_horas']
+                                   if col in sobreposicoes.columns]
+                self._tabela_paginada(sobreposicoes, 'tabela_sobreposicoes', colunas_mostrar)
 
     def aba_manutencoes(self):
         """Aba de manutenções"""
@@ -605,14 +1399,15 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         with col1:
             # Custos totais por veículo
             if 'vehicle_id' in self.maintenances.columns and 'custo' in self.maintenances.columns:
-                custos_veiculo = self.maintenances.groupby('vehicle_id')['custo'].sum().nlargest(10)
+                custos_veiculo = self._derivado('custos_por_veiculo', self._calcular_custos_por_veiculo).head(10)
                 if not custos_veiculo.empty:
-                    fig = px.bar(x=custos_veiculo.index.astype(str), y=custos_veiculo.values,
-                                title="Custos de Manutenção por Veículo",
-                                labels={'x': 'Veículo', 'y': 'Custo Total (R$)'},
-                                color_discrete_sequence=['#EF4444'])
-                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                    st.plotly_chart(fig, use_container_width=True)
+                    self._mostrar_grafico('custos_por_veiculo', custos_veiculo, lambda: px.bar(
+                        x=custos_veiculo.index,
+                        y=custos_veiculo.values,
+                        title="Custos de Manutenção por Veículo",
+                        labels={'x': 'Veículo', 'y': 'Custo Total (R$)'},
+                        color_discrete_sequence=['#EF4444']
+                    ))
         
         with col2:
             # Evolução temporal dos custos
@@ -620,17 +1415,19 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
                 try:
                     # VERIFICAR SE AS DATAS SÃO VÁLIDAS
                     if self.maintenances['data_manutencao'].notna().any():
-                        custos_mensais = self.maintenances.groupby(
-                            self.maintenances['data_manutencao'].dt.to_period('M')
-                        )['custo'].sum()
+                        custos_mensais = self._derivado(
+                            'custos_mensais_por_veiculo', self._calcular_custos_mensais_por_veiculo
+                        ).groupby(level='mes').sum()
                         if not custos_mensais.empty:
+                            custos_mensais = reduzir_lttb(custos_mensais)
                             custos_mensais.index = custos_mensais.index.astype(str)
-                            fig = px.line(x=custos_mensais.index, y=custos_mensais.values,
-                                         title="Evolução Mensal dos Custos",
-                                         labels={'x': 'Mês', 'y': 'Custo (R$)'},
-                                         color_discrete_sequence=['#F59E0B'])
-                            fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                            st.plotly_chart(fig, use_container_width=True)
+                            self._mostrar_grafico('custos_mensais', custos_mensais, lambda: px.line(
+                                x=custos_mensais.index,
+                                y=custos_mensais.values,
+                                title="Evolução Mensal dos Custos",
+                                labels={'x': 'Mês', 'y': 'Custo (R$)'},
+                                color_discrete_sequence=['#F59E0B']
+                            ))
                 except:
                     pass
         
@@ -659,67 +1456,113 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         
         # Tabela de manutenções
         st.subheader("📋 Detalhes das Manutenções")
+        manutencoes = self._fatos()['manutencoes']
         colunas_mostrar = []
-        for col in ['data_manutencao', 'descricao', 'custo', 'status']:
-            if col in self.maintenances.columns:
+        for col in ['data_manutencao', 'veiculo', 'descricao', 'custo', 'status']:
+            if col in manutencoes.columns:
                 colunas_mostrar.append(col)
         
         if colunas_mostrar:
-            st.dataframe(self.maintenances[colunas_mostrar], use_container_width=True)
+            self._tabela_paginada(manutencoes, 'tabela_manutencoes', colunas_mostrar)
 
     def aba_controle_ponto(self):
         """Aba de controle de ponto"""
         st.header("⏰ Controle de Ponto")
         
-        # CORREÇÃO: Verificar se a coluna 'data' existe e é datetime
-        if 'data' in self.point_records.columns:
-            # Verificar se já é datetime, se não, converter
-            if not pd.api.types.is_datetime64_any_dtype(self.point_records['data']):
-                self.point_records['data'] = pd.to_datetime(self.point_records['data'], errors='coerce')
-            
-            # Só criar a coluna 'hora' se as datas forem válidas
-            if self.point_records['data'].notna().any():
-                self.point_records['hora'] = self.point_records['data'].dt.hour
+        # Registros por hora do dia (None se as datas não forem válidas)
+        registros_hora = self._derivado('registros_por_hora', lambda: self._consultas().registros_por_hora())
         
         col1, col2 = st.columns(2)
         
         with col1:
             # Distribuição por tipo
             if 'tipo' in self.point_records.columns:
-                tipo_ponto = self.point_records['tipo'].value_counts()
+                tipo_ponto = self._derivado('registros_por_tipo', lambda: self._consultas().contagem('ponto', 'tipo'))
                 if not tipo_ponto.empty:
-                    fig = px.pie(values=tipo_ponto.values, names=tipo_ponto.index,
-                                title="Distribuição de Tipos de Registro",
-                                color_discrete_sequence=px.colors.sequential.Plasma)
-                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                    st.plotly_chart(fig, use_container_width=True)
+                    self._mostrar_grafico('tipos_registro', tipo_ponto, lambda: px.pie(
+                        values=tipo_ponto.values,
+                        names=tipo_ponto.index,
+                        title="Distribuição de Tipos de Registro",
+                        color_discrete_sequence=px.colors.sequential.Plasma
+                    ))
         
         with col2:
             # Registros por hora - SÓ SE A COLUNA HORA EXISTIR
-            if 'hora' in self.point_records.columns and self.point_records['hora'].notna().any():
-                registros_hora = self.point_records['hora'].value_counts().sort_index()
+            if registros_hora is not None:
                 if not registros_hora.empty:
-                    fig = px.bar(x=registros_hora.index, y=registros_hora.values,
-                                title="Registros por Hora do Dia",
-                                labels={'x': 'Hora', 'y': 'Quantidade'},
-                                color_discrete_sequence=['#06B6D4'])
-                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                    st.plotly_chart(fig, use_container_width=True)
+                    self._mostrar_grafico('registros_por_hora', registros_hora, lambda: px.bar(
+                        x=registros_hora.index,
+                        y=registros_hora.values,
+                        title="Registros por Hora do Dia",
+                        labels={'x': 'Hora', 'y': 'Quantidade'},
+                        color_discrete_sequence=['#06B6D4']
+                    ))
             else:
                 st.info("⚠️ Dados de hora não disponíveis para análise")
         
         # Top usuários
         st.subheader("👥 Atividade por Usuário")
         if 'utilizador' in self.point_records.columns:
-            usuarios_ativos = self.point_records['utilizador'].value_counts().head(10)
+            usuarios_ativos = self._derivado('registros_por_usuario', lambda: self._consultas().contagem('ponto', 'usuario')).head(10)
             if not usuarios_ativos.empty:
-                fig = px.bar(x=usuarios_ativos.index, y=usuarios_ativos.values,
-                            title="Top 10 Usuários - Registros de Ponto",
-                            labels={'x': 'Usuário', 'y': 'Registros'},
-                            color_discrete_sequence=['#84CC16'])
-                fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                fig.update_layout(xaxis_tickangle=-45)
-                st.plotly_chart(fig, use_container_width=True)
+                self._mostrar_grafico('top_usuarios_ponto', usuarios_ativos, lambda: px.bar(
+                    x=usuarios_ativos.index,
+                    y=usuarios_ativos.values,
+                    title="Top 10 Usuários - Registros de Ponto",
+                    labels={'x': 'Usuário', 'y': 'Registros'},
+                    color_discrete_sequence=['#84CC16']
+                ).update_layout(xaxis_tickangle=-45))
+        
+        # Mapa e locais de registro, a partir da grade geográfica calculada na carga
+        ponto = self._fatos()['ponto']
+        if 'celula_linha' in ponto.columns and (ponto['celula_linha'] >= 0).any():
+            self._mostrar_locais_ponto(ponto)
+
+    def _mostrar_locais_ponto(self, ponto):
+        """Mapa de densidade dos registros, locais de registro e registros fora do raio de um local"""
+        st.subheader("🗺️ Locais de Registro")
+        
+        nivel, densidade = self._derivado('densidade_ponto', lambda: densidade_grade(ponto))
+        lado_m = TAMANHO_CELULA_GRAUS * 2 ** nivel * np.pi * RAIO_TERRA_M / 180
+        self._mostrar_grafico('densidade_ponto', densidade, lambda: px.density_map(
+            densidade, lat='latitude', lon='longitude', z='registros',
+            radius=12, zoom=zoom_mapa(densidade['latitude'], densidade['longitude']),
+            map_style='carto-darkmatter',
+            title=f"Densidade de Registros (células de ~{lado_m:,.0f} m)"
+        ), (nivel,))
+        
+        locais, local_registro = self._derivado('locais_ponto', lambda: agrupar_locais(ponto))
+        if locais.empty:
+            st.info(f"Nenhum local com pelo menos {MINIMO_REGISTROS_LOCAL} registros por célula.")
+            return
+        
+        self._tabela_paginada(locais, 'tabela_locais_ponto', hide_index=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            numero = st.selectbox(
+                "Local:", locais['local'],
+                format_func=lambda numero: f"Local {numero} ({locais.at[numero, 'latitude']:.4f}, {locais.at[numero, 'longitude']:.4f})"
+            )
+        with col2:
+            raio = st.number_input("Raio permitido (m):", min_value=10, value=RAIO_PADRAO_LOCAL_M, step=50)
+        
+        # Registros fora do raio, dos usuários que batem ponto principalmente neste local
+        principais = self._derivado('locais_principais', lambda: locais_principais(ponto, local_registro))
+        usuarios = principais.index[principais == numero]
+        do_local = ponto[ponto['utilizador'].isin(usuarios)]
+        centro = locais.loc[numero]
+        latitude = pd.to_numeric(do_local['latitude'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        longitude = pd.to_numeric(do_local['longitude'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        fora = fora_do_raio(latitude, longitude, centro['latitude'], centro['longitude'], raio)
+        
+        st.metric(f"Registros fora do raio ({len(usuarios)} usuário(s) do local)", int(fora.sum()))
+        if fora.any():
+            registros_fora = do_local[fora].assign(
+                distancia_m=distancia_metros(latitude[fora], longitude[fora], centro['latitude'], centro['longitude']).round(0)
+            )
+            colunas = [coluna for coluna in ['data', 'usuario', 'tipo', 'latitude', 'longitude', 'distancia_m'] if coluna in registros_fora.columns]
+            self._tabela_paginada(registros_fora, 'tabela_fora_do_raio', colunas)
 
     def aba_manutencoes_detalhadas(self):
         """Aba detalhada de manutenções por veículo"""
@@ -733,23 +1576,16 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            # Lista de veículos com manutenções
-            veiculos_com_manutencao = self.maintenances['vehicle_id'].unique()
-            veiculos_info = []
-            
-            for vehicle_id in veiculos_com_manutencao:
-                veiculo = self.vehicles[self.vehicles['id'] == vehicle_id]
-                if not veiculo.empty:
-                    veiculos_info.append({
-                        'id': vehicle_id,
-                        'label': f"{veiculo.iloc[0]['placa']} - {veiculo.iloc[0]['marca']} {veiculo.iloc[0]['modelo']}"
-                    })
+            # Lista de veículos com manutenções (rótulos já juntados na tabela fato)
+            manutencoes = self._fatos()['manutencoes']
+            veiculos_conhecidos = manutencoes.dropna(subset=['rotulo_veiculo']).drop_duplicates('vehicle_id')
+            veiculos_info = dict(zip(veiculos_conhecidos['vehicle_id'].astype(str), veiculos_conhecidos['rotulo_veiculo'].astype(str)))
             
             if veiculos_info:
                 veiculo_selecionado = st.selectbox(
                     "Selecione o Veículo:",
-                    options=[v['id'] for v in veiculos_info],
-                    format_func=lambda x: next((v['label'] for v in veiculos_info if v['id'] == x), x)
+                    options=list(veiculos_info),
+                    format_func=lambda x: veiculos_info.get(x, x)
                 )
             else:
                 st.warning("Nenhum veículo com manutenção encontrado")
@@ -757,15 +1593,15 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         
         with col2:
             # Estatísticas do veículo selecionado
-            veiculo_info = self.vehicles[self.vehicles['id'] == veiculo_selecionado].iloc[0]
-            manutencoes_veiculo = self.maintenances[self.maintenances['vehicle_id'] == veiculo_selecionado]
+            manutencoes_veiculo = manutencoes[manutencoes['vehicle_id'].astype(str) == veiculo_selecionado]
+            placa = manutencoes_veiculo['veiculo'].iloc[0]
             
             st.metric("Total Manutenções", len(manutencoes_veiculo))
             st.metric("Custo Total", f"R$ {manutencoes_veiculo['custo'].sum():,.2f}")
             st.metric("Custo Médio", f"R$ {manutencoes_veiculo['custo'].mean():,.2f}")
         
         # Detalhes das manutenções do veículo selecionado
-        st.subheader(f"📋 Histórico de Manutenções - {veiculo_info['placa']}")
+        st.subheader(f"📋 Histórico de Manutenções - {placa}")
         
         colunas_mostrar = ['data_manutencao', 'descricao', 'custo', 'status']
         colunas_disponiveis = [col for col in colunas_mostrar if col in manutencoes_veiculo.columns]
@@ -773,28 +1609,32 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         if colunas_disponiveis:
             # Ordenar por data
             manutencoes_veiculo = manutencoes_veiculo.sort_values('data_manutencao', ascending=False)
-            st.dataframe(manutencoes_veiculo[colunas_disponiveis], use_container_width=True)
+            self._tabela_paginada(manutencoes_veiculo, 'tabela_manutencoes_veiculo', colunas_disponiveis)
         
         # Gráfico de custos ao longo do tempo
         if 'data_manutencao' in manutencoes_veiculo.columns and 'custo' in manutencoes_veiculo.columns:
             st.subheader("📈 Evolução dos Custos")
             
-            # Agrupar por mês
+            # Agrupar por mês (fatia da série mensal por veículo já calculada)
             try:
-                manutencoes_veiculo['mes'] = manutencoes_veiculo['data_manutencao'].dt.to_period('M')
-                custos_mensais = manutencoes_veiculo.groupby('mes')['custo'].sum()
+                custos_mensais_por_veiculo = self._derivado(
+                    'custos_mensais_por_veiculo', self._calcular_custos_mensais_por_veiculo
+                )
+                if veiculo_selecionado in custos_mensais_por_veiculo.index.get_level_values('vehicle_id'):
+                    custos_mensais = custos_mensais_por_veiculo.xs(veiculo_selecionado, level='vehicle_id')
+                else:
+                    custos_mensais = pd.Series(dtype=float)
                 
                 if not custos_mensais.empty:
+                    custos_mensais = reduzir_lttb(custos_mensais)
                     custos_mensais.index = custos_mensais.index.astype(str)
-                    fig = px.line(
-                        x=custos_mensais.index, 
+                    self._mostrar_grafico('custos_mensais_veiculo', custos_mensais, lambda: px.line(
+                        x=custos_mensais.index,
                         y=custos_mensais.values,
-                        title=f"Evolução Mensal dos Custos - {veiculo_info['placa']}",
+                        title=f"Evolução Mensal dos Custos - {placa}",
                         labels={'x': 'Mês', 'y': 'Custo (R$)'},
                         color_discrete_sequence=['#F59E0B']
-                    )
-                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                    st.plotly_chart(fig, use_container_width=True)
+                    ), (placa,))
             except Exception as e:
                 st.warning(f"Não foi possível gerar gráfico temporal: {e}")
 
@@ -806,15 +1646,18 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
             st.error("Dados de ponto não disponíveis!")
             return
         
-        # Calcular horas trabalhadas
-        horas_trabalhadas = self.calcular_horas_trabalhadas()
+        # Horas trabalhadas (o resto da aba não espera por elas)
+        horas_trabalhadas, horas_prontas = self._horas_trabalhadas()
         
-        # Selecionar usuário
-        usuarios = self.point_records['utilizador'].unique()
-        usuario_selecionado = st.selectbox("Selecione o Usuário:", usuarios)
+        # Selecionar usuário (pelo e-mail, exibindo o nome juntado da tabela de usuários)
+        ponto = self._fatos()['ponto']
+        usuarios = ponto.drop_duplicates('utilizador')
+        nomes_usuarios = dict(zip(usuarios['utilizador'], usuarios['usuario']))
+        usuario_selecionado = st.selectbox("Selecione o Usuário:", list(nomes_usuarios),
+                                           format_func=lambda x: nomes_usuarios.get(x, x))
         
         # Filtrar dados do usuário selecionado
-        user_data = self.point_records[self.point_records['utilizador'] == usuario_selecionado].copy()
+        user_data = ponto[ponto['utilizador'] == usuario_selecionado].copy()
         
         # Ordenar por data
         user_data = user_data.sort_values('data')
@@ -825,45 +1668,43 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
             st.subheader(f"📊 Estatísticas - {usuario_selecionado}")
             
             # Métricas básicas
+            tipo_ponto = self._derivado(
+                'registros_por_usuario_tipo',
+                lambda: self._consultas().contagem_por('ponto', ['utilizador', 'tipo'])
+            )
+            tipo_ponto = tipo_ponto.xs(usuario_selecionado, level='utilizador') if usuario_selecionado in tipo_ponto.index else pd.Series(dtype=int)
+            
             total_registros = len(user_data)
-            entradas = len(user_data[user_data['tipo'] == 'ENTRADA'])
-            saidas = len(user_data[user_data['tipo'] == 'SAÍDA'])
+            entradas = int(tipo_ponto.get('ENTRADA', 0))
+            saidas = int(tipo_ponto.get('SAÍDA', 0))
             
             st.metric("Total Registros", total_registros)
             st.metric("Entradas", entradas)
             st.metric("Saídas", saidas)
             
             # Horas trabalhadas (se disponível)
-            if horas_trabalhadas is not None:
-                horas_usuario = horas_trabalhadas[horas_trabalhadas['utilizador'] == usuario_selecionado]
-                if not horas_usuario.empty:
-                    horas_hoje = horas_usuario[
-                        (horas_usuario['tipo_periodo'] == 'Dia') & 
-                        (horas_usuario['periodo'] == datetime.now().date())
-                    ]
-                    horas_mes_atual = horas_usuario[
-                        (horas_usuario['tipo_periodo'] == 'Mês') & 
-                        (horas_usuario['periodo'] == pd.Period(datetime.now(), 'M'))
-                    ]
-                    
-                    if not horas_hoje.empty:
-                        st.metric("Horas Hoje", f"{horas_hoje.iloc[0]['horas_trabalhadas']}h")
-                    if not horas_mes_atual.empty:
-                        st.metric("Horas Este Mês", f"{horas_mes_atual.iloc[0]['horas_trabalhadas']}h")
+            horas_dia = self._fatiar_horas(horas_trabalhadas, 'Dia', usuario_selecionado)
+            horas_mes = self._fatiar_horas(horas_trabalhadas, 'Mês', usuario_selecionado)
+            
+            hoje = pd.Timestamp(datetime.now().date())
+            inicio_mes = hoje.replace(day=1)
+            
+            if hoje in horas_dia.index:
+                st.metric("Horas Hoje", f"{horas_dia[hoje]}h")
+            if inicio_mes in horas_mes.index:
+                st.metric("Horas Este Mês", f"{horas_mes[inicio_mes]}h")
         
         with col2:
             st.subheader("📅 Distribuição por Tipo")
-            tipo_ponto = user_data['tipo'].value_counts()
+            tipo_ponto = tipo_ponto.sort_values(ascending=False)
             
             if not tipo_ponto.empty:
-                fig = px.pie(
-                    values=tipo_ponto.values, 
+                self._mostrar_grafico('tipos_registro_usuario', tipo_ponto, lambda: px.pie(
+                    values=tipo_ponto.values,
                     names=tipo_ponto.index,
                     title=f"Tipos de Registro - {usuario_selecionado}",
                     color_discrete_sequence=px.colors.sequential.Plasma
-                )
-                fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                st.plotly_chart(fig, use_container_width=True)
+                ), (usuario_selecionado,))
         
         # Histórico de registros
         st.subheader("📋 Histórico de Registros")
@@ -875,75 +1716,93 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         colunas_disponiveis = [col for col in colunas_mostrar if col in user_data.columns]
         
         if colunas_disponiveis:
-            st.dataframe(user_data[colunas_disponiveis], use_container_width=True)
+            self._tabela_paginada(user_data, 'tabela_ponto_usuario', colunas_disponiveis)
+        
+        # Registros que ficaram sem par no pareamento por turnos
+        pontos_orfaos = self._pontos_orfaos()
+        if pontos_orfaos is not None:
+            orfaos_usuario = pontos_orfaos[pontos_orfaos['utilizador'] == usuario_selecionado]
+            if not orfaos_usuario.empty:
+                with st.expander(f"⚠️ Registros sem par ({len(orfaos_usuario)})"):
+                    st.dataframe(orfaos_usuario[['data', 'tipo', 'motivo']], use_container_width=True, hide_index=True)
         
         # Gráfico de horas trabalhadas (se disponível)
-        if horas_trabalhadas is not None:
-            horas_usuario = horas_trabalhadas[horas_trabalhadas['utilizador'] == usuario_selecionado]
+        if not horas_prontas:
+            st.subheader("⏱️ Horas Trabalhadas")
+            self._mostrar_andamento("as horas trabalhadas")
+        elif not horas_dia.empty or not horas_mes.empty:
+            st.subheader("⏱️ Horas Trabalhadas")
             
-            if not horas_usuario.empty:
-                st.subheader("⏱️ Horas Trabalhadas")
-                
-                # Horas por dia (últimos 30 dias)
-                horas_dia = horas_usuario[horas_usuario['tipo_periodo'] == 'Dia'].tail(30)
-                
-                if not horas_dia.empty:
-                    fig = px.bar(
-                        x=horas_dia['periodo'].astype(str),
-                        y=horas_dia['horas_trabalhadas'],
-                        title=f"Horas Trabalhadas por Dia - {usuario_selecionado}",
-                        labels={'x': 'Data', 'y': 'Horas Trabalhadas'},
-                        color_discrete_sequence=['#10B981']
-                    )
-                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                    fig.update_xaxes(tickangle=45)
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                # Horas por mês
-                horas_mes = horas_usuario[horas_usuario['tipo_periodo'] == 'Mês']
-                
-                if not horas_mes.empty:
-                    fig = px.bar(
-                        x=horas_mes['periodo'].astype(str),
-                        y=horas_mes['horas_trabalhadas'],
-                        title=f"Horas Trabalhadas por Mês - {usuario_selecionado}",
-                        labels={'x': 'Mês', 'y': 'Horas Trabalhadas'},
-                        color_discrete_sequence=['#6366F1']
-                    )
-                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                    st.plotly_chart(fig, use_container_width=True)
+            # Horas de todo o histórico, agrupadas em dias, semanas ou meses conforme a extensão
+            resolucao = resolucao_temporal(horas_dia.index)
+            horas_resolucao = agrupar_no_tempo(horas_dia, resolucao)
+            
+            if not horas_resolucao.empty:
+                self._mostrar_grafico('horas_usuario_periodo', horas_resolucao, lambda: px.bar(
+                    x=rotulo_periodo(resolucao, horas_resolucao.index),
+                    y=horas_resolucao.values,
+                    title=f"Horas Trabalhadas por {resolucao} - {usuario_selecionado}",
+                    labels={'x': 'Data', 'y': 'Horas Trabalhadas'},
+                    color_discrete_sequence=['#10B981']
+                ).update_xaxes(tickangle=45), (resolucao, usuario_selecionado))
+            
+            # Horas por mês
+            if not horas_mes.empty:
+                self._mostrar_grafico('horas_usuario_mes', horas_mes, lambda: px.bar(
+                    x=rotulo_periodo('Mês', horas_mes.index),
+                    y=horas_mes.values,
+                    title=f"Horas Trabalhadas por Mês - {usuario_selecionado}",
+                    labels={'x': 'Mês', 'y': 'Horas Trabalhadas'},
+                    color_discrete_sequence=['#6366F1']
+                ), (usuario_selecionado,))
 
     def aba_relatorio_horas(self):
         """Aba com relatório completo de horas trabalhadas"""
         st.header("📊 Relatório de Horas Trabalhadas")
         
-        horas_trabalhadas = self.calcular_horas_trabalhadas()
+        horas_trabalhadas, horas_prontas = self._horas_trabalhadas()
+        
+        if not horas_prontas:
+            self._mostrar_andamento("as horas trabalhadas")
+            return
         
         if horas_trabalhadas is None or horas_trabalhadas.empty:
             st.warning("Não foi possível calcular horas trabalhadas. Verifique os dados de ponto.")
             return
         
+        pontos_orfaos = self._pontos_orfaos()
+        if pontos_orfaos is not None and not pontos_orfaos.empty:
+            motivos = pontos_orfaos['motivo'].value_counts()
+            st.caption(f"⚠️ {len(pontos_orfaos)} registro(s) sem par fora das horas: "
+                       + " · ".join(f"{motivo}: {quantidade}" for motivo, quantidade in motivos.items()))
+        
         # Filtros
         col1, col2 = st.columns(2)
         
         with col1:
             periodo_selecionado = st.selectbox(
                 "Tipo de Período:",
-                ['Dia', 'Mês', 'Todos']
+                TIPOS_PERIODO + ['Todos']
             )
         
         with col2:
+            usuarios = horas_trabalhadas.index.get_level_values('utilizador').unique()
             usuarios_selecionados = st.multiselect(
                 "Usuários:",
-                options=horas_trabalhadas['utilizador'].unique(),
-                default=horas_trabalhadas['utilizador'].unique()
+                options=usuarios,
+                default=usuarios
             )
         
-        # Aplicar filtros
-        dados_filtrados = horas_trabalhadas[horas_trabalhadas['utilizador'].isin(usuarios_selecionados)]
-        
-        if periodo_selecionado != 'Todos':
-            dados_filtrados = dados_filtrados[dados_filtrados['tipo_periodo'] == periodo_selecionado]
+        # Aplicar filtros (fatias do índice, sem recalcular as horas)
+        tipos = TIPOS_PERIODO if periodo_selecionado == 'Todos' else [periodo_selecionado]
+        dados_filtrados = horas_trabalhadas.loc[(tipos, usuarios_selecionados), :].reset_index()
+        rotulos = dados_filtrados['periodo'].astype(str)
+        for tipo in tipos:
+            mascara = dados_filtrados['tipo_periodo'] == tipo
+            rotulos[mascara] = rotulo_periodo(tipo, dados_filtrados.loc[mascara, 'periodo'])
+        dados_filtrados['periodo'] = rotulos
+        # Totais e gráfico por usuário sobre um só tipo de período (em 'Todos', o dia); a tabela mostra todos
+        resumo = horas_do_resumo(dados_filtrados, periodo_selecionado)
         
         # Métricas gerais
         st.subheader("📈 Métricas Gerais")
@@ -951,69 +1810,75 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         col3, col4, col5, col6 = st.columns(4)
         
         with col3:
-            total_horas = dados_filtrados['horas_trabalhadas'].sum()
+            total_horas = resumo['horas_trabalhadas'].sum()
             st.metric("Total Horas", f"{total_horas:.1f}h")
         
         with col4:
-            media_horas = dados_filtrados['horas_trabalhadas'].mean()
+            media_horas = resumo['horas_trabalhadas'].mean()
             st.metric("Média por Período", f"{media_horas:.1f}h")
         
         with col5:
-            total_usuarios = dados_filtrados['utilizador'].nunique()
+            total_usuarios = resumo['utilizador'].nunique()
             st.metric("Usuários", total_usuarios)
         
         with col6:
-            total_periodos = dados_filtrados['periodo'].nunique()
+            total_periodos = resumo['periodo'].nunique()
             st.metric("Períodos", total_periodos)
         
         # Tabela detalhada
         st.subheader("📋 Detalhamento por Usuário")
-        st.dataframe(dados_filtrados, use_container_width=True)
+        self._tabela_paginada(dados_filtrados, 'tabela_relatorio_horas')
         
         # Gráficos
         col7, col8 = st.columns(2)
         
         with col7:
             # Top usuários por horas totais
-            horas_por_usuario = dados_filtrados.groupby('utilizador')['horas_trabalhadas'].sum().sort_values(ascending=False)
+            horas_por_usuario = resumo.groupby('utilizador', observed=True)['horas_trabalhadas'].sum().sort_values(ascending=False)
             
             if not horas_por_usuario.empty:
-                fig = px.bar(
+                self._mostrar_grafico('horas_por_usuario', horas_por_usuario, lambda: px.bar(
                     x=horas_por_usuario.index,
                     y=horas_por_usuario.values,
                     title="Total de Horas por Usuário",
                     labels={'x': 'Usuário', 'y': 'Horas Trabalhadas'},
                     color_discrete_sequence=['#8B5CF6']
-                )
-                fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                fig.update_xaxes(tickangle=45)
-                st.plotly_chart(fig, use_container_width=True)
+                ).update_xaxes(tickangle=45))
         
         with col8:
             # Evolução temporal (apenas para dias)
             if periodo_selecionado == 'Dia':
-                evolucao_diaria = dados_filtrados.groupby('periodo')['horas_trabalhadas'].sum().sort_index()
+                evolucao_diaria = horas_trabalhadas.loc[('Dia', usuarios_selecionados), 'horas_trabalhadas'].groupby(level='periodo').sum()
+                evolucao_diaria = reduzir_lttb(evolucao_diaria)
                 
                 if not evolucao_diaria.empty:
-                    fig = px.line(
-                        x=evolucao_diaria.index.astype(str),
+                    self._mostrar_grafico('evolucao_diaria_horas', evolucao_diaria, lambda: px.line(
+                        x=evolucao_diaria.index,
                         y=evolucao_diaria.values,
                         title="Evolução Diária de Horas Trabalhadas",
                         labels={'x': 'Data', 'y': 'Horas Trabalhadas'},
                         color_discrete_sequence=['#EC4899']
-                    )
-                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-                    fig.update_xaxes(tickangle=45)
-                    st.plotly_chart(fig, use_container_width=True)
+                    ).update_xaxes(tickangle=45))
 
     def executar_dashboard(self):
         """Executa o dashboard completo"""
+        self._preparar_perfil()
+        
         # Verificar se dados foram carregados
         if not st.session_state.get('dados_carregados', False):
             self.interface_upload()
             return
         
-        self.mostrar_header()
+        # Dados descartados do repositório depois de muito tempo sem uso: carregar de novo
+        if not self._carregar_sessao():
+            st.session_state.dados_carregados = False
+            st.warning("⏳ Os dados desta sessão foram descartados por inatividade. Carregue-os novamente.")
+            self.interface_upload()
+            return
+        
+        # Cálculos pesados começam em segundo plano antes de desenhar a página
+        with self._etapa('agendar cálculos'):
+            self._agendar_derivados()
         
         # Sidebar com navegação
         st.sidebar.title("🌙 Navegação")
@@ -1033,26 +1898,47 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         
         # Botão para recarregar dados
         if st.sidebar.button("🔄 Carregar Novos Dados", use_container_width=True):
+            self._liberar_dados()
             st.session_state.dados_carregados = False
             st.rerun()
         
+        # Anexar só os registros novos, sem recarregar as cinco tabelas (antes do cabeçalho, para os KPIs já refletirem)
+        with st.sidebar.expander("➕ Anexar Registros"):
+            tabela_anexo = st.selectbox("Tabela:", list(NOMES_TABELAS), format_func=lambda tabela: NOMES_TABELAS[tabela], index=4)
+            arquivo_anexo = st.file_uploader("CSV com registros novos", type="csv", key="arquivo_anexo")
+            if st.button("Anexar", use_container_width=True, disabled=arquivo_anexo is None):
+                self.anexar_registros(tabela_anexo, arquivo_anexo)
+        
+        # Modo de pareamento de ENTRADA/SAÍDA usado nas horas trabalhadas
+        with st.sidebar.expander("⏱️ Pareamento de Ponto"):
+            st.radio("Modo:", MODOS_PAREAMENTO, key='modo_pareamento',
+                     help="Turnos pareia pela linha do tempo do usuário, aceitando turnos que passam da meia-noite")
+            st.slider("Turno máximo (horas):", 1, 48, TURNO_MAXIMO_PADRAO_HORAS, key='turno_maximo_horas',
+                      disabled=st.session_state.get('modo_pareamento', MODOS_PAREAMENTO[0]) == MODOS_PAREAMENTO[0])
+            st.checkbox(f"⚡ Parear em paralelo ({processos_disponiveis()} núcleos)", key='pareamento_paralelo',
+                        help=f"Divide os usuários entre processos a partir de {LIMITE_PARALELO_REGISTROS:,} registros")
+        
+        with self._etapa('cabeçalho'):
+            self.mostrar_header()
+        
         # Navegação entre abas
-        if aba_selecionada == "Visão Geral":
-            self.aba_visao_geral()
-        elif aba_selecionada == "Veículos":
-            self.aba_veiculos()
-        elif aba_selecionada == "Utilização":
-            self.aba_utilizacao()
-        elif aba_selecionada == "Manutenções":
-            self.aba_manutencoes()
-        elif aba_selecionada == "Manutenções por Veículo":
-            self.aba_manutencoes_detalhadas()
-        elif aba_selecionada == "Controle de Ponto":
-            self.aba_controle_ponto()
-        elif aba_selecionada == "Ponto por Usuário":
-            self.aba_controle_ponto_detalhado()
-        elif aba_selecionada == "Relatório de Horas":
-            self.aba_relatorio_horas()
+        with self._etapa(f'aba {aba_selecionada}'):
+            if aba_selecionada == "Visão Geral":
+                self.aba_visao_geral()
+            elif aba_selecionada == "Veículos":
+                self.aba_veiculos()
+            elif aba_selecionada == "Utilização":
+                self.aba_utilizacao()
+            elif aba_selecionada == "Manutenções":
+                self.aba_manutencoes()
+            elif aba_selecionada == "Manutenções por Veículo":
+                self.aba_manutencoes_detalhadas()
+            elif aba_selecionada == "Controle de Ponto":
+                self.aba_controle_ponto()
+            elif aba_selecionada == "Ponto por Usuário":
+                self.aba_controle_ponto_detalhado()
+            elif aba_selecionada == "Relatório de Horas":
+                self.aba_relatorio_horas()
         
         # Informações na sidebar
         st.sidebar.markdown("---")
@@ -1063,6 +1949,32 @@ d19d76fa-a790-4be3-a578-c0ce6026afc9,2025-09-01 22:39:18.668552+00,445f97a3-6f3e
         - ⏱️ Cálculo de horas trabalhadas
         - 📊 Relatórios completos de horas
         """)
+        
+        # Chaves sem correspondência nas dimensões, encontradas na junção feita na carga
+        orfaos = self._fatos()['orfaos']
+        if orfaos['registros órfãos'].sum() > 0:
+            with st.sidebar.expander("🔗 Chaves Órfãs"):
+                st.caption("Registros cuja chave não existe na tabela de veículos ou de usuários")
+                st.dataframe(orfaos[orfaos['registros órfãos'] > 0], use_container_width=True, hide_index=True)
+        
+        # Tempo de montagem de cada gráfico e reaproveitamento das figuras
+        with st.sidebar.expander("📈 Tempo dos Gráficos"):
+            st.dataframe(cache_figuras().estatisticas(), use_container_width=True)
+        
+        # Conjuntos de dados na memória do servidor e sessões que os usam
+        with st.sidebar.expander("🗄️ Dados Compartilhados"):
+            st.dataframe(repositorio_dados().estatisticas(), use_container_width=True, hide_index=True)
+        
+        # Acertos e falhas do cache de métricas, para ajuste de desempenho
+        with st.sidebar.expander("🧮 Cache de Métricas"):
+            estatisticas = self.estatisticas_cache()
+            pendentes = self._cache_derivados()['pendentes']
+            st.caption(f"Acertos: {estatisticas['acertos'].sum()} · Falhas: {estatisticas['falhas'].sum()}"
+                       f" · Em segundo plano: {sum(not futuro.done() for futuro in pendentes.values())}")
+            st.dataframe(estatisticas, use_container_width=True)
+        
+        # Tempos por etapa e memória das tabelas, para achar o que deixa um rerun lento
+        self._mostrar_perfil()
 
 # Executar a aplicação
 if __name__ == "__main__":
@@ -0,0 +1,310 @@
+# benchmark.py - Medições de desempenho das etapas de carga do dashboard
+import argparse
+import io
+import json
+import multiprocessing
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from analise_frotas import (
+    COLUNAS_DATA, HorasParticionadas, agregar_horas_periodos, aplicar_esquema, construir_fatos,
+    converter_datas_formatos, converter_datas_tabela, linha_do_tempo_frota, ler_csv_em_blocos,
+    ocupacao_por_periodo, parear_em_paralelo, parear_entradas_saidas, processos_disponiveis
+)
+from gerador_dados import gerar_frota, para_csv
+
+# Resultados registrados nesta execução e histórico usado para apontar regressões
+RESULTADOS = []
+ARQUIVO_RESULTADOS = Path('.benchmarks') / 'resultados.jsonl'
+TOLERANCIA_REGRESSAO = 1.2
+DIFERENCA_MINIMA_SEGUNDOS = 0.05
+
+# Abas do dashboard medidas pelo benchmark 'abas', na ordem da navegação
+ABAS = [
+    'aba_visao_geral', 'aba_veiculos', 'aba_utilizacao', 'aba_manutencoes', 'aba_manutencoes_detalhadas',
+    'aba_controle_ponto', 'aba_controle_ponto_detalhado', 'aba_relatorio_horas'
+]
+
+def gerar_datas_misturadas(linhas, semente=0):
+    """Coluna de datas no formato dos exports: DD/MM/AAAA HH:MM:SS e AAAA-MM-DD misturados"""
+    rng = np.random.default_rng(semente)
+    instantes = pd.Series(pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 600 * 86400, linhas), unit='s'))
+    brasileiro = instantes.dt.strftime('%d/%m/%Y %H:%M:%S')
+    iso = instantes.dt.strftime('%Y-%m-%d')
+    return pd.Series(np.where(rng.random(linhas) < 0.3, iso, brasileiro), dtype=object)
+
+def medir(funcao, *args, **kwargs):
+    """Executa a função uma vez e retorna o resultado e o tempo em segundos"""
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    return resultado, time.perf_counter() - inicio
+
+def registrar(benchmark, etapa, linhas, segundos):
+    """Guarda uma medição para gravação no histórico ao fim da execução"""
+    RESULTADOS.append({'benchmark': benchmark, 'etapa': etapa, 'linhas': linhas, 'segundos': round(segundos, 4)})
+
+def _medir_e_registrar(benchmark, etapa, linhas, funcao, *args, exibir=True, **kwargs):
+    """medir() seguido de registrar(); com exibir=False o tempo não é impresso (suítes que montam a própria tabela)"""
+    resultado, tempo = medir(funcao, *args, **kwargs)
+    registrar(benchmark, etapa, linhas, tempo)
+    if exibir:
+        print(f"  {etapa:44s} {tempo:9.3f}s")
+    return resultado, tempo
+
+def bench_datas(linhas):
+    """Conversão por formato contra pd.to_datetime(format='mixed')"""
+    serie = gerar_datas_misturadas(linhas)
+
+    (_, contagem), tempo_formatos = _medir_e_registrar('datas', 'por formato', linhas, converter_datas_formatos, serie, exibir=False)
+    _, tempo_mixed = _medir_e_registrar(
+        'datas', "format='mixed'", linhas, pd.to_datetime, serie, format='mixed', errors='coerce', exibir=False
+    )
+
+    print(f"Datas ({linhas:,} linhas)")
+    print(f"  por formato:    {tempo_formatos:8.2f}s  {contagem}")
+    print(f"  format='mixed': {tempo_mixed:8.2f}s")
+    print(f"  ganho:          {tempo_mixed / tempo_formatos:8.1f}x")
+
+def gerar_csv_ponto(linhas, semente=0):
+    """CSV de registros de ponto no layout do export point_records"""
+    rng = np.random.default_rng(semente)
+    instantes = pd.Series(pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 600 * 86400, linhas), unit='s'))
+    df = pd.DataFrame({
+        'id': [f'{i:08x}-0000-4000-8000-{i:012x}' for i in range(linhas)],
+        'created_at': (instantes + pd.Timedelta(hours=3)).dt.strftime('%Y-%m-%d %H:%M:%S.%f+00'),
+        'tipo': rng.choice(['ENTRADA', 'SAÍDA'], linhas),
+        'utilizador': rng.choice([f'usuario{i}@empresa.com' for i in range(500)], linhas),
+        'data': instantes.dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'latitude': rng.normal(-23.58, 0.05, linhas),
+        'longitude': rng.normal(-46.59, 0.05, linhas)
+    })
+    return df.to_csv(index=False).encode()
+
+def _medir_ingestao(conteudo, em_blocos, fila):
+    """Mede tempo, tamanho final e pico de memória (Python + Arrow) de uma leitura, num processo limpo"""
+    tracemalloc.start()
+    pool = pa.default_memory_pool()
+    inicio = time.perf_counter()
+    if em_blocos:
+        df = ler_csv_em_blocos('point_records', conteudo)
+    else:
+        df = converter_datas_tabela('point_records', pd.read_csv(io.BytesIO(conteudo)))
+    tempo = time.perf_counter() - inicio
+    pico = tracemalloc.get_traced_memory()[1] + pool.max_memory()
+    fila.put((tempo, int(df.memory_usage(deep=True).sum()), pico))
+
+def bench_ingestao(linhas):
+    """Leitura inteira contra leitura em blocos: tempo e pico de memória"""
+    conteudo = gerar_csv_ponto(linhas)
+    contexto = multiprocessing.get_context('spawn')
+
+    print(f"Ingestão de point_records ({linhas:,} linhas, {len(conteudo) / 1e6:,.0f} MB de CSV)")
+    for em_blocos in (False, True):
+        fila = contexto.Queue()
+        processo = contexto.Process(target=_medir_ingestao, args=(conteudo, em_blocos, fila))
+        processo.start()
+        tempo, tamanho, pico = fila.get()
+        processo.join()
+        modo = 'em blocos' if em_blocos else 'inteira'
+        registrar('ingestao', modo, linhas, tempo)
+        print(f"  {modo:10s} {tempo:7.2f}s  tabela {tamanho / 1e6:7.1f} MB  pico {pico / 1e6:7.1f} MB ({pico / tamanho:.1f}x)")
+
+def gerar_jornadas(dias, usuarios, inicio=pd.Timestamp('2024-01-01'), semente=0):
+    """Registros de ponto com duas jornadas por usuário e dia (08h-12h e 13h-17h, com variação)"""
+    rng = np.random.default_rng(semente)
+    total = dias * usuarios
+    dia = inicio + pd.to_timedelta(np.repeat(np.arange(dias), usuarios), unit='D')
+    usuario = np.tile([f'usuario{i}@empresa.com' for i in range(usuarios)], dias)
+
+    partes = []
+    for ordem, (tipo, hora) in enumerate([('ENTRADA', 8), ('SAÍDA', 12), ('ENTRADA', 13), ('SAÍDA', 17)]):
+        partes.append(pd.DataFrame({
+            'id': [f'{inicio.dayofyear}-{ordem}-{i}' for i in range(total)],
+            'tipo': tipo,
+            'utilizador': usuario,
+            'data': dia + pd.to_timedelta(hora * 60 + rng.integers(-20, 20, total), unit='min')
+        }))
+    return pd.concat(partes, ignore_index=True).astype({'tipo': 'category', 'utilizador': 'category'})
+
+def bench_horas(linhas):
+    """Atualização de um dia de ponto nas partições contra o recálculo completo, para históricos crescentes"""
+    usuarios = max(linhas // (4 * 720), 10)
+    print(f"Horas trabalhadas ({usuarios} usuários, 4 registros por usuário e dia)")
+    print(f"  {'histórico':>10s} {'linhas':>10s} {'completo':>10s} {'1 dia':>10s} {'partições':>10s}")
+
+    for dias in (30, 180, 720):
+        historico = gerar_jornadas(dias, usuarios)
+        estado = HorasParticionadas(historico)
+        _, tempo_completo = _medir_e_registrar(
+            'horas', f'completo {dias} d', linhas, lambda: agregar_horas_periodos(parear_entradas_saidas(historico)), exibir=False
+        )
+
+        # Um dia novo e a correção de 1% dos registros do último dia do histórico
+        novo_dia = gerar_jornadas(1, usuarios, inicio=pd.Timestamp('2024-01-01') + pd.Timedelta(days=dias), semente=1)
+        ultimo_dia = historico[historico['data'] >= historico['data'].max().normalize()]
+        corrigidos = ultimo_dia.sample(max(len(ultimo_dia) // 100, 1), random_state=0)
+        novos = pd.concat([novo_dia, corrigidos.assign(data=corrigidos['data'] + pd.Timedelta(minutes=5))], ignore_index=True)
+        sujas, tempo_dia = _medir_e_registrar('horas', f'1 dia sobre {dias} d', linhas, estado.aplicar, corrigidos, novos, exibir=False)
+
+        print(f"  {dias:>8d} d {len(historico):>10,} {tempo_completo:>9.3f}s {tempo_dia:>9.3f}s {sujas:>10,}")
+
+def bench_paralelo(linhas):
+    """Pareamento dividido por usuário entre 1 e N processos, nos dois modos de pareamento"""
+    usuarios = max(linhas // (4 * 365), 10)
+    historico = gerar_jornadas(max(linhas // (4 * usuarios), 1), usuarios)
+    maximo = processos_disponiveis()
+    contagens = sorted({1, maximo} | {2 ** i for i in range(1, maximo.bit_length()) if 2 ** i < maximo})
+
+    print(f"Pareamento em paralelo ({len(historico):,} registros, {usuarios} usuários, {maximo} núcleos)")
+    for turno_maximo in (None, pd.Timedelta(hours=14)):
+        modo = 'mesmo dia' if turno_maximo is None else 'turnos 14h'
+        base, tempo_base = _medir_e_registrar(
+            'paralelo', f'{modo} sequencial', linhas, parear_entradas_saidas, historico, turno_maximo, exibir=False
+        )
+        for processos in contagens:
+            diario, tempo = _medir_e_registrar(
+                'paralelo', f'{modo} {processos} processos', linhas, parear_em_paralelo, historico, turno_maximo, processos, exibir=False
+            )
+            igual = 'igual' if diario.equals(base) else 'DIFERENTE'
+            print(f"  {modo:10s} {processos:>3d} processos {tempo:8.2f}s  {tempo_base / tempo:5.1f}x  {igual}")
+
+def gerar_utilizacoes(linhas, veiculos, semente=0):
+    """Utilizações de veículos ao longo de 3 anos, de 10 min a 10 h, com parte delas sobrepostas"""
+    rng = np.random.default_rng(semente)
+    inicio = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 3 * 365 * 24 * 60, linhas), unit='min')
+    vehicle_id = rng.integers(0, veiculos, linhas)
+    return pd.DataFrame({
+        'id': np.arange(linhas),
+        'vehicle_id': vehicle_id,
+        'veiculo': pd.Categorical.from_codes(vehicle_id, [f'ABC{i:04d}' for i in range(veiculos)]),
+        'data_inicio': inicio,
+        'data_fim': inicio + pd.to_timedelta(rng.integers(10, 600, linhas), unit='min')
+    })
+
+def bench_ocupacao(linhas):
+    """Varredura da ocupação da frota para volumes crescentes de utilizações"""
+    veiculos = max(linhas // 4000, 10)
+    print(f"Ocupação da frota ({veiculos} veículos)")
+    print(f"  {'utilizações':>12s} {'varredura':>10s} {'ns/uso':>8s} {'gráfico':>9s} {'pico':>6s} {'sobrepostas':>12s}")
+
+    for fracao in (8, 4, 2, 1):
+        utilizacoes = gerar_utilizacoes(linhas // fracao, veiculos)
+        ocupacao, tempo = _medir_e_registrar('ocupacao', f'varredura 1/{fracao}', linhas, linha_do_tempo_frota, utilizacoes, exibir=False)
+        _, tempo_grafico = _medir_e_registrar(
+            'ocupacao', f'gráfico 1/{fracao}', linhas, ocupacao_por_periodo, ocupacao['curva'], exibir=False
+        )
+        print(f"  {len(utilizacoes):>12,} {tempo:>9.2f}s {1e9 * tempo / len(utilizacoes):>8.0f} {tempo_grafico:>8.3f}s "
+              f"{ocupacao['pico']['veiculos']:>6d} {len(ocupacao['sobreposicoes']):>12,}")
+
+def _renderizar_aba(app, aba):
+    """Executa a aba sem servidor (o Streamlit ignora os elementos fora de uma sessão)
+
+    Cálculos que a aba deixou em segundo plano são esperados e a aba é executada de novo, como
+    faz o recarregamento automático da página, até não restar nenhum pendente.
+    """
+    getattr(app, aba)()
+    pendentes = app._cache_derivados()['pendentes']
+    while pendentes:
+        for futuro in list(pendentes.values()):
+            futuro.result()
+        getattr(app, aba)()
+
+def bench_abas(linhas):
+    """Carga, conversão, horas e preparação de cada aba sobre uma frota sintética com linhas registros de ponto"""
+    # Só este benchmark precisa do dashboard (e do Streamlit); os demais usam apenas o núcleo de análise
+    from app import GestaoFrotasStreamlit, cache_figuras
+
+    tabelas, _ = _medir_e_registrar('abas', 'geração', linhas, gerar_frota, linhas)
+    conteudos = {tabela: para_csv(df) for tabela, df in tabelas.items()}
+    print(f"Frota sintética ({', '.join(f'{tabela} {len(df):,}' for tabela, df in tabelas.items())})")
+
+    carregadas = {}
+    for tabela, conteudo in conteudos.items():
+        df, _ = _medir_e_registrar('abas', f'leitura {tabela}', linhas, lambda: pd.read_csv(io.BytesIO(conteudo)))
+        df, _ = _medir_e_registrar('abas', f'conversão de datas {tabela}', linhas, converter_datas_tabela, tabela, df)
+        carregadas[tabela], _ = _medir_e_registrar('abas', f'esquema {tabela}', linhas, aplicar_esquema, tabela, df)
+
+    _medir_e_registrar('abas', 'tabelas fato', linhas, construir_fatos, *(carregadas[tabela] for tabela in COLUNAS_DATA))
+    _medir_e_registrar('abas', 'horas trabalhadas', linhas, lambda: HorasParticionadas(carregadas['point_records']).tabela())
+
+    # Sessão como deixada pela carga dos arquivos: tabelas publicadas no repositório e tabelas fato já montadas
+    app = GestaoFrotasStreamlit()
+    for tabela, df in carregadas.items():
+        setattr(app, tabela, df)
+    app._publicar_dados(f'benchmark-{linhas}')
+    fatos = app._fatos()
+
+    # Primeira abertura (sem resultados derivados nem figuras) e reabertura de cada aba
+    for aba in ABAS:
+        cache = app._cache_derivados()
+        cache['valores'] = {'fatos': fatos}
+        cache_figuras.clear()
+        _medir_e_registrar('abas', f'{aba} (primeira)', linhas, _renderizar_aba, app, aba)
+        _medir_e_registrar('abas', f'{aba} (reabertura)', linhas, _renderizar_aba, app, aba)
+
+def _commit_atual():
+    """Commit do código medido, se estiver num repositório git"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def gravar_resultados(arquivo=ARQUIVO_RESULTADOS):
+    """Acrescenta os resultados ao histórico JSONL e aponta etapas mais lentas que na medição anterior"""
+    arquivo = Path(arquivo)
+    anteriores = {}
+    if arquivo.exists():
+        for linha in arquivo.read_text(encoding='utf-8').splitlines():
+            registro = json.loads(linha)
+            anteriores[(registro['benchmark'], registro['etapa'], registro['linhas'])] = registro
+
+    contexto = {
+        'data': datetime.now().isoformat(timespec='seconds'), 'commit': _commit_atual(),
+        'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__
+    }
+    regressoes = []
+    for resultado in RESULTADOS:
+        anterior = anteriores.get((resultado['benchmark'], resultado['etapa'], resultado['linhas']))
+        if (anterior is not None and resultado['segundos'] > anterior['segundos'] * TOLERANCIA_REGRESSAO
+                and resultado['segundos'] - anterior['segundos'] > DIFERENCA_MINIMA_SEGUNDOS):
+            regressoes.append((resultado, anterior))
+
+    arquivo.parent.mkdir(parents=True, exist_ok=True)
+    with arquivo.open('a', encoding='utf-8') as saida:
+        for resultado in RESULTADOS:
+            saida.write(json.dumps({**contexto, **resultado}, ensure_ascii=False) + '\n')
+
+    print(f"{len(RESULTADOS)} medições gravadas em {arquivo}")
+    for resultado, anterior in regressoes:
+        print(f"  ⚠️ {resultado['etapa']}: {anterior['segundos']:.3f}s ({anterior['commit']}) -> {resultado['segundos']:.3f}s")
+
+BENCHMARKS = {
+    'datas': bench_datas,
+    'ingestao': bench_ingestao,
+    'horas': bench_horas,
+    'paralelo': bench_paralelo,
+    'ocupacao': bench_ocupacao,
+    'abas': bench_abas
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do dashboard de gestão de frotas")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS) + ['todos'])
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--registro', default=ARQUIVO_RESULTADOS, help="histórico JSONL das medições")
+    argumentos = parser.parse_args()
+
+    for nome, funcao in BENCHMARKS.items():
+        if argumentos.benchmark in (nome, 'todos'):
+            funcao(argumentos.linhas)
+    if RESULTADOS:
+        gravar_resultados(argumentos.registro)
@@ -0,0 +1,321 @@
+# gerador_dados.py - Dados sintéticos de frota no layout dos exports, em qualquer escala
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+# Proporções das tabelas em relação aos registros de ponto
+DIAS_HISTORICO = 365
+FRACAO_DIAS_TRABALHADOS = 0.7
+USUARIOS_POR_VEICULO = 4
+REGISTROS_POR_UTILIZACAO = 8
+MANUTENCOES_POR_VEICULO_ANO = 12
+USUARIOS_POR_LOCAL = 50
+
+# Imperfeições dos exports reais
+TAXA_REGISTROS_FALTANTES = 0.01
+TAXA_SEM_COORDENADAS = 0.4
+TAXA_FORA_DO_LOCAL = 0.03
+TAXA_TURNO_NOTURNO = 0.1
+TAXA_DATA_SEM_HORA = 0.3
+TAXA_KM_SUSPEITA = 0.02
+TAXA_EM_ANDAMENTO = 0.005
+TAXA_CHAVES_ORFAS = 0.001
+
+# Horários (em horas desde a meia-noite do dia da jornada) de ENTRADA, SAÍDA, ENTRADA e SAÍDA
+JORNADA_DIURNA = [8, 12, 13, 17]
+JORNADA_NOTURNA = [22, 26, 26.5, 30]
+TIPOS_JORNADA = ['ENTRADA', 'SAÍDA', 'ENTRADA', 'SAÍDA']
+
+# Centro da região dos locais de registro (São Paulo) e dispersão dos registros em graus
+CENTRO_REGIAO = (-23.58, -46.59)
+DISPERSAO_LOCAIS = 0.15
+DISPERSAO_NO_LOCAL = 0.0003
+DISPERSAO_FORA_DO_LOCAL = 0.02
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sabrina', 'Thiago', 'Vanessa', 'Wagner']
+SOBRENOMES = ['Almeida', 'Barbosa', 'Costa', 'Dias', 'Fernandes', 'Gomes', 'Lima', 'Martins', 'Oliveira',
+              'Pereira', 'Rodrigues', 'Santos', 'Silva', 'Souza', 'Teixeira']
+FUNCOES = ['MOTORISTA', 'OPERADOR', 'SUPERVISOR', 'TÉCNICO']
+MODELOS = [('CHEVROLET', 'ONIX'), ('FIAT', 'STRADA'), ('VOLKSWAGEN', 'GOL'), ('RENAULT', 'KWID'),
+           ('FORD', 'RANGER'), ('HONDA', 'CG 160'), ('MERCEDES-BENZ', 'SPRINTER'), ('VOLVO', 'FH 540')]
+TIPOS_VEICULO = ['CARRO', 'CARRO', 'CARRO', 'CARRO', 'CAMINHONETE', 'MOTO', 'VAN', 'CAMINHÃO']
+STATUS_VEICULO = ['DISPONÍVEL', 'EM USO', 'MANUTENÇÃO']
+FINALIDADES = ['ENTREGA', 'VISITA A CLIENTE', 'TRANSPORTE DE EQUIPE', 'ABASTECIMENTO', 'ADMINISTRATIVO']
+SERVICOS = ['troca de óleo', 'pneu', 'alinhamento', 'embreagem', 'freios', 'revisão', 'bateria', 'suspensão']
+STATUS_MANUTENCAO = ['Concluído', 'Concluído', 'Concluído', 'Pendente', 'Em andamento']
+KM_ILEGIVEIS = ['sem leitura', '12.345 / 12.400', '123a / 456', '0 /']
+
+# Posições de cada caractere no texto ISO 'AAAA-MM-DDTHH:MM:SS.ffffff' (inteiros) ou caracteres fixos
+LAYOUTS_DATA = {
+    '%Y-%m-%d %H:%M:%S.%f+00': [*range(10), ' ', *range(11, 26), '+', '0', '0'],
+    '%Y-%m-%d %H:%M:%S': [*range(10), ' ', *range(11, 19)],
+    '%d/%m/%Y %H:%M:%S': [8, 9, '/', 5, 6, '/', 0, 1, 2, 3, ' ', *range(11, 19)],
+    '%Y-%m-%d': list(range(10))
+}
+
+def _texto(caracteres, nulos=None):
+    """Coluna de texto Arrow sobre uma matriz de caracteres de largura fixa, sem cópia por linha"""
+    quantidade, largura = caracteres.shape
+    deslocamentos = np.arange(0, (quantidade + 1) * largura, largura, dtype=np.int64)
+    validade = None
+    if nulos is not None and nulos.any():
+        validade = pa.py_buffer(np.packbits(~nulos, bitorder='little'))
+    return pa.LargeStringArray.from_buffers(
+        quantidade, pa.py_buffer(deslocamentos), pa.py_buffer(np.ascontiguousarray(caracteres)), validade
+    )
+
+def formatar_datas(instantes, formato):
+    """Formata datas como texto sem strftime por linha, remontando os caracteres do texto ISO
+
+    Aceita os formatos de LAYOUTS_DATA e retorna uma coluna de texto Arrow; NaT vira nulo.
+    """
+    instantes = np.asarray(instantes, dtype='datetime64[us]')
+    iso = np.datetime_as_string(instantes, unit='us').astype('S26').view(np.uint8).reshape(len(instantes), 26)
+
+    layout = LAYOUTS_DATA[formato]
+    origens = [origem if isinstance(origem, int) else 0 for origem in layout]
+    caracteres = iso[:, origens]
+    for posicao, origem in enumerate(layout):
+        if isinstance(origem, str):
+            caracteres[:, posicao] = ord(origem)
+    return _texto(caracteres, np.isnat(instantes))
+
+def gerar_uuids(rng, quantidade):
+    """UUIDs versão 4 aleatórios em texto, montados a partir de bytes sem laço por linha"""
+    octetos = rng.integers(0, 256, (quantidade, 16), dtype=np.uint8)
+    octetos[:, 6] = (octetos[:, 6] & 0x0F) | 0x40
+    octetos[:, 8] = (octetos[:, 8] & 0x3F) | 0x80
+
+    hexadecimais = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+    nibbles = np.empty((quantidade, 32), dtype=np.uint8)
+    nibbles[:, 0::2] = hexadecimais[octetos >> 4]
+    nibbles[:, 1::2] = hexadecimais[octetos & 0x0F]
+
+    caracteres = np.full((quantidade, 36), ord('-'), dtype=np.uint8)
+    caracteres[:, np.setdiff1d(np.arange(36), [8, 13, 18, 23])] = nibbles
+    return _texto(caracteres)
+
+def _tabela(colunas):
+    """DataFrame com as colunas Arrow mantidas no Arrow, sem conversão para objetos Python"""
+    return pd.DataFrame({
+        nome: pd.arrays.ArrowExtensionArray(coluna) if isinstance(coluna, pa.Array) else coluna
+        for nome, coluna in colunas.items()
+    })
+
+def _escolher(rng, opcoes, quantidade):
+    """Sorteio de valores de uma lista, como array de objetos"""
+    return np.asarray(opcoes, dtype=object)[rng.integers(0, len(opcoes), quantidade)]
+
+def _criados_em(rng, instantes):
+    """created_at em UTC (3 horas à frente), alguns segundos depois do instante registrado"""
+    atraso = pd.to_timedelta(rng.integers(0, 5_000_000, len(instantes)), unit='us')
+    return formatar_datas(pd.DatetimeIndex(instantes) + pd.Timedelta(hours=3) + atraso, '%Y-%m-%d %H:%M:%S.%f+00')
+
+def _orfas(rng, chaves, modelo):
+    """Troca uma fração TAXA_CHAVES_ORFAS das chaves por valores sem correspondência na dimensão"""
+    orfas = rng.random(len(chaves)) < TAXA_CHAVES_ORFAS
+    chaves = chaves.copy()
+    chaves[orfas] = [modelo.format(i) for i in range(orfas.sum())]
+    return chaves
+
+def gerar_usuarios(rng, quantidade, inicio):
+    """Tabela users; o nome liga às utilizações e o e-mail aos registros de ponto"""
+    # Combinações de nome e sobrenome, com sufixo numérico quando acabam, para nomes únicos
+    combinacoes = len(NOMES) * len(SOBRENOMES)
+    nomes = np.array([
+        f"{NOMES[i % len(NOMES)]} {SOBRENOMES[i // len(NOMES) % len(SOBRENOMES)]}" + (f" {i // combinacoes}" if i >= combinacoes else '')
+        for i in rng.permutation(quantidade)
+    ], dtype=object)
+    emails = [f"{nome.split(' ')[0].lower()}.{i}@empresa.com.br" for i, nome in enumerate(nomes)]
+    criados = inicio - pd.to_timedelta(rng.integers(1, 90 * 86400, quantidade), unit='s')
+
+    return _tabela({
+        'id': gerar_uuids(rng, quantidade),
+        'created_at': _criados_em(rng, criados),
+        'nome': nomes,
+        'email': emails,
+        'funcao': _escolher(rng, FUNCOES, quantidade),
+        'acesso': np.where(rng.random(quantidade) < 0.05, 'master', 'user')
+    })
+
+def gerar_veiculos(rng, quantidade, inicio):
+    """Tabela vehicles, com placas no padrão antigo e no Mercosul"""
+    letras = np.frombuffer(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ', dtype=np.uint8)
+    digitos = np.frombuffer(b'0123456789', dtype=np.uint8)
+    placas = np.empty((quantidade, 7), dtype=np.uint8)
+    placas[:, :3] = letras[rng.integers(0, 26, (quantidade, 3))]
+    placas[:, [3, 5, 6]] = digitos[rng.integers(0, 10, (quantidade, 3))]
+    mercosul = rng.random(quantidade) < 0.5
+    placas[:, 4] = np.where(mercosul, letras[rng.integers(0, 10, quantidade)], digitos[rng.integers(0, 10, quantidade)])
+
+    modelos = rng.integers(0, len(MODELOS), quantidade)
+    criados = inicio - pd.to_timedelta(rng.integers(1, 180 * 86400, quantidade), unit='s')
+    return _tabela({
+        'id': gerar_uuids(rng, quantidade),
+        'created_at': _criados_em(rng, criados),
+        'foto': 'https://placehold.co/50x50/e0e0e0/ffffff?text=Sem+foto',
+        'placa': _texto(placas),
+        'marca': np.array([MODELOS[i][0] for i in modelos], dtype=object),
+        'modelo': np.array([MODELOS[i][1] for i in modelos], dtype=object),
+        'status': _escolher(rng, STATUS_VEICULO, quantidade),
+        'tipo': _escolher(rng, TIPOS_VEICULO, quantidade)
+    })
+
+def gerar_registros_ponto(rng, quantidade, emails, dias, inicio):
+    """Tabela point_records: duas jornadas por dia trabalhado, parte dos usuários em turno noturno
+
+    Uma fração dos registros falta (jornadas sem par), parte não tem coordenadas e parte foi
+    registrada longe do local habitual do usuário.
+    """
+    usuarios = len(emails)
+    jornadas = min(-(-int(quantidade * (1 + TAXA_REGISTROS_FALTANTES)) // 4), usuarios * dias)
+    celulas = rng.choice(usuarios * dias, jornadas, replace=False)
+    usuario, dia = np.repeat(celulas // dias, 4), np.repeat(celulas % dias, 4)
+
+    noturno = rng.random(usuarios) < TAXA_TURNO_NOTURNO
+    horarios = np.where(noturno[usuario], np.tile(JORNADA_NOTURNA, jornadas), np.tile(JORNADA_DIURNA, jornadas))
+    minutos = dia * 1440 + horarios * 60 + rng.integers(-20, 21, len(usuario))
+    data = inicio + pd.to_timedelta(minutos * 60 + rng.integers(0, 60, len(usuario)), unit='s')
+
+    # Registros faltantes e ordem embaralhada, como nos exports ordenados por id
+    manter = np.sort(rng.choice(len(usuario), min(quantidade, len(usuario)), replace=False))
+    manter = manter[rng.permutation(len(manter))]
+    usuario, data, tipos = usuario[manter], data[manter], np.tile(TIPOS_JORNADA, jornadas)[manter]
+
+    # Cada usuário registra num local; alguns registros saem de longe ou vêm sem coordenadas
+    locais = max(usuarios // USUARIOS_POR_LOCAL, 1)
+    centros = np.array(CENTRO_REGIAO) + rng.normal(0, DISPERSAO_LOCAIS, (locais, 2))
+    local = rng.integers(0, locais, usuarios)[usuario]
+    fora = rng.random(len(usuario)) < TAXA_FORA_DO_LOCAL
+    dispersao = np.where(fora, DISPERSAO_FORA_DO_LOCAL, DISPERSAO_NO_LOCAL)[:, None]
+    coordenadas = centros[local] + rng.normal(0, 1, (len(usuario), 2)) * dispersao
+    coordenadas[rng.random(len(usuario)) < TAXA_SEM_COORDENADAS] = np.nan
+
+    return _tabela({
+        'id': gerar_uuids(rng, len(usuario)),
+        'created_at': _criados_em(rng, data),
+        'tipo': tipos,
+        'utilizador': _orfas(rng, np.asarray(emails, dtype=object)[usuario], 'desconhecido{}@empresa.com.br'),
+        'data': formatar_datas(data, '%Y-%m-%d %H:%M:%S'),
+        'latitude': coordenadas[:, 0],
+        'longitude': coordenadas[:, 1]
+    })
+
+def gerar_utilizacoes(rng, quantidade, id_veiculos, nomes, dias, inicio):
+    """Tabela vehicle_uses com datas em formatos misturados e quilometragem 'inicio / fim'
+
+    O hodômetro de cada veículo avança na ordem das utilizações; uma fração das leituras vem
+    invertida, com salto implausível ou ilegível, e algumas utilizações ainda estão em andamento.
+    """
+    veiculo = rng.integers(0, len(id_veiculos), quantidade)
+    data_inicio = inicio + pd.to_timedelta(rng.integers(0, dias * 86400, quantidade), unit='s')
+    duracao = pd.to_timedelta(np.clip(rng.lognormal(0.7, 0.8, quantidade), 0.1, 24) * 3600, unit='s')
+    data_fim = data_inicio + duracao
+
+    # Hodômetro acumulado por veículo, na ordem de início
+    distancia = np.ceil(rng.gamma(2.0, 20.0, quantidade) * duracao.total_seconds() / 7200).astype(np.int64)
+    ordem = np.lexsort((data_inicio.to_numpy(), veiculo))
+    acumulado = pd.Series(distancia[ordem]).groupby(veiculo[ordem]).cumsum().to_numpy()
+    km_fim = np.empty(quantidade, dtype=np.int64)
+    km_fim[ordem] = acumulado + rng.integers(1_000, 150_000, len(id_veiculos))[veiculo[ordem]]
+    km_inicio = km_fim - distancia
+
+    suspeita = rng.random(quantidade) < TAXA_KM_SUSPEITA
+    defeito = rng.integers(0, 3, quantidade)
+    km_inicio, km_fim = np.where(suspeita & (defeito == 0), km_fim, km_inicio), np.where(suspeita & (defeito == 0), km_inicio, km_fim)
+    km_fim = np.where(suspeita & (defeito == 1), km_fim + rng.integers(5_000, 50_000, quantidade), km_fim)
+    quilometragem = pd.Series(km_inicio).astype(str) + ' / ' + pd.Series(km_fim).astype(str)
+    ilegivel = suspeita & (defeito == 2)
+    quilometragem[ilegivel] = _escolher(rng, KM_ILEGIVEIS, ilegivel.sum())
+
+    # Datas de início só com o dia em parte das linhas, como no export
+    sem_hora = rng.random(quantidade) < TAXA_DATA_SEM_HORA
+    inicio_texto = pc.if_else(sem_hora, formatar_datas(data_inicio, '%Y-%m-%d'), formatar_datas(data_inicio, '%d/%m/%Y %H:%M:%S'))
+
+    # Utilizações em andamento ainda sem fim nem quilometragem final
+    em_andamento = rng.random(quantidade) < TAXA_EM_ANDAMENTO
+    fim_texto = formatar_datas(data_fim.where(~em_andamento), '%d/%m/%Y %H:%M:%S')
+    quilometragem[em_andamento] = None
+
+    return _tabela({
+        'id': gerar_uuids(rng, quantidade),
+        'created_at': _criados_em(rng, data_inicio),
+        'data_inicio': inicio_texto,
+        'data_fim': fim_texto,
+        'utilizador': _escolher(rng, nomes, quantidade),
+        'quilometragem': quilometragem.to_numpy(dtype=object),
+        'finalidade': _escolher(rng, FINALIDADES, quantidade),
+        'status': np.where(em_andamento, 'EM ANDAMENTO', 'CONCLUÍDO'),
+        'vehicle_id': _orfas(rng, np.asarray(id_veiculos, dtype=object)[veiculo], 'veiculo-removido-{}')
+    })
+
+def gerar_manutencoes(rng, quantidade, id_veiculos, dias, inicio):
+    """Tabela maintenances com custos em texto decimal"""
+    data = inicio + pd.to_timedelta(rng.integers(0, dias, quantidade), unit='D')
+    custo = np.round(rng.lognormal(6.5, 1.0, quantidade), 2)
+    return _tabela({
+        'id': gerar_uuids(rng, quantidade),
+        'created_at': _criados_em(rng, data + pd.Timedelta(hours=12)),
+        'vehicle_id': _orfas(rng, np.asarray(id_veiculos, dtype=object)[rng.integers(0, len(id_veiculos), quantidade)], 'veiculo-removido-{}'),
+        'data_manutencao': formatar_datas(data, '%Y-%m-%d'),
+        'descricao': _escolher(rng, SERVICOS, quantidade),
+        'custo': np.char.mod('%.2f', custo).astype(object),
+        'status': _escolher(rng, STATUS_MANUTENCAO, quantidade)
+    })
+
+def gerar_frota(registros_ponto, dias=DIAS_HISTORICO, semente=0, inicio=pd.Timestamp('2024-01-01')):
+    """As cinco tabelas, coerentes entre si, dimensionadas pelo número de registros de ponto
+
+    Retorna {tabela: DataFrame} com as colunas em texto como nos exports, prontas para
+    gravar em CSV com para_csv.
+    """
+    rng = np.random.default_rng(semente)
+    usuarios = max(-(-registros_ponto // int(4 * dias * FRACAO_DIAS_TRABALHADOS)), 2)
+    veiculos = max(usuarios // USUARIOS_POR_VEICULO, 2)
+
+    users = gerar_usuarios(rng, usuarios, inicio)
+    vehicles = gerar_veiculos(rng, veiculos, inicio)
+    return {
+        'vehicles': vehicles,
+        'vehicle_uses': gerar_utilizacoes(rng, max(registros_ponto // REGISTROS_POR_UTILIZACAO, 1),
+                                          vehicles['id'], users['nome'], dias, inicio),
+        'maintenances': gerar_manutencoes(rng, max(veiculos * MANUTENCOES_POR_VEICULO_ANO * dias // 365, 1),
+                                          vehicles['id'], dias, inicio),
+        'users': users,
+        'point_records': gerar_registros_ponto(rng, registros_ponto, users['email'], dias, inicio)
+    }
+
+def para_csv(df):
+    """CSV em bytes, com células vazias para nulos como nos exports"""
+    saida = pa.BufferOutputStream()
+    pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), saida,
+                     pa_csv.WriteOptions(quoting_style='needed'))
+    return saida.getvalue().to_pybytes()
+
+def salvar_frota(tabelas, pasta):
+    """Grava cada tabela em <pasta>/<tabela>.csv e retorna os caminhos"""
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    caminhos = {}
+    for tabela, df in tabelas.items():
+        caminhos[tabela] = pasta / f'{tabela}.csv'
+        caminhos[tabela].write_bytes(para_csv(df))
+    return caminhos
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera CSVs sintéticos de frota para o dashboard")
+    parser.add_argument('--registros', type=int, default=100_000, help="registros de ponto (os demais são proporcionais)")
+    parser.add_argument('--dias', type=int, default=DIAS_HISTORICO)
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--pasta', default='dados_sinteticos')
+    argumentos = parser.parse_args()
+
+    tabelas = gerar_frota(argumentos.registros, argumentos.dias, argumentos.semente)
+    for tabela, caminho in salvar_frota(tabelas, argumentos.pasta).items():
+        print(f"{caminho}: {len(tabelas[tabela]):,} linhas, {caminho.stat().st_size / 1e6:,.1f} MB")
@@ -0,0 +1,40 @@
+# motores_consulta.py - Agregações das abas do dashboard, em pandas sobre as tabelas fato
+from analise_frotas import (
+    TABELAS_FATO, calcular_kpis, custos_mensais_por_veiculo, custos_por_veiculo, distancias_por, duracao_media_por,
+    registros_por_hora, resumo_utilizacoes
+)
+
+class ConsultasPandas:
+    """Agregações das abas em pandas, sobre as tabelas fato em memória"""
+
+    def __init__(self, vehicles, fatos):
+        self._tabelas = {'veiculos': vehicles, **{nome: fatos[nome] for nome in TABELAS_FATO.values()}}
+
+    def kpis(self):
+        return calcular_kpis(self._tabelas['veiculos'], self._tabelas['utilizacoes'], self._tabelas['manutencoes'], self._tabelas['ponto'])
+
+    def contagem(self, tabela, coluna):
+        """Quantidade de registros por valor da coluna, da maior para a menor"""
+        return self._tabelas[tabela][coluna].value_counts()
+
+    def contagem_por(self, tabela, colunas):
+        """Quantidade de registros por combinação das colunas, ordenada pelas chaves"""
+        return self._tabelas[tabela].groupby(colunas, observed=True).size()
+
+    def custos_por_veiculo(self):
+        return custos_por_veiculo(self._tabelas['manutencoes'])
+
+    def custos_mensais_por_veiculo(self):
+        return custos_mensais_por_veiculo(self._tabelas['manutencoes'])
+
+    def distancias_por(self, coluna):
+        return distancias_por(self._tabelas['utilizacoes'], coluna)
+
+    def duracao_media_por(self, coluna):
+        return duracao_media_por(self._tabelas['utilizacoes'], coluna)
+
+    def resumo_utilizacoes(self):
+        return resumo_utilizacoes(self._tabelas['utilizacoes'])
+
+    def registros_por_hora(self):
+        return registros_por_hora(self._tabelas['ponto'])
@@ -0,0 +1,5 @@
+# conftest.py - Os testes importam os módulos da raiz do repositório
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,30 @@
+# test_esquema.py - UUIDs empacotados pelo esquema compacto e de volta em texto para exibição
+import uuid
+
+import pandas as pd
+
+from analise_frotas import empacotar_uuids, linha_do_tempo_frota, uuids_em_texto
+
+def test_uuids_voltam_ao_texto_original():
+    """Empacotar e desempacotar devolve o texto canônico; colunas sem UUIDs ficam intactas"""
+    ids = [str(uuid.uuid4()) for _ in range(50)]
+    df = pd.DataFrame({'id': empacotar_uuids(pd.Series(ids)), 'valor': range(50)})
+
+    texto = uuids_em_texto(df)
+    assert texto['id'].tolist() == ids
+    assert texto['valor'].equals(df['valor'])
+    assert df['id'].dtype != texto['id'].dtype
+
+def test_sobreposicoes_com_uuids_empacotados():
+    """A utilização sobreposta guarda o id no mesmo tipo empacotado e é exibida como texto"""
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    utilizacoes = pd.DataFrame({
+        'id': empacotar_uuids(pd.Series(ids)),
+        'vehicle_id': [1, 1, 1],
+        'data_inicio': pd.to_datetime(['2024-01-01 08:00', '2024-01-01 09:00', '2024-01-01 13:00']),
+        'data_fim': pd.to_datetime(['2024-01-01 12:00', '2024-01-01 10:00', '2024-01-01 14:00'])
+    })
+
+    sobreposicoes = linha_do_tempo_frota(utilizacoes)['sobreposicoes']
+    assert sobreposicoes['sobreposta_a'].dtype == utilizacoes['id'].dtype
+    assert uuids_em_texto(sobreposicoes)[['id', 'sobreposta_a']].values.tolist() == [[ids[1], ids[0]]]
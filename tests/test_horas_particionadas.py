@@ -0,0 +1,90 @@
+# test_horas_particionadas.py - Atualização incremental das horas contra a reconstrução completa
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analise_frotas import TIPO_DIA, HorasParticionadas, aplicar_esquema, mesclar_registros, parear_entradas_saidas
+
+TURNOS = {'dia': None, 'turnos': pd.Timedelta(hours=14)}
+
+def registros_ponto(rng, usuarios=8, dias=45):
+    """Jornadas aleatórias com casos de borda: saídas segundos após a meia-noite e jornadas de segundos
+
+    Essas jornadas geram partições com 0.0 hora depois do arredondamento, que contam como dia.
+    """
+    inicio, fim = pd.Timestamp('2024-03-01'), pd.Timestamp('2024-03-01') + pd.Timedelta(days=dias)
+    linhas = []
+    for usuario in range(usuarios):
+        instante = inicio + pd.Timedelta(minutes=int(rng.integers(0, 24 * 60)))
+        while instante < fim:
+            sorteio = rng.random()
+            if sorteio < 0.25:
+                meia_noite = instante.normalize() + pd.Timedelta(days=1)
+                entrada = meia_noite - pd.Timedelta(minutes=int(rng.integers(1, 300)))
+                saida = meia_noite + pd.Timedelta(seconds=int(rng.integers(0, 18)))
+            elif sorteio < 0.35:
+                entrada = instante
+                saida = entrada + pd.Timedelta(seconds=int(rng.integers(1, 18)))
+            else:
+                entrada = instante
+                saida = entrada + pd.Timedelta(minutes=int(rng.integers(1, 12 * 60)))
+            for tipo, data in (('ENTRADA', entrada), ('SAÍDA', saida)):
+                if rng.random() > 0.04:
+                    linhas.append((str(uuid.UUID(bytes=rng.bytes(16))), tipo, f'usuario{usuario}@empresa.com.br', data))
+            instante = saida + pd.Timedelta(minutes=int(rng.integers(60, 30 * 60)))
+    ponto = pd.DataFrame(linhas, columns=['id', 'tipo', 'utilizador', 'data'])
+    return aplicar_esquema('point_records', ponto.sample(frac=1, random_state=int(rng.integers(2 ** 31))).reset_index(drop=True))
+
+def anexo_aleatorio(rng, ponto, fracao_novos=0.15, fracao_corrigidos=0.05):
+    """Divide os registros em já carregados e anexo; o anexo também corrige registros já carregados"""
+    novos = rng.random(len(ponto)) < fracao_novos
+    atual = ponto[~novos].reset_index(drop=True)
+
+    corrigidos = atual.iloc[rng.choice(len(atual), int(len(atual) * fracao_corrigidos), replace=False)].copy()
+    corrigidos['data'] = corrigidos['data'] + pd.to_timedelta(rng.integers(-20 * 3600, 20 * 3600, len(corrigidos)), unit='s')
+    trocar = rng.random(len(corrigidos)) < 0.3
+    corrigidos['tipo'] = corrigidos['tipo'].where(~trocar, corrigidos['tipo'].map({'ENTRADA': 'SAÍDA', 'SAÍDA': 'ENTRADA'}))
+    return atual, pd.concat([ponto[novos], corrigidos], ignore_index=True)
+
+@pytest.mark.parametrize('modo', list(TURNOS))
+@pytest.mark.parametrize('semente', range(10))
+def test_aplicar_igual_a_reconstruir(semente, modo):
+    rng = np.random.default_rng(semente)
+    atual, anexo = anexo_aleatorio(rng, registros_ponto(rng))
+    combinada, substituidos = mesclar_registros(atual, anexo)
+    mantidas = len(atual) - len(substituidos)
+
+    incremental = HorasParticionadas(atual, TURNOS[modo])
+    incremental.aplicar(substituidos, combinada.iloc[mantidas:])
+    completa = HorasParticionadas(combinada, TURNOS[modo])
+
+    assert incremental.diario.keys() == completa.diario.keys()
+    pd.testing.assert_frame_equal(incremental.tabela(), completa.tabela(), check_exact=False, atol=1e-6)
+
+@pytest.mark.parametrize('semente', range(3))
+def test_aplicar_na_copia_preserva_original(semente):
+    """A versão anterior, compartilhada entre sessões, não muda quando a cópia recebe o anexo"""
+    rng = np.random.default_rng(semente)
+    atual, anexo = anexo_aleatorio(rng, registros_ponto(rng))
+    combinada, substituidos = mesclar_registros(atual, anexo)
+    mantidas = len(atual) - len(substituidos)
+
+    original = HorasParticionadas(atual, TURNOS['turnos'])
+    antes = original.tabela()
+    copia = original.copia()
+    copia.aplicar(substituidos, combinada.iloc[mantidas:])
+
+    pd.testing.assert_frame_equal(original.tabela(), antes)
+    pd.testing.assert_frame_equal(original.tabela(), HorasParticionadas(atual, TURNOS['turnos']).tabela())
+    pd.testing.assert_frame_equal(copia.tabela(), HorasParticionadas(combinada, TURNOS['turnos']).tabela(), check_exact=False, atol=1e-6)
+
+@pytest.mark.parametrize('unidade', ['s', 'us', 'ns'])
+def test_tipo_do_dia_igual_nos_dois_modos(unidade):
+    """A coluna dia sai com o mesmo tipo nos dois modos de pareamento, qualquer que seja a unidade das datas"""
+    ponto = registros_ponto(np.random.default_rng(0))
+    ponto['data'] = ponto['data'].astype(f'datetime64[{unidade}]')
+
+    tipos = {modo: parear_entradas_saidas(ponto, turno_maximo)['dia'].dtype for modo, turno_maximo in TURNOS.items()}
+    assert tipos['dia'] == tipos['turnos'] == TIPO_DIA
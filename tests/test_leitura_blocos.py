@@ -0,0 +1,84 @@
+# test_leitura_blocos.py - Leitura de CSV em blocos: tipos iguais aos da leitura inteira e pico de memória
+import multiprocessing
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import analise_frotas
+from analise_frotas import ler_tabela
+
+def csv_ponto(linhas, semente=0):
+    """CSV de point_records com UUIDs, poucos usuários, datas e coordenadas"""
+    rng = np.random.default_rng(semente)
+    df = pd.DataFrame({
+        'id': [f'{i:08x}-0000-4000-8000-{i:012x}' for i in range(linhas)],
+        'tipo': rng.choice(['ENTRADA', 'SAÍDA'], linhas),
+        'utilizador': [f'usuario{i}@empresa.com' for i in rng.integers(0, 200, linhas)],
+        'data': (pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, linhas), unit='s')).strftime('%Y-%m-%d %H:%M:%S'),
+        'latitude': np.round(rng.uniform(-23.7, -23.4, linhas), 6),
+        'longitude': np.round(rng.uniform(-46.8, -46.4, linhas), 6)
+    })
+    return df.to_csv(index=False).encode()
+
+def test_colunas_com_tipos_diferentes_entre_blocos(monkeypatch):
+    """Coluna numérica no primeiro bloco e texto nos seguintes volta só com texto, como na leitura inteira"""
+    monkeypatch.setattr(analise_frotas, 'TAMANHO_BLOCO_CSV', 2)
+    conteudo = (
+        'id,marca,modelo,status,tipo,placa\n'
+        '100,Fiat,Uno,ativo,carro,100\n'
+        '101,Fiat,Uno,ativo,carro,101\n'
+        'AB1,VW,Gol,inativo,carro,AB1\n'
+        'AB2,VW,Gol,ativo,moto,\n'
+    ).encode()
+
+    blocos = ler_tabela('vehicles', conteudo, em_blocos=True)
+    inteira = ler_tabela('vehicles', conteudo)
+
+    # Chave do esquema: categoria de textos, mesmo com o primeiro bloco só de números
+    assert list(blocos['id'].cat.categories) == ['100', '101', 'AB1', 'AB2']
+    # Coluna fora do esquema: textos e nulo, sem inteiros misturados
+    assert blocos['placa'].tolist()[:3] == ['100', '101', 'AB1'] and pd.isna(blocos['placa'].iloc[3])
+    assert all(isinstance(valor, str) for valor in blocos['placa'].dropna())
+
+    pd.testing.assert_frame_equal(blocos, inteira, check_categorical=False)
+
+def test_blocos_iguais_a_leitura_inteira(monkeypatch):
+    """Com vários blocos, valores e tipos finais são os da leitura inteira"""
+    monkeypatch.setattr(analise_frotas, 'TAMANHO_BLOCO_CSV', 700)
+    conteudo = csv_ponto(5000)
+
+    blocos = ler_tabela('point_records', conteudo, em_blocos=True)
+    inteira = ler_tabela('point_records', conteudo)
+    pd.testing.assert_frame_equal(blocos, inteira, check_categorical=False)
+
+def _medir_pico(conteudo, em_blocos, tamanho_bloco, fila):
+    """Tamanho final e pico de memória (Python + Arrow) de uma leitura, num processo limpo"""
+    analise_frotas.TAMANHO_BLOCO_CSV = tamanho_bloco
+    tracemalloc.start()
+    pool = pa.default_memory_pool()
+    df = ler_tabela('point_records', conteudo, em_blocos=em_blocos)
+    pico = tracemalloc.get_traced_memory()[1] + pool.max_memory()
+    fila.put((int(df.memory_usage(deep=True).sum()), pico))
+
+def test_pico_de_memoria_da_leitura_em_blocos():
+    """O pico da leitura em blocos fica perto do tamanho da tabela final, e abaixo do da leitura inteira
+
+    Blocos de 10 mil linhas, para a tabela ter vários deles sem gerar um CSV grande demais.
+    """
+    conteudo = csv_ponto(200_000)
+    contexto = multiprocessing.get_context('spawn')
+
+    medidas = {}
+    for em_blocos in (False, True):
+        fila = contexto.Queue()
+        processo = contexto.Process(target=_medir_pico, args=(conteudo, em_blocos, 10_000, fila))
+        processo.start()
+        medidas[em_blocos] = fila.get(timeout=120)
+        processo.join()
+
+    tamanho, pico_blocos = medidas[True]
+    _, pico_inteira = medidas[False]
+    assert pico_blocos < 2 * tamanho
+    assert pico_blocos < pico_inteira
@@ -0,0 +1,84 @@
+# test_pareamento.py - Pareamento vetorizado de ENTRADA/SAÍDA contra o laço original do dashboard
+import numpy as np
+import pandas as pd
+import pytest
+
+import analise_frotas
+from analise_frotas import parear_em_paralelo, parear_entradas_saidas
+
+def horas_por_dia_laco(point_records):
+    """Referência: o laço por usuário, dia e entrada que calculava as horas diárias antes da vetorização"""
+    df_ponto = point_records.sort_values(['utilizador', 'data']).copy()
+    df_ponto['dia'] = df_ponto['data'].dt.date
+
+    horas_trabalhadas = []
+    for usuario in df_ponto['utilizador'].unique():
+        user_data = df_ponto[df_ponto['utilizador'] == usuario].copy()
+        for dia in user_data['dia'].unique():
+            dia_data = user_data[user_data['dia'] == dia].sort_values('data')
+            entradas = dia_data[dia_data['tipo'] == 'ENTRADA']
+            saidas = dia_data[dia_data['tipo'] == 'SAÍDA']
+
+            total_horas_dia = 0
+            for _, entrada in entradas.iterrows():
+                saida_correspondente = saidas[saidas['data'] > entrada['data']].head(1)
+                if not saida_correspondente.empty:
+                    horas_trabalhadas_dia = (saida_correspondente.iloc[0]['data'] - entrada['data']).total_seconds() / 3600
+                    total_horas_dia += max(0, horas_trabalhadas_dia)
+
+            if total_horas_dia > 0:
+                horas_trabalhadas.append({'utilizador': usuario, 'dia': pd.Timestamp(dia), 'horas_trabalhadas': round(total_horas_dia, 2)})
+
+    return pd.DataFrame(horas_trabalhadas, columns=['utilizador', 'dia', 'horas_trabalhadas'])
+
+def registros_aleatorios(rng, linhas=1500, usuarios=6, dias=10):
+    """Registros com empates de horário, datas nulas, usuários nulos e tipos desconhecidos"""
+    inicio = pd.Timestamp('2024-05-01')
+    minutos = rng.integers(0, dias * 24 * 60, linhas)
+    # Poucos minutos distintos por dia: muitas ENTRADAS e SAÍDAS no mesmo instante
+    minutos = minutos - minutos % 30
+    datas = pd.Series(inicio + pd.to_timedelta(minutos, unit='min'))
+    datas[rng.random(linhas) < 0.03] = pd.NaT
+
+    usuarios_registro = pd.Series([f'u{numero}@empresa.com.br' for numero in rng.integers(0, usuarios, linhas)], dtype=object)
+    usuarios_registro[rng.random(linhas) < 0.03] = None
+
+    tipos = pd.Series(rng.choice(['ENTRADA', 'SAÍDA', 'PAUSA', 'entrada'], linhas, p=[0.46, 0.46, 0.05, 0.03]), dtype=object)
+    return pd.DataFrame({'utilizador': usuarios_registro, 'tipo': tipos, 'data': datas})
+
+def normalizar(diario):
+    diario = diario.assign(utilizador=diario['utilizador'].astype(str), dia=pd.to_datetime(diario['dia']).astype('datetime64[ns]'))
+    return diario.sort_values(['utilizador', 'dia'], ignore_index=True)
+
+@pytest.mark.parametrize('categorico', [False, True])
+@pytest.mark.parametrize('semente', range(12))
+def test_vetorizado_igual_ao_laco(semente, categorico):
+    registros = registros_aleatorios(np.random.default_rng(semente))
+    esperado = horas_por_dia_laco(registros)
+    if categorico:
+        registros = registros.astype({'utilizador': 'category', 'tipo': 'category'})
+
+    obtido = parear_entradas_saidas(registros)
+
+    pd.testing.assert_frame_equal(normalizar(obtido), normalizar(esperado), check_exact=False, atol=1e-9)
+
+def test_empates_e_entradas_sem_saida():
+    registros = pd.DataFrame({
+        'utilizador': ['a', 'a', 'a', 'a', 'b', 'b', None],
+        'tipo': ['ENTRADA', 'SAÍDA', 'ENTRADA', 'SAÍDA', 'ENTRADA', 'ENTRADA', 'ENTRADA'],
+        'data': pd.to_datetime(['2024-05-01 08:00', '2024-05-01 08:00', '2024-05-01 09:00', '2024-05-01 12:30',
+                                '2024-05-01 10:00', '2024-05-01 11:00', '2024-05-01 08:00'])
+    })
+    # A SAÍDA no mesmo instante da ENTRADA não fecha o par; as duas ENTRADAS de 'a' fecham na SAÍDA das 12:30
+    pd.testing.assert_frame_equal(normalizar(parear_entradas_saidas(registros)), normalizar(horas_por_dia_laco(registros)))
+    assert parear_entradas_saidas(registros)['horas_trabalhadas'].tolist() == [8.0]
+
+@pytest.mark.parametrize('turno_maximo', [None, pd.Timedelta(hours=14)])
+def test_paralelo_igual_a_um_processo(monkeypatch, turno_maximo):
+    """Fatias em processos iniciados sem fork dão o mesmo resultado do pareamento num só processo"""
+    monkeypatch.setattr(analise_frotas, 'LIMITE_PARALELO_REGISTROS', 0)
+    registros = registros_aleatorios(np.random.default_rng(0)).astype({'utilizador': 'category', 'tipo': 'category'})
+
+    paralelo = parear_em_paralelo(registros, turno_maximo, processos=3)
+
+    pd.testing.assert_frame_equal(paralelo, parear_entradas_saidas(registros, turno_maximo))
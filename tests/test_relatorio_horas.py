@@ -0,0 +1,22 @@
+# test_relatorio_horas.py - Totais do relatório de horas com um tipo de período ou com 'Todos'
+import numpy as np
+import pandas as pd
+import pytest
+
+from analise_frotas import TIPOS_PERIODO, HorasParticionadas, horas_do_resumo
+from test_horas_particionadas import TURNOS, registros_ponto
+
+@pytest.mark.parametrize('modo', list(TURNOS))
+def test_todos_soma_o_mesmo_que_dia(modo):
+    """Em 'Todos', total e horas por usuário são os de Dia, e não a soma de Dia, Semana e Mês"""
+    horas = HorasParticionadas(registros_ponto(np.random.default_rng(3)), TURNOS[modo]).tabela().reset_index()
+    dia = horas_do_resumo(horas, 'Dia')
+    todos = horas_do_resumo(horas, 'Todos')
+
+    assert todos['horas_trabalhadas'].sum() == pytest.approx(dia['horas_trabalhadas'].sum())
+    pd.testing.assert_series_equal(
+        todos.groupby('utilizador')['horas_trabalhadas'].sum(), dia.groupby('utilizador')['horas_trabalhadas'].sum()
+    )
+    # Cada tipo de período soma as mesmas horas
+    for tipo in TIPOS_PERIODO:
+        assert horas_do_resumo(horas, tipo)['horas_trabalhadas'].sum() == pytest.approx(dia['horas_trabalhadas'].sum(), abs=0.01 * len(dia))